@@ -0,0 +1,323 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# SQLite ограничивает количество параметров в одном запросе
+SQLITE_CHUNK = 500
+# Как часто (раз в сколько записей) чистить просроченные ключи
+CULL_EVERY = 100
+# Целые в этих границах хранятся без pickle - их увеличивает incr
+INTEGER_MIN, INTEGER_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def _dumps(value):
+    if type(value) is int and INTEGER_MIN <= value <= INTEGER_MAX:
+        return value
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(value):
+    return value if isinstance(value, int) else pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш в отдельном файле SQLite: один на все процессы-воркеры,
+    не требует внешнего сервиса. LOCATION - путь к файлу.
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        # соединение своё для каждого потока и каждого процесса после fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _alive(expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache WHERE key = ?',
+            (self._key(key, version),),
+        ).fetchone()
+        if row is None or not self._alive(row[1]):
+            return default
+        return _loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        found = {}
+        made_keys = list(keys)
+        for start in range(0, len(made_keys), SQLITE_CHUNK):
+            chunk = made_keys[start:start + SQLITE_CHUNK]
+            rows = self._connection().execute(
+                'SELECT key, value, expires FROM cache WHERE key IN (%s)'
+                % ','.join('?' * len(chunk)), chunk,
+            )
+            for made_key, value, expires in rows:
+                if self._alive(expires):
+                    found[keys[made_key]] = _loads(value)
+        return found
+
+    def _rows(self, data, timeout, version):
+        expires = self.get_backend_timeout(timeout)
+        return [
+            (self._key(key, version), _dumps(value), expires)
+            for key, value in data.items()
+        ]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', self._rows(data, timeout, version),
+            )
+            self._writes += 1
+            if self._writes % CULL_EVERY == 0:
+                self._cull(connection)
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        connection = self._connection()
+        made_key, value, expires = self._rows(
+            {key: value}, timeout, version)[0]
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (made_key, time.time()),
+            )
+            added = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', (made_key, value, expires),
+            ).rowcount
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return bool(added)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return bool(self._connection().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time()),
+        ).rowcount)
+
+    def incr(self, key, delta=1, version=None):
+        """
+        Один UPDATE вместо get + set: приращения из разных
+        процессов не теряются.
+        """
+        rows = self._connection().execute(
+            "UPDATE cache SET value = value + ? WHERE key = ? "
+            "AND typeof(value) = 'integer' "
+            "AND (expires IS NULL OR expires > ?) RETURNING value",
+            (delta, self._key(key, version), time.time()),
+        ).fetchall()
+        if rows:
+            return rows[0][0]
+        if self.has_key(key, version):
+            raise TypeError(f'Значение ключа {key!r} - не целое число')
+        raise ValueError(f'Ключа {key!r} нет в кэше')
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        made_keys = [self._key(key, version) for key in keys]
+        for start in range(0, len(made_keys), SQLITE_CHUNK):
+            chunk = made_keys[start:start + SQLITE_CHUNK]
+            self._connection().execute(
+                'DELETE FROM cache WHERE key IN (%s)'
+                % ','.join('?' * len(chunk)), chunk,
+            )
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # как в стандартных бэкендах: выкидываем 1/cull_frequency записей,
+            # первыми - те, что раньше истекают
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (max(1, count // self._cull_frequency),),
+            )
+
+
+class TwoTierCache(BaseCache):
+    """
+    Небольшой LRU в памяти процесса перед общим кэшем (OPTIONS['SHARED'] -
+    имя другого бэкенда из CACHES). Локально хранятся только ключи с
+    префиксами OPTIONS['LOCAL_PREFIXES'] - это должны быть неизменяемые
+    значения, например фрагменты шаблонов с версией в ключе. Изменяемые
+    ключи (версии, счётчики) всегда читаются из общего кэша, поэтому
+    воркеры не видят друг у друга устаревших данных.
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_prefixes = tuple(
+            options.get('LOCAL_PREFIXES', ('template.cache.',)))
+        self._local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return key.startswith(self._local_prefixes)
+
+    def _local_get(self, key, version):
+        local_key = (key, version)
+        with self._lock:
+            item = self._lru.get(local_key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._lru[local_key]
+                return None
+            self._lru.move_to_end(local_key)
+            return item
+
+    def _local_set(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        local_timeout = self._local_timeout
+        if timeout not in (DEFAULT_TIMEOUT, None):
+            local_timeout = min(local_timeout, timeout)
+        with self._lock:
+            self._lru[(key, version)] = (
+                value, time.monotonic() + local_timeout)
+            self._lru.move_to_end((key, version))
+            while len(self._lru) > self._local_max_entries:
+                self._lru.popitem(last=False)
+
+    def _local_delete(self, key, version):
+        with self._lock:
+            self._lru.pop((key, version), None)
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            item = self._local_get(key, version)
+            if item is not None:
+                return item[0]
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            return default
+        if self._is_local(key):
+            self._local_set(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            item = self._local_get(key, version) if self._is_local(
+                key) else None
+            if item is None:
+                missing.append(key)
+            else:
+                found[key] = item[0]
+        if missing:
+            fetched = self.shared.get_many(missing, version=version)
+            for key, value in fetched.items():
+                if self._is_local(key):
+                    self._local_set(key, value, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        if self._is_local(key):
+            self._local_set(key, value, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if self._is_local(key):
+                self._local_set(key, value, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        if added and self._is_local(key):
+            self._local_set(key, value, version, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(key, version)
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._local_delete(key, version)
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, self, version) is not self
+
+    def incr(self, key, delta=1, version=None):
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+        self.shared.clear()
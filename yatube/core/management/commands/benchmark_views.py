@@ -0,0 +1,289 @@
+import random
+import re
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.urls import reverse
+
+from posts import timeline
+from posts.models import Group, Post, UserCounters
+from posts.paginators import KeysetPaginator
+
+User = get_user_model()
+
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index')
+MODES = ('client', 'server')
+# Сколько объектов брать из базы для случайных адресов
+SAMPLE = 1000
+# Сколько страниц ленты листать по курсорам
+FEED_PAGES = 5
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _sample(randomizer, queryset):
+    """
+    До SAMPLE объектов подряд по первичному ключу со случайного места
+    его диапазона - без ORDER BY RANDOM() по всей таблице.
+    """
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return []
+    start = randomizer.randint(bounds['low'], bounds['high'])
+    ordered = queryset.order_by('pk')
+    rows = list(ordered.filter(pk__gte=start)[:SAMPLE])
+    if len(rows) < SAMPLE:
+        rows += ordered.filter(pk__lt=start)[:SAMPLE - len(rows)]
+    return rows
+
+
+def _feed_urls(url, rows, ordering):
+    """
+    Первые FEED_PAGES страниц ленты по курсорам next_cursor - теми же
+    ссылками, по которым листают пользователи.
+    """
+    urls, cursor = [url], None
+    for _ in range(FEED_PAGES - 1):
+        paginator = KeysetPaginator(
+            rows, settings.PAGINATOR_OBJECTS_PER_PAGE, ordering=ordering)
+        paginator.page_by_cursor(cursor)
+        cursor = paginator.next_cursor
+        if cursor is None:
+            break
+        urls.append(f'{url}?{urlencode({"cursor": cursor})}')
+    return urls
+
+
+def _urls(view, randomizer, count, reader):
+    """
+    Адреса для одной view: случайные сообщества, авторы, посты;
+    страницы ленты - чаще первые (распределение Парето).
+    """
+    if view == 'group_posts':
+        slugs = _sample(randomizer, Group.objects.values_list(
+            'slug', flat=True))
+        return [reverse('post:group_list', args=[randomizer.choice(slugs)])
+                for _ in range(count)] if slugs else []
+    if view == 'profile':
+        names = _sample(randomizer, User.objects.filter(
+            counters__posts_count__gt=0).values_list('username', flat=True))
+        return [reverse('post:profile', args=[randomizer.choice(names)])
+                for _ in range(count)] if names else []
+    if view == 'post_detail':
+        ids = _sample(randomizer, Post.objects.values_list('id', flat=True))
+        return [reverse('post:post_detail', args=[randomizer.choice(ids)])
+                for _ in range(count)] if ids else []
+    if view == 'index':
+        pages = _feed_urls(reverse('post:index'),
+                           Post.objects.values('id', 'pub_date'),
+                           ('-pub_date', '-id'))
+    else:
+        pages = _feed_urls(reverse('post:follow_index'),
+                           timeline.timeline_rows(reader), timeline.ORDERING)
+    return [pages[min(int(randomizer.paretovariate(1.5)), len(pages)) - 1]
+            for _ in range(count)]
+
+
+def _percentile(values, percent):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+class ClientDriver:
+    """
+    Запросы через django.test.Client - без сети, в том же процессе;
+    число SQL-запросов берётся из request.perf (QueryBudgetMiddleware).
+    """
+    def __init__(self, user):
+        self.user = user
+        self.local = threading.local()
+
+    def fetch(self, url):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+            if self.user is not None:
+                client.force_login(self.user)
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+        queries = response.wsgi_request.perf.queries
+        return elapsed, response.status_code, queries
+
+    def close(self):
+        pass
+
+
+class ServerDriver:
+    """
+    Запросы по HTTP к локальному многопоточному WSGI-серверу;
+    число SQL-запросов - из заголовка Server-Timing.
+    """
+    def __init__(self, user):
+        self.server = make_server(
+            '127.0.0.1', 0, WSGIHandler(),
+            server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.headers = {}
+        if user is not None:
+            client = Client()
+            client.force_login(user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            self.headers['Cookie'] = (
+                f'{settings.SESSION_COOKIE_NAME}={session}')
+
+    def fetch(self, url):
+        request = urllib.request.Request(self.base + url,
+                                         headers=self.headers)
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request) as response:
+                response.read()
+                status, timing = response.status, response.headers.get(
+                    'Server-Timing', '')
+        except urllib.error.HTTPError as error:
+            status, timing = error.code, error.headers.get(
+                'Server-Timing', '')
+        elapsed = time.perf_counter() - started
+        match = QUERIES_RE.search(timing)
+        return elapsed, status, int(match.group(1)) if match else 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест страниц на текущей базе (см. seed_benchmark): '
+        'p50/p95/p99 времени ответа, SQL-запросов на запрос и запросов '
+        'в секунду для каждой view при заданном числе параллельных клиентов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--view', action='append', dest='views', choices=VIEWS,
+            help='View для теста (можно несколько), по умолчанию все.',
+        )
+        parser.add_argument(
+            '--mode', choices=MODES, default='client',
+            help='client - django.test.Client, server - HTTP к локальному '
+                 'WSGI-серверу.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на одну view.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Параллельных клиентов; 1 - последовательно в этом потоке.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Под кем открывать страницы; по умолчанию follow_index '
+                 'открывает пользователь с наибольшим числом подписок, '
+                 'остальные - аноним.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _reader(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {username}')
+        counters = UserCounters.objects.select_related('user').order_by(
+            '-following_count').first()
+        if counters is None:
+            raise CommandError('Нет пользователей - запустите seed_benchmark')
+        return counters.user
+
+    def _run(self, driver, urls, concurrency):
+        """
+        Каждый из concurrency потоков идёт по своей части адресов
+        и закрывает соединение с БД в конце. Результаты - в исходном
+        порядке адресов и общее время.
+        """
+        results = [None] * len(urls)
+
+        def worker(start):
+            try:
+                for index in range(start, len(urls), concurrency):
+                    results[index] = driver.fetch(urls[index])
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        if concurrency == 1:
+            for index, url in enumerate(urls):
+                results[index] = driver.fetch(url)
+        else:
+            threads = [threading.Thread(target=worker, args=(start,))
+                       for start in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if None in results:
+                raise CommandError('Часть запросов завершилась исключением')
+        return results, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        driver_class = (ServerDriver if options['mode'] == 'server'
+                        else ClientDriver)
+        randomizer = random.Random(options['seed'])
+        reader = self._reader(options['user'])
+        self.stdout.write(
+            f'{"view":<12} {"запросов":>8} {"ошибок":>6} {"p50 мс":>8} '
+            f'{"p95 мс":>8} {"p99 мс":>8} {"SQL":>5} {"RPS":>7}'
+        )
+        for view in options['views'] or VIEWS:
+            authenticated = options['user'] or view == 'follow_index'
+            user = reader if authenticated else None
+            urls = _urls(view, randomizer, options['requests'], reader)
+            if not urls:
+                self.stderr.write(f'{view}: нет данных для адресов')
+                continue
+            driver = driver_class(user)
+            try:
+                # первый проход прогревает кэши и не учитывается
+                self._run(driver, urls[:options['concurrency']], 1)
+                results, elapsed = self._run(
+                    driver, urls, options['concurrency'])
+            finally:
+                driver.close()
+            latencies = [seconds * 1000 for seconds, _, _ in results]
+            errors = sum(status >= 400 for _, status, _ in results)
+            queries = statistics.mean(total for _, _, total in results)
+            self.stdout.write(
+                f'{view:<12} {len(results):>8} {errors:>6} '
+                f'{_percentile(latencies, 50):>8.1f} '
+                f'{_percentile(latencies, 95):>8.1f} '
+                f'{_percentile(latencies, 99):>8.1f} '
+                f'{queries:>5.1f} {len(results) / elapsed:>7.1f}'
+            )
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+# Базовая линия - кэш в памяти процесса, как было раньше
+BASELINE = 'locmem'
+
+
+def _get_cache(alias):
+    if alias == BASELINE:
+        return LocMemCache('cache-benchmark', {})
+    return caches[alias]
+
+
+def _key(run, number):
+    # префикс фрагментов шаблонов - чтобы TwoTierCache держал ключи
+    # и в памяти процесса; run - свои ключи у каждого запуска
+    return f'template.cache.bench.{run}.{number}'
+
+
+def _worker(alias, run, seed, requests, keys, value, render_ms):
+    """
+    Один воркер: запросы к "страницам" с распределением по Парето
+    (часть страниц популярнее). Промах - имитация рендера и запись.
+    """
+    cache = _get_cache(alias)
+    randomizer = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        key = _key(run, int(randomizer.paretovariate(1.2)) % keys)
+        if cache.get(key) is not None:
+            hits += 1
+            continue
+        time.sleep(render_ms / 1000)
+        cache.set(key, value, 300)
+    return hits, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша под нагрузкой из нескольких процессов: '
+        'доля попаданий, запросов в секунду, среднее время запроса. '
+        'Ключи замера свои у каждого запуска и удаляются после него - '
+        'остальное содержимое кэшей не трогается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--alias', action='append', dest='aliases',
+            help='Алиас из CACHES (можно несколько), по умолчанию default.',
+        )
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Запросов на один воркер.',
+        )
+        parser.add_argument(
+            '--keys', type=int, default=200,
+            help='Количество разных страниц (ключей).',
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=8192,
+            help='Размер значения в байтах (размер фрагмента).',
+        )
+        parser.add_argument(
+            '--render-ms', type=float, default=5.0,
+            help='Сколько миллисекунд "рендерится" страница при промахе.',
+        )
+
+    def handle(self, *args, **options):
+        aliases = [BASELINE] + (options['aliases'] or ['default'])
+        value = os.urandom(options['value_size'])
+        # fork: воркеры наследуют настроенный Django
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(
+            f'Воркеров: {options["workers"]}, '
+            f'запросов на воркер: {options["requests"]}, '
+            f'ключей: {options["keys"]}'
+        )
+        for alias in aliases:
+            if alias != BASELINE and alias not in settings.CACHES:
+                self.stderr.write(f'Нет кэша {alias} в CACHES')
+                continue
+            run = uuid.uuid4().hex
+            args = [
+                (alias, run, seed, options['requests'], options['keys'],
+                 value, options['render_ms'])
+                for seed in range(options['workers'])
+            ]
+            started = time.perf_counter()
+            try:
+                with context.Pool(options['workers']) as pool:
+                    results = pool.starmap(_worker, args)
+                elapsed = time.perf_counter() - started
+            finally:
+                if alias != BASELINE:
+                    caches[alias].delete_many(
+                        [_key(run, number)
+                         for number in range(options['keys'])])
+            total = options['requests'] * options['workers']
+            hits = sum(hits for hits, _ in results)
+            busy = sum(worker_time for _, worker_time in results)
+            self.stdout.write(
+                f'{alias:>10}: попаданий {hits / total:6.1%}, '
+                f'{total / elapsed:8.0f} запросов/с, '
+                f'{busy / total * 1000:6.2f} мс на запрос'
+            )
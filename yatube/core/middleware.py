@@ -0,0 +1,61 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class RequestPerf:
+    """
+    Статистика одного запроса: число SQL-запросов, время в БД
+    и в рендере шаблонов. Подключается к соединению как execute_wrapper.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f'tpl;dur={self.template_time * 1000:.1f}, '
+            f'total;dur={self.total_time * 1000:.1f}'
+        )
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает SQL-запросы, время БД и рендера шаблонов для каждого запроса,
+    отдаёт их в заголовке Server-Timing и пишет в лог предупреждение,
+    если view вышла за бюджет запросов из settings.QUERY_BUDGETS
+    (ключ - имя URL с пространством имён, например 'post:index').
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.perf = perf = RequestPerf()
+        started = time.perf_counter()
+        with connection.execute_wrapper(perf):
+            response = self.get_response(request)
+        perf.total_time = time.perf_counter() - started
+        response['Server-Timing'] = perf.server_timing()
+        match = request.resolver_match
+        budget = settings.QUERY_BUDGETS.get(match.view_name) if match else None
+        if budget is not None and perf.queries > budget:
+            logger.warning(
+                '%s: %d SQL-запросов при бюджете %d (%s)',
+                match.view_name, perf.queries, budget, request.path,
+            )
+        return response
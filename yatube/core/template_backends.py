@@ -0,0 +1,31 @@
+import time
+
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+
+class TimedTemplate(Template):
+    """
+    Шаблон, который добавляет время своего рендера к статистике запроса
+    (request.perf, её заводит core.middleware.QueryBudgetMiddleware).
+    """
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            perf = getattr(request, 'perf', None)
+            if perf is not None:
+                perf.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,77 @@
+from io import StringIO
+import random
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase, override_settings
+
+from core.management.commands import benchmark_views
+from posts.models import Comment, Follow, Group, Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        call_command(
+            'seed_benchmark', users=50, groups=3, posts=200, comments=100,
+            follows=5, image_files=2, stdout=StringIO(),
+        )
+
+    def test_seed(self):
+        """
+        Генератор создаёт заданное количество объектов, у части постов
+        есть картинки, комментарии не старше постов, популярность авторов
+        неравномерна.
+        """
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')).exists())
+        followers = sorted(Follow.objects.values('author').annotate(
+            total=Count('id')).values_list('total', flat=True))
+        self.assertGreater(followers[-1], 3 * followers[len(followers) // 2])
+
+    def test_seed_again(self):
+        """
+        Повторный запуск добавляет данные, а не конфликтует с прежними.
+        """
+        call_command('seed_benchmark', users=5, groups=1, posts=5,
+                     comments=0, image_files=0, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 55)
+
+    def test_benchmark_report(self):
+        """
+        Отчёт - по строке на view с процентилями, SQL и RPS, без ошибок.
+        """
+        out = StringIO()
+        call_command('benchmark_views', requests=3, concurrency=1, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines[1:]], [
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+        ])
+        for line in lines[1:]:
+            self.assertEqual(line.split()[1:3], ['3', '0'])
+
+    def test_feed_pages_by_cursor(self):
+        """
+        Страницы лент в нагрузочном тесте - по курсорам, а не ?page=N.
+        """
+        reader = User.objects.order_by('-counters__following_count').first()
+        urls = benchmark_views._urls('index', random.Random(0), 50, reader)
+        self.assertTrue(any('cursor=' in url for url in urls))
+        self.assertFalse(any('page=' in url for url in urls))
@@ -0,0 +1,112 @@
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from os import path
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {'SHARED': 'shared', 'LOCAL_MAX_ENTRIES': 2},
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': path.join(TEMP_CACHE_DIR, 'cache.sqlite3'),
+    },
+}
+
+
+@override_settings(CACHES=CACHES)
+class CacheBackendsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.shared = caches['shared']
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_sqlite_cache_operations(self):
+        """
+        Базовые операции кэша в файле SQLite.
+        """
+        self.shared.set('key', {'value': 1})
+        self.assertEqual(self.shared.get('key'), {'value': 1})
+        self.assertFalse(self.shared.add('key', 'other'))
+        self.assertTrue(self.shared.add('new', 'value'))
+        self.shared.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.shared.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.shared.delete_many(['a', 'b'])
+        self.assertIsNone(self.shared.get('a'))
+        self.shared.set('expired', 'value', timeout=0)
+        self.assertIsNone(self.shared.get('expired'))
+        self.assertTrue(self.shared.add('expired', 'fresh'))
+
+    def test_sqlite_cache_incr_is_atomic(self):
+        """
+        incr - один UPDATE: приращения из параллельных
+        соединений не теряются.
+        """
+        self.cache.set('counter', 0)
+
+        def worker():
+            for _ in range(50):
+                self.cache.incr('counter')
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+        self.assertEqual(self.cache.decr('counter', 10), 190)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('text', 'value')
+        with self.assertRaises(TypeError):
+            self.cache.incr('text')
+
+    def test_cache_benchmark_keeps_other_keys(self):
+        """
+        Замер не очищает кэш: удаляются только его собственные ключи.
+        """
+        self.cache.set('graph:journal', [1, 2])
+        call_command('cache_benchmark', aliases=['default'], workers=2,
+                     requests=20, keys=5, render_ms=0, stdout=StringIO())
+        self.assertEqual(self.cache.get('graph:journal'), [1, 2])
+        count = self.shared._connection().execute(
+            'SELECT COUNT(*) FROM cache').fetchone()[0]
+        self.assertEqual(count, 1)
+
+    def test_two_tier_keeps_fragments_locally(self):
+        """
+        Фрагменты шаблонов читаются из локального LRU,
+        остальные ключи - всегда из общего кэша.
+        """
+        self.cache.set('template.cache.card.1', '<article>')
+        self.cache.set('fragment:version:post:1', 'v1')
+        # другой воркер меняет общий кэш
+        self.shared.set('template.cache.card.1', '<changed>')
+        self.shared.set('fragment:version:post:1', 'v2')
+        self.assertEqual(self.cache.get('template.cache.card.1'),
+                         '<article>')
+        self.assertEqual(self.cache.get('fragment:version:post:1'), 'v2')
+
+    def test_two_tier_local_lru_is_bounded(self):
+        """
+        Локальный уровень вытесняет самые старые записи.
+        """
+        for i in range(3):
+            self.cache.set(f'template.cache.card.{i}', i)
+        self.shared.set('template.cache.card.0', 'from shared')
+        self.assertEqual(self.cache.get('template.cache.card.0'),
+                         'from shared')
+        self.assertEqual(len(self.cache._lru), 2)
@@ -0,0 +1,176 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from posts import graph, urls as posts_urls
+from posts.models import Comment, Follow, Group, Post
+from users import urls as users_urls
+
+User = get_user_model()
+
+# Постов больше, чем помещается на страницу, у каждого - комментарии
+# и свой комментатор: запрос "на каждую карточку" сразу выйдет за бюджет
+POSTS_COUNT = settings.PAGINATOR_OBJECTS_PER_PAGE + 2
+FOLLOWERS_COUNT = 5
+PASSWORD = 'Elementary-1887'
+# GET-параметры, без которых страница не делает основную работу
+PARAMS = {'post:search': {'query': 'Тестовый пост'}}
+
+
+# Граф подписок - как в работе: один на процесс, уже загруженный
+@override_settings(FOLLOW_GRAPH_SHARED=True)
+class QueryBudgetsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='SherlockHolmes')
+        cls.reader = User.objects.create_user(
+            username='DrJohnHWatson', password=PASSWORD)
+        # подписывается и отписывается по-настоящему - не повторная
+        # подписка и не отписка от того, на кого не подписан
+        cls.newcomer = User.objects.create_user(username='Lestrade')
+        cls.leaver = User.objects.create_user(username='Moriarty')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for number in range(POSTS_COUNT):
+            post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый пост {number}',
+                group=cls.group,
+            )
+            commentator = User.objects.create_user(
+                username=f'commentator{number}')
+            for text in ('Первый комментарий', 'Второй комментарий'):
+                Comment.objects.create(
+                    post=post, author=commentator, text=text)
+        cls.post = post
+        for number in range(FOLLOWERS_COUNT):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'follower{number}'),
+                author=cls.author,
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.leaver, author=cls.author)
+        post_form = {'text': 'Новый пост', 'group': cls.group.id}
+        # (имя URL, аргументы, кто запрашивает (None - гость),
+        # данные POST или None для GET)
+        cls.cases = [
+            ('post:index', {}, cls.reader, None),
+            ('post:group', {}, cls.reader, None),
+            ('post:group_list', {'slug': cls.group.slug}, cls.reader, None),
+            ('post:profile', {'username': cls.author.username},
+             cls.reader, None),
+            ('post:followers', {'username': cls.author.username},
+             cls.reader, None),
+            ('post:following', {'username': cls.reader.username},
+             cls.reader, None),
+            ('post:post_detail', {'post_id': cls.post.id}, cls.reader, None),
+            ('post:post_create', {}, cls.reader, None),
+            ('post:post_create', {}, cls.author, post_form),
+            ('post:post_edit', {'post_id': cls.post.id}, cls.author, None),
+            ('post:post_edit', {'post_id': cls.post.id}, cls.author,
+             {**post_form, 'text': 'Исправленный пост'}),
+            ('post:add_comment', {'post_id': cls.post.id}, cls.reader,
+             {'text': 'Новый комментарий'}),
+            ('post:comments', {'post_id': cls.post.id}, cls.reader, None),
+            ('post:hole', {'name': 'header'}, cls.reader, None),
+            ('post:search', {}, cls.reader, None),
+            ('post:follow_index', {}, cls.reader, None),
+            ('post:profile_follow', {'username': cls.author.username},
+             cls.newcomer, None),
+            ('post:profile_unfollow', {'username': cls.author.username},
+             cls.leaver, None),
+            ('post:api_index', {}, cls.reader, None),
+            ('post:api_group_list', {'slug': cls.group.slug},
+             cls.reader, None),
+            ('post:api_profile', {'username': cls.author.username},
+             cls.reader, None),
+            ('post:api_follow_index', {}, cls.reader, None),
+            ('post:api_post_detail', {'post_id': cls.post.id},
+             cls.reader, None),
+            ('users:signup', {}, None, None),
+            ('users:signup', {}, None, {
+                'username': 'IreneAdler', 'email': 'irene@example.com',
+                'password1': PASSWORD, 'password2': PASSWORD,
+            }),
+            ('users:logout', {}, cls.reader, None),
+            ('users:login', {}, None, None),
+            ('users:login', {}, None, {
+                'username': cls.reader.username, 'password': PASSWORD,
+            }),
+            ('users:password_reset_form', {}, cls.reader, None),
+            ('users:password_reset_done', {}, cls.reader, None),
+            ('users:password_change_form', {}, cls.reader, None),
+            ('users:password_change_done', {}, cls.reader, None),
+            ('users:password_reset_confirm', {
+                'uidb64': urlsafe_base64_encode(force_bytes(cls.reader.pk)),
+                'token': default_token_generator.make_token(cls.reader),
+            }, cls.reader, None),
+            ('users:password_reset_complete', {}, cls.reader, None),
+        ]
+
+    def tearDown(self):
+        graph.reset()
+
+    def test_every_url_has_budget(self):
+        """
+        У каждого именованного URL posts и users объявлен бюджет
+        запросов и есть проверка в этом тесте.
+        """
+        names = {
+            f'{module.app_name}:{pattern.name}'
+            for module in (posts_urls, users_urls)
+            for pattern in module.urlpatterns
+        }
+        self.assertEqual(names - set(settings.QUERY_BUDGETS), set())
+        self.assertEqual(names, {case[0] for case in self.cases})
+
+    def test_views_within_query_budget(self):
+        """
+        Ни одна страница с холодным кэшем и ни одна запись (POST формы,
+        настоящая подписка и отписка) не делает больше SQL-запросов,
+        чем записано в settings.QUERY_BUDGETS.
+        """
+        for name, kwargs, user, data in self.cases:
+            method = 'POST' if data is not None else 'GET'
+            with self.subTest(url=name, method=method,
+                              user=user and user.username):
+                cache.clear()
+                graph.reset()
+                graph.get_graph()
+                client = Client()
+                if user is not None:
+                    client.force_login(user)
+                url = reverse(name, kwargs=kwargs)
+                if data is None:
+                    response = client.get(url, PARAMS.get(name))
+                else:
+                    response = client.post(url, data)
+                    # форма принята - иначе замерен бы только её повторный
+                    # показ с ошибками
+                    self.assertEqual(response.status_code, 302)
+                perf = response.wsgi_request.perf
+                self.assertLessEqual(
+                    perf.queries, settings.QUERY_BUDGETS.get(name, 0),
+                    f'{name} ({method}): {perf.queries} SQL-запросов',
+                )
+                self.assertIn('Server-Timing', response)
+        # подписка и отписка действительно произошли
+        self.assertTrue(Follow.objects.filter(
+            user=self.newcomer, author=self.author).exists())
+        self.assertFalse(Follow.objects.filter(
+            user=self.leaver, author=self.author).exists())
+        self.assertTrue(Post.objects.filter(text='Новый пост').exists())
+        self.assertTrue(Post.objects.filter(
+            text='Исправленный пост').exists())
+        self.assertTrue(Comment.objects.filter(
+            text='Новый комментарий').exists())
+        self.assertTrue(User.objects.filter(username='IreneAdler').exists())
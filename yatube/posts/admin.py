@@ -1,18 +1,117 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 
-from .models import Group, Post
+from . import search
+from .models import Comment, Follow, Group, Post
+from .paginators import EstimatedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """
+    Автодополнение, которому выбранный объект передают готовым
+    (из select_related строки списка) - без запроса на каждую строку.
+    """
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        empty = self.choices.field.empty_values
+        values = {str(item) for item in value if str(item) not in empty}
+        # значение могло измениться (форма с ошибками) - тогда как обычно
+        if self.selected is None or values != {
+                str(obj.pk) for obj in self.selected}:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        for obj in self.selected:
+            options.append(self.create_option(
+                name, obj.pk, self.choices.field.label_from_instance(obj),
+                True, len(options)))
+        return [(None, options, 0)]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Общие настройки для таблиц с миллионами строк: количество строк
+    оценивается без COUNT(*) по всей таблице, связанные объекты
+    выбираются одним JOIN, внешние ключи - через автодополнение
+    вместо <select> со всеми объектами.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        """
+        В редактируемых колонках выбранные объекты берутся из строки
+        списка (list_select_related), а не запросом на каждый виджет.
+        """
+        names = [name for name in self.list_editable
+                 if name in self.get_autocomplete_fields(request)]
+        base = super().get_changelist_form(request, **kwargs)
+
+        class ChangeListForm(base):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name in names:
+                    widget = self.fields[name].widget
+                    widget = getattr(widget, 'widget', widget)
+                    related = getattr(self.instance, name)
+                    widget.selected = [] if related is None else [related]
+
+        return ChangeListForm
+
+
+class PostAdmin(LargeTableAdmin):
     """
     Параметры отображения модели Post (посты)
     в интерфейсе администратора.
     """
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
     list_editable = ('group',)
+    autocomplete_fields = ('author', 'group')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Поиск по тексту - через полнотекстовый индекс, а не LIKE.
+        """
+        if not search_term:
+            return queryset, False
+        return search.filter_posts(queryset, search_term), False
+
+
+class CommentAdmin(LargeTableAdmin):
+    """
+    Параметры отображения модели Comment (комментарии)
+    в интерфейсе администратора.
+    """
+    list_display = ('pk', 'text', 'created', 'author', 'post')
+    list_select_related = ('author', 'post')
+    # точное совпадение - по уникальному индексу username
+    search_fields = ('=author__username',)
+    list_filter = ('created',)
+    autocomplete_fields = ('author', 'post')
+
+
+class FollowAdmin(LargeTableAdmin):
+    """
+    Параметры отображения модели Follow (подписки)
+    в интерфейсе администратора.
+    """
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    autocomplete_fields = ('user', 'author')
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -21,10 +120,12 @@ class GroupAdmin(admin.ModelAdmin):
     в интерфейсе администратора.
     """
     list_display = ('pk', 'title', 'slug', 'description')
-    search_fields = ('description',)
+    search_fields = ('title', 'description')
     list_filter = ('title',)
     empty_value_display = '-пусто-'
 
 
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
@@ -0,0 +1,173 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from . import fragments, timeline
+from .conditional import make_etag, page_validators, respond
+from .models import Comment, Group, Post, User
+from .paginators import KeysetPaginator
+
+# Поля поста в ответе API: всё берётся через .values() одним JOIN,
+# объекты моделей не создаются
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'thumbnails', 'comments_count',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+COMMENT_FIELDS = (
+    'id', 'text', 'created',
+    'author__username', 'author__first_name', 'author__last_name',
+)
+
+
+def conditional(request, etag, build):
+    """
+    Условный JSON-ответ: build() возвращает данные и вызывается,
+    только если у клиента устаревшая версия.
+    """
+    return respond(request, etag, lambda: JsonResponse(build()))
+
+
+def _author(row):
+    username = row['author__username']
+    return {
+        'username': username,
+        'full_name': (f'{row["author__first_name"]} '
+                      f'{row["author__last_name"]}').strip(),
+        'url': reverse('post:profile', args=[username]),
+    }
+
+
+def _image(row):
+    """
+    Картинка и готовые миниатюры (те же правила, что Post.thumbnail_data);
+    пока миниатюр нет - только исходная картинка.
+    """
+    if not row['image']:
+        return None
+    thumbnails = json.loads(row['thumbnails']) if row['thumbnails'] else {}
+    if thumbnails.get('source') != row['image']:
+        thumbnails = {}
+    return {
+        'url': default_storage.url(row['image']),
+        'thumbnails': thumbnails.get('urls', {}),
+    }
+
+
+def serialize_post(row):
+    slug = row['group__slug']
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'url': reverse('post:post_detail', args=[row['id']]),
+        'author': _author(row),
+        'group': {
+            'slug': slug,
+            'title': row['group__title'],
+            'url': reverse('post:group_list', args=[slug]),
+        } if slug else None,
+        'image': _image(row),
+        'comments_count': row['comments_count'],
+    }
+
+
+def feed(request, rows, ordering=('-pub_date', '-id')):
+    """
+    Страница ленты по курсору (?cursor=). Строки ленты - только
+    id и pub_date (по индексу ленты): из них и версий карточек
+    считается ETag (conditional.page_validators). Поля постов выбираются
+    вторым запросом, только если ответ не 304.
+    """
+    paginator = KeysetPaginator(
+        rows, settings.PAGINATOR_OBJECTS_PER_PAGE, ordering=ordering)
+    page = paginator.page_by_cursor(request.GET.get('cursor'))
+    key = ordering[-1].lstrip('-')
+    ids = [row[key] for row in page]
+    parts = page_validators(page, key)
+
+    def build():
+        rows = {row['id']: row for row in
+                Post.objects.filter(id__in=ids).values(*POST_FIELDS)}
+        return {
+            'posts': [serialize_post(rows[post_id])
+                      for post_id in ids if post_id in rows],
+            'next_cursor': paginator.next_cursor,
+        }
+
+    return conditional(request, make_etag(*parts), build)
+
+
+def index(request):
+    """
+    Лента всех постов в JSON.
+    """
+    return feed(request, Post.objects.values('id', 'pub_date'))
+
+
+def group_posts(request, slug):
+    """
+    Лента сообщества в JSON.
+    """
+    group_id = get_object_or_404(
+        Group.objects.values_list('id', flat=True), slug=slug)
+    return feed(request, Post.objects.filter(
+        group_id=group_id).values('id', 'pub_date'))
+
+
+def profile(request, username):
+    """
+    Лента автора в JSON.
+    """
+    author_id = get_object_or_404(
+        User.objects.values_list('id', flat=True), username=username)
+    return feed(request, Post.objects.filter(
+        author_id=author_id).values('id', 'pub_date'))
+
+
+@login_required
+def follow_index(request):
+    """
+    Лента подписок пользователя в JSON.
+    """
+    return feed(request, timeline.timeline_rows(request.user),
+                timeline.ORDERING)
+
+
+def post_detail(request, post_id):
+    """
+    Пост и страница его комментариев (?cursor=) в JSON.
+    ETag - от версии карточки, которая меняется при правке поста
+    и любом комментарии.
+    """
+    get_object_or_404(Post.objects.values_list('id', flat=True), pk=post_id)
+    cursor = request.GET.get('cursor')
+    etag = make_etag(
+        post_id, fragments.card_versions([post_id])[post_id], cursor)
+
+    def build():
+        post = Post.objects.values(*POST_FIELDS).get(pk=post_id)
+        paginator = KeysetPaginator(
+            Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+            settings.COMMENTS_PER_PAGE, ordering=('created', 'id'))
+        comments = paginator.page_by_cursor(cursor)
+        return {
+            'post': serialize_post(post),
+            'comments': [
+                {
+                    'id': row['id'],
+                    'text': row['text'],
+                    'created': row['created'],
+                    'author': _author(row),
+                }
+                for row in comments
+            ],
+            'next_cursor': paginator.next_cursor,
+        }
+
+    return conditional(request, etag, build)
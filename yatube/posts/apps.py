@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Посты'
+
+    def ready(self):
+        # подключаем обработчики сигналов (ленты подписок)
+        from . import signals  # noqa: F401
+        from django.conf import settings
+        from django.core.signals import request_started
+
+        # фоновый прогрев кэша страниц стартует с первым запросом
+        # в каждом процессе веб-сервера (warmup.start)
+        if settings.WARM_CACHE_ON_START:
+            from . import warmup
+
+            request_started.connect(warmup.start, dispatch_uid='warmup')
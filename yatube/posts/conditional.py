@@ -0,0 +1,94 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import quote_etag
+
+from . import fragments
+
+
+def make_etag(*parts):
+    """
+    Сильный ETag - хэш частей (версий, id, курсоров).
+    """
+    digest = hashlib.md5()
+    for part in parts:
+        digest.update(f'{part};'.encode())
+    return quote_etag(digest.hexdigest())
+
+
+def respond(request, etag, build):
+    """
+    Ответ с ETag. Если у клиента та же версия (If-None-Match) - 304,
+    и build() не вызывается: ни выборки страницы, ни шаблона.
+    Last-Modified не отдаётся: правка поста или комментарий не меняют
+    ни одной даты страницы, и If-Modified-Since получал бы устаревший 304.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = build()
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+    return response
+
+
+def page_validators(page, key='id'):
+    """
+    Валидаторы страницы ленты из строк .values(key, 'pub_date'):
+    id и версии карточек (меняются при правке поста, комментариях,
+    готовых миниатюрах), курсоры соседних страниц.
+    """
+    paginator = page.paginator
+    ids = [row[key] for row in page]
+    versions = fragments.card_versions(ids)
+    return [
+        page.number,
+        getattr(paginator, 'next_cursor', None),
+        getattr(paginator, 'previous_cursor', None),
+        *(f'{post_id}:{versions[post_id]}' for post_id in ids),
+    ]
+
+
+def validate(request, validators, args, kwargs):
+    """
+    Валидаторы считаются один раз на запрос: ими пользуются
+    и условные ответы, и кэш страниц (posts/pagecache.py).
+    """
+    memo = request.__dict__.setdefault('_validators', {})
+    if validators not in memo:
+        memo[validators] = validators(request, *args, **kwargs)
+    return memo[validators]
+
+
+def conditional_page(validators):
+    """
+    Условные ответы для HTML-страницы. validators(request, *args, **kwargs)
+    дешёвыми запросами возвращает части ETag; к ETag
+    добавляется пользователь - шапка и формы у вошедших свои.
+    Гостям - Cache-Control: public (страницу может кэшировать обратный
+    прокси), вошедшим - private, no-cache; Vary: Cookie - всем.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            parts = validate(request, validators, args, kwargs)
+            user = request.user
+            etag = make_etag(
+                user.pk if user.is_authenticated else '-', *parts)
+            response = respond(
+                request, etag, lambda: view(request, *args, **kwargs))
+            if response.status_code not in (200, 304):
+                return response
+            patch_vary_headers(response, ('Cookie',))
+            if user.is_authenticated or response.cookies:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response, public=True,
+                    max_age=settings.PAGE_CACHE_MAX_AGE)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserCounters
+
+
+def _count_subquery(queryset, field):
+    """
+    Подзапрос "количество строк queryset, где field = pk внешней строки".
+    """
+    counted = (
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def rebuild_user(user_id):
+    """
+    Пересчёт счётчиков одного пользователя с нуля.
+    """
+    counters, _ = UserCounters.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+        },
+    )
+    return counters
+
+
+def change_user(user_id, field, delta):
+    """
+    Атомарное изменение счётчика пользователя на delta.
+    Если строки счётчиков ещё нет - она создаётся пересчётом.
+    """
+    updated = UserCounters.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta})
+    if not updated and delta > 0:
+        rebuild_user(user_id)
+
+
+def change_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def rebuild_all(batch_size=1000):
+    """
+    Пересчёт всех счётчиков: комментарии постов и счётчики пользователей.
+    Возвращает количество обработанных постов и пользователей.
+    Всё в одной транзакции: читатели не видят пустую таблицу
+    счётчиков между удалением и вставкой.
+    """
+    with transaction.atomic():
+        posts = Post.objects.update(
+            comments_count=_count_subquery(Comment.objects.all(), 'post'))
+        UserCounters.objects.all().delete()
+        users = User.objects.annotate(
+            posts_total=_count_subquery(Post.objects.all(), 'author'),
+            followers_total=_count_subquery(Follow.objects.all(), 'author'),
+            following_total=_count_subquery(Follow.objects.all(), 'user'),
+        ).values_list(
+            'pk', 'posts_total', 'followers_total', 'following_total')
+        batch = []
+        total = 0
+        for user_id, posts_total, followers, following in users.iterator():
+            batch.append(UserCounters(
+                user_id=user_id,
+                posts_count=posts_total,
+                followers_count=followers,
+                following_count=following,
+            ))
+            if len(batch) >= batch_size:
+                UserCounters.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        UserCounters.objects.bulk_create(batch)
+        return posts, total + len(batch)
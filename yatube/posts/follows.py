@@ -0,0 +1,76 @@
+from django.db import connections, router
+
+from . import counters, fragments, graph, suggestions, timeline, warmup
+from .models import Follow, Suggestion
+
+
+def followed(user_id, author_id):
+    """
+    Всё, что меняет новая подписка: счётчики, шапки профилей обоих,
+    лента читателя, граф подписок, рекомендации, прогрев страниц.
+    Вызывается из follow() и из сигнала post_save модели Follow.
+    """
+    counters.change_user(author_id, 'followers_count', 1)
+    counters.change_user(user_id, 'following_count', 1)
+    fragments.bump_author(user_id)
+    fragments.bump_author(author_id)
+    timeline.fill_from_author(user_id, author_id)
+    graph.record(graph.FOLLOW, user_id, author_id)
+    suggestions.enqueue(user_id)
+    Suggestion.objects.filter(user_id=user_id, author_id=author_id).delete()
+    warmup.invalidated()
+
+
+def unfollowed(user_id, author_id):
+    """
+    То же для отписки; из unfollow() и из сигнала post_delete.
+    """
+    counters.change_user(author_id, 'followers_count', -1)
+    counters.change_user(user_id, 'following_count', -1)
+    fragments.bump_author(user_id)
+    fragments.bump_author(author_id)
+    timeline.drop_author(user_id, author_id)
+    graph.record(graph.UNFOLLOW, user_id, author_id)
+    suggestions.enqueue(user_id)
+    warmup.invalidated()
+
+
+def _execute(sql, params):
+    using = router.db_for_write(Follow)
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def follow(user, author):
+    """
+    Подписка одним INSERT ... ON CONFLICT DO NOTHING. Повторная подписка
+    (двойной клик, два запроса одновременно) упирается в уникальный
+    индекс follow_unique и ничего не меняет; followed() (счётчики, лента)
+    вызывается, только если строка действительно добавлена.
+    Возвращает True, если подписка создана.
+    """
+    created = _execute(
+        f'INSERT INTO {Follow._meta.db_table} (user_id, author_id) '
+        'VALUES (%s, %s) ON CONFLICT DO NOTHING', [user.pk, author.pk],
+    ) == 1
+    if created:
+        followed(user.pk, author.pk)
+    return created
+
+
+def unfollow(user, author):
+    """
+    Отписка одним DELETE, без предварительного SELECT.
+    unfollowed() вызывается, только если строка действительно удалена
+    этим запросом, - при двух одновременных отписках счётчики
+    не уменьшатся дважды.
+    Возвращает True, если подписка была удалена.
+    """
+    deleted = _execute(
+        f'DELETE FROM {Follow._meta.db_table} '
+        'WHERE user_id = %s AND author_id = %s', [user.pk, author.pk],
+    ) == 1
+    if deleted:
+        unfollowed(user.pk, author.pk)
+    return deleted
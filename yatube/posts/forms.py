@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from .images import normalize
 from .models import Post, Comment
 
 
@@ -10,6 +13,16 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        """
+        Новую картинку уменьшаем и пересжимаем без метаданных
+        ещё до сохранения в MEDIA_ROOT.
+        """
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            image, _ = normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     """
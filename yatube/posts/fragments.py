@@ -0,0 +1,125 @@
+import hashlib
+import itertools
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'fragment:version:post:{}'
+BUMP_CHUNK_SIZE = 1000
+# Блоки боковой панели страницы поста - общие для всех посетителей
+SIDEBAR_VERSION_KEY = 'fragment:version:sidebar:{}'
+SIDEBAR_BLOCKS = ('groups', 'latest_posts', 'related')
+# Шапка профиля: счётчики, последние подписчики и подписки
+AUTHOR_VERSION_KEY = 'fragment:version:author:{}'
+
+
+def _new_version():
+    return uuid4().hex[:12]
+
+
+def bump_post(post_id):
+    """
+    Новая версия карточки поста: старые фрагменты больше не найдутся по
+    ключу и тихо истекут, остальные карточки и страницы не затрагиваются.
+    """
+    cache.set(VERSION_KEY.format(post_id), _new_version(),
+              settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def bump_posts(post_ids):
+    """
+    Новые версии многих карточек - когда изменилось то, что выводится
+    в каждой из них (имя автора, название сообщества).
+    post_ids - итератор, версии пишутся пачками.
+    """
+    post_ids = iter(post_ids)
+    while True:
+        chunk = list(itertools.islice(post_ids, BUMP_CHUNK_SIZE))
+        if not chunk:
+            return
+        cache.set_many(
+            {VERSION_KEY.format(post_id): _new_version()
+             for post_id in chunk},
+            settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def card_versions(post_ids):
+    """
+    Версии карточек одним запросом к кэшу; недостающие создаются.
+    Версия - случайный токен, а не счётчик, поэтому потеря ключа
+    в кэше не может вернуть устаревший фрагмент.
+    """
+    keys = {VERSION_KEY.format(post_id): post_id for post_id in post_ids}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, settings.FRAGMENT_CACHE_TIMEOUT)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_sidebar(block):
+    """
+    Новая версия блока боковой панели (groups, latest_posts или related).
+    """
+    cache.set(SIDEBAR_VERSION_KEY.format(block), _new_version(),
+              settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def sidebar_versions():
+    """
+    Версии всех блоков боковой панели одним запросом к кэшу.
+    """
+    keys = {SIDEBAR_VERSION_KEY.format(block): block
+            for block in SIDEBAR_BLOCKS}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, settings.FRAGMENT_CACHE_TIMEOUT)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_author(user_id):
+    """
+    Новая версия шапки профиля пользователя.
+    """
+    cache.set(AUTHOR_VERSION_KEY.format(user_id), _new_version(),
+              settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def author_version(user_id):
+    key = AUTHOR_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        cache.set(key, version, settings.FRAGMENT_CACHE_TIMEOUT)
+    return version
+
+
+def list_cache_key(page_obj):
+    """
+    Проставляет постам страницы post.card_version и возвращает ключ
+    фрагмента всего списка: хэш id и версий карточек на странице.
+    Ключ меняется, только если изменился состав страницы
+    или одна из её карточек.
+    """
+    posts = list(page_obj)
+    versions = card_versions(post.id for post in posts)
+    digest = hashlib.md5()
+    for post in posts:
+        post.card_version = versions[post.id]
+        digest.update(f'{post.id}:{post.card_version};'.encode())
+    return digest.hexdigest()
+
+
+def list_context(page_obj):
+    """
+    Общая часть контекста для шаблонов со списком карточек постов.
+    """
+    return {
+        'page_obj': page_obj,
+        'list_cache_key': list_cache_key(page_obj),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,312 @@
+import array
+import bisect
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+# Журнал изменений графа в общем кэше: по ключу на запись,
+# номер записи занимается атомарным cache.add
+LOG_KEY = 'follow_graph:log:{}'
+# Последний известный номер записи (подсказка для догоняющих воркеров)
+SEQ_KEY = 'follow_graph:seq'
+# Сколько записей журнала читать за один get_many
+LOG_BATCH = 100
+FOLLOW, UNFOLLOW = 'follow', 'unfollow'
+# Массовое изменение подписок (импорт) - граф перечитывается из базы
+RELOAD = 'reload'
+SNAPSHOT_HEADER = struct.Struct('<4sQQ')
+SNAPSHOT_MAGIC = b'YFG1'
+
+_graph = None
+_graph_lock = threading.Lock()
+
+
+def _insert(adjacency, node, value):
+    values = adjacency.get(node)
+    if values is None:
+        adjacency[node] = array.array('I', [value])
+        return
+    index = bisect.bisect_left(values, value)
+    if index == len(values) or values[index] != value:
+        values.insert(index, value)
+
+
+def _remove(adjacency, node, value):
+    values = adjacency.get(node)
+    if not values:
+        return
+    index = bisect.bisect_left(values, value)
+    if index < len(values) and values[index] == value:
+        del values[index]
+        if not values:
+            del adjacency[node]
+
+
+def _contains(values, value):
+    index = bisect.bisect_left(values, value)
+    return index < len(values) and values[index] == value
+
+
+def _write_adjacency(file, adjacency):
+    nodes = array.array('I', sorted(adjacency))
+    degrees = array.array('I', (len(adjacency[node]) for node in nodes))
+    file.write(struct.pack('<Q', len(nodes)))
+    nodes.tofile(file)
+    degrees.tofile(file)
+    for node in nodes:
+        adjacency[node].tofile(file)
+
+
+def _read_adjacency(file, edges):
+    (count,) = struct.unpack('<Q', file.read(8))
+    nodes, degrees, targets = (
+        array.array('I'), array.array('I'), array.array('I'))
+    nodes.fromfile(file, count)
+    degrees.fromfile(file, count)
+    targets.fromfile(file, edges)
+    adjacency = {}
+    start = 0
+    for node, degree in zip(nodes, degrees):
+        adjacency[node] = targets[start:start + degree]
+        start += degree
+    return adjacency
+
+
+class FollowGraph:
+    """
+    Граф подписок в памяти процесса. Для каждого пользователя хранится
+    отсортированный массив (array('I'), 4 байта на ребро) тех, на кого он
+    подписан, и тех, кто подписан на него: проверка подписки - бинарный
+    поиск, списки - готовые массивы, без запросов к posts_follow.
+
+    Изменения из сигналов Follow пишутся в журнал в общем кэше, остальные
+    воркеры применяют его при sync(). Если журнал потерян (кэш очищен,
+    записи истекли) - граф перечитывается из базы.
+    """
+    def __init__(self):
+        self._following = {}
+        self._followers = {}
+        self.edges = 0
+        self.seq = 0
+        self._synced_at = 0.0
+        self._lock = threading.RLock()
+
+    # Чтение
+
+    def follows(self, user_id, author_id):
+        values = self._following.get(user_id)
+        return bool(values) and _contains(values, author_id)
+
+    def following(self, user_id):
+        """
+        На кого подписан пользователь (id по возрастанию).
+        """
+        return list(self._following.get(user_id, ()))
+
+    def followers(self, author_id):
+        """
+        Подписчики автора (id по возрастанию).
+        """
+        return list(self._followers.get(author_id, ()))
+
+    def mutual(self, user_id):
+        """
+        Взаимные подписки: на кого подписан пользователь и кто подписан
+        на него самого.
+        """
+        following = self._following.get(user_id, ())
+        followers = self._followers.get(user_id, ())
+        if len(following) > len(followers):
+            following, followers = followers, following
+        return sorted(set(following).intersection(followers))
+
+    # Изменения
+
+    def _apply(self, operation, user_id, author_id):
+        had = self.follows(user_id, author_id)
+        if operation == FOLLOW and not had:
+            _insert(self._following, user_id, author_id)
+            _insert(self._followers, author_id, user_id)
+            self.edges += 1
+        elif operation == UNFOLLOW and had:
+            _remove(self._following, user_id, author_id)
+            _remove(self._followers, author_id, user_id)
+            self.edges -= 1
+
+    def load_from_db(self, seq=None):
+        """
+        Полная загрузка графа из posts_follow. Номер журнала берётся
+        до чтения таблицы: записи, сделанные во время загрузки,
+        применятся повторно, а операции идемпотентны.
+        """
+        with self._lock:
+            if seq is None:
+                seq = cache.get(SEQ_KEY, 0)
+            following, followers = {}, {}
+            edges = 0
+            rows = Follow.objects.order_by('user_id', 'author_id').values_list(
+                'user_id', 'author_id')
+            for user_id, author_id in rows.iterator(chunk_size=10000):
+                # строки идут по возрастанию user_id - массивы подписчиков
+                # тоже получаются отсортированными
+                following.setdefault(user_id, array.array('I')).append(
+                    author_id)
+                followers.setdefault(author_id, array.array('I')).append(
+                    user_id)
+                edges += 1
+            self._following, self._followers = following, followers
+            self.edges = edges
+            self.seq = seq
+            self._synced_at = 0.0
+            self.sync(force=True)
+
+    def sync(self, force=False):
+        """
+        Применяет новые записи журнала не чаще раза
+        в FOLLOW_GRAPH_SYNC_INTERVAL секунд (одно обращение к кэшу).
+        """
+        now = time.monotonic()
+        if (not force and now - self._synced_at
+                < settings.FOLLOW_GRAPH_SYNC_INTERVAL):
+            return
+        with self._lock:
+            while True:
+                keys = [LOG_KEY.format(self.seq + number)
+                        for number in range(1, LOG_BATCH + 1)]
+                found = cache.get_many(keys + [SEQ_KEY])
+                latest = found.get(SEQ_KEY)
+                if latest is None and self.seq:
+                    # общий кэш очищен - журнала больше нет
+                    return self.load_from_db()
+                applied = 0
+                for key in keys:
+                    if key not in found:
+                        break
+                    applied += 1
+                    if found[key][0] == RELOAD:
+                        return self.load_from_db(seq=self.seq + applied)
+                    self._apply(*found[key])
+                self.seq += applied
+                if not applied and latest is not None and latest > self.seq:
+                    # пропущенные записи истекли - догнать по журналу нельзя
+                    return self.load_from_db()
+                if applied < LOG_BATCH:
+                    break
+            self._synced_at = now
+
+    def record(self, operation, user_id, author_id):
+        """
+        Записывает изменение в журнал под следующим свободным номером
+        и применяет к своему графу (вместе с чужими записями до него).
+        """
+        with self._lock:
+            self.sync(force=True)
+            seq = self.seq + 1
+            while not cache.add(LOG_KEY.format(seq),
+                                (operation, user_id, author_id),
+                                settings.FOLLOW_GRAPH_LOG_TIMEOUT):
+                seq += 1
+            cache.set(SEQ_KEY, max(seq, cache.get(SEQ_KEY, 0)), None)
+            self.sync(force=True)
+
+    # Снимок
+
+    def save_snapshot(self, path):
+        """
+        Снимок графа в бинарный файл: массивы пишутся как есть,
+        поэтому воркер поднимает граф без обращения к базе.
+        """
+        with self._lock:
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as file:
+                file.write(SNAPSHOT_HEADER.pack(
+                    SNAPSHOT_MAGIC, self.seq, self.edges))
+                _write_adjacency(file, self._following)
+                _write_adjacency(file, self._followers)
+            os.replace(temporary, path)
+
+    def load_snapshot(self, path):
+        """
+        Загружает снимок и догоняет его по журналу. Если снимок устарел
+        сильнее, чем хранится журнал, - sync() сам перечитает базу.
+        Возвращает False, если файла нет или он не подходит.
+        """
+        try:
+            with open(path, 'rb') as file:
+                magic, seq, edges = SNAPSHOT_HEADER.unpack(
+                    file.read(SNAPSHOT_HEADER.size))
+                if magic != SNAPSHOT_MAGIC:
+                    return False
+                following = _read_adjacency(file, edges)
+                followers = _read_adjacency(file, edges)
+        except (OSError, EOFError, struct.error):
+            return False
+        with self._lock:
+            self._following, self._followers = following, followers
+            self.edges = edges
+            self.seq = seq
+            self.sync(force=True)
+        return True
+
+
+def get_graph():
+    """
+    Граф подписок текущего процесса: при первом обращении - из снимка
+    FOLLOW_GRAPH_SNAPSHOT (если есть) или из базы, дальше - синхронизация
+    по журналу. В тестах (FOLLOW_GRAPH_SHARED = False) граф строится
+    заново при каждом обращении: база между тестами откатывается,
+    а память процесса - нет.
+    """
+    global _graph
+    if not settings.FOLLOW_GRAPH_SHARED:
+        graph = FollowGraph()
+        graph.load_from_db()
+        return graph
+    if _graph is None:
+        with _graph_lock:
+            if _graph is None:
+                graph = FollowGraph()
+                snapshot = settings.FOLLOW_GRAPH_SNAPSHOT
+                if not (snapshot and graph.load_snapshot(snapshot)):
+                    graph.load_from_db()
+                _graph = graph
+    _graph.sync()
+    return _graph
+
+
+def reset():
+    """
+    Забыть граф процесса - при следующем обращении он загрузится заново.
+    """
+    global _graph
+    with _graph_lock:
+        _graph = None
+
+
+def record(operation, user_id, author_id):
+    """
+    Изменение подписки из сигнала: в журнал для всех воркеров -
+    после фиксации транзакции, иначе при откате воркеры увидят
+    подписку, которой в базе нет.
+    """
+    if not settings.FOLLOW_GRAPH_SHARED:
+        return
+    transaction.on_commit(
+        lambda: get_graph().record(operation, user_id, author_id))
+
+
+def reload():
+    """
+    Подписки изменены в обход сигналов (импорт): все воркеры
+    перечитают граф из базы, дойдя до этой записи журнала.
+    """
+    if not settings.FOLLOW_GRAPH_SHARED:
+        return
+    transaction.on_commit(lambda: get_graph().record(RELOAD, 0, 0))
@@ -0,0 +1,93 @@
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые сохраняем как есть (после пересжатия);
+# остальные (BMP, TIFF, ...) переводим в JPEG или PNG с прозрачностью
+KEEP_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def check_pixels(image):
+    """
+    Размер берётся из заголовка файла - до декодирования картинки.
+    """
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большая картинка: %(width)d×%(height)d пикселей, '
+            'допустимо не больше %(limit)d.',
+            code='image_too_large',
+            params={'width': width, 'height': height,
+                    'limit': settings.IMAGE_MAX_PIXELS},
+        )
+
+
+def _encode(image, pil_format):
+    buffer = BytesIO()
+    options = {}
+    if pil_format in ('JPEG', 'WEBP'):
+        options['quality'] = settings.IMAGE_QUALITY
+    if pil_format in ('JPEG', 'PNG'):
+        options['optimize'] = True
+    if pil_format == 'JPEG':
+        options['progressive'] = True
+    # exif/icc не передаём - метаданные (в т.ч. геометка) не сохраняются
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _has_metadata(upload):
+    upload.seek(0)
+    info = Image.open(upload).info
+    return any(key in info for key in ('exif', 'icc_profile', 'xmp'))
+
+
+def normalize(upload):
+    """
+    Уменьшает загруженную картинку до IMAGE_MAX_SIDE по большей стороне,
+    поворачивает по EXIF и пересжимает без метаданных.
+    Возвращает новый файл для ImageField и (было байт, стало байт).
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    check_pixels(image)
+    source_format = image.format
+    max_side = settings.IMAGE_MAX_SIDE
+    animated = getattr(image, 'n_frames', 1) > 1
+    if animated:
+        # анимацию не пересобираем, только проверяем размер
+        upload.seek(0)
+        return upload, (upload.size, upload.size)
+    if source_format == 'JPEG':
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе
+        image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    resized = max(image.size) > max_side
+    if resized:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    pil_format = source_format if source_format in KEEP_FORMATS else None
+    if pil_format is None:
+        pil_format = 'PNG' if 'A' in image.getbands() else 'JPEG'
+    if pil_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    content = _encode(image, pil_format)
+    if (not resized and pil_format == source_format
+            and len(content) >= upload.size and not _has_metadata(upload)):
+        # пересжатие ничего не дало, а удалять нечего - оставляем исходник
+        upload.seek(0)
+        return upload, (upload.size, upload.size)
+    name = '%s.%s' % (os.path.splitext(os.path.basename(upload.name))[0],
+                      EXTENSIONS[pil_format])
+    normalized = SimpleUploadedFile(
+        name, content, content_type=Image.MIME[pil_format])
+    logger.info('Картинка %s: %d -> %d байт', upload.name, upload.size,
+                len(content))
+    return normalized, (upload.size, len(content))
@@ -0,0 +1,64 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import _init_worker, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Делает миниатюры и WebP/AVIF-варианты для уже загруженных '
+        'картинок постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=multiprocessing.cpu_count(),
+            help='Сколько процессов обрабатывают картинки параллельно '
+                 '(1 - без пула, в текущем процессе).',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать варианты и для постов, где они уже есть.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['force']:
+            posts = posts.exclude(thumbnails__contains='"sources"')
+        post_ids = list(posts.values_list('id', flat=True))
+        self.stdout.write(f'Картинок к обработке: {len(post_ids)}')
+        if options['workers'] <= 1:
+            failed = 0
+            for post_id in post_ids:
+                try:
+                    generate(post_id)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'Пост {post_id}: {error}')
+        else:
+            failed = self._run_pool(post_ids, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {len(post_ids) - failed}, ошибок: {failed}'))
+
+    def _run_pool(self, post_ids, workers):
+        failed = 0
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+        ) as executor:
+            futures = {
+                executor.submit(generate, post_id): post_id
+                for post_id in post_ids
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                if future.exception() is not None:
+                    failed += 1
+                    self.stderr.write(
+                        f'Пост {futures[future]}: {future.exception()}')
+                if done % 100 == 0:
+                    self.stdout.write(f'Обработано: {done}')
+        return failed
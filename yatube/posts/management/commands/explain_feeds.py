@@ -0,0 +1,119 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from posts import timeline
+from posts.models import Comment, Group, Post, User
+from posts.paginators import KeysetPaginator
+
+
+def _pages(name, posts, ordering=('-pub_date', '-id')):
+    """
+    Первая и следующая страница ленты - те же запросы, что делает view.
+    """
+    paginator = KeysetPaginator(
+        posts, settings.PAGINATOR_OBJECTS_PER_PAGE, ordering=ordering)
+    first = paginator.object_list[:paginator.per_page + 1]
+    rows = list(first)
+    # пустая лента: план всё равно покажем, ключ - "сейчас"
+    key = paginator._key(rows[-1]) if rows else [str(timezone.now()), '0']
+    after = paginator.object_list.filter(paginator._after(key, True))
+    return [
+        (name, first),
+        (f'{name} (следующая)', after[:paginator.per_page + 1]),
+    ]
+
+
+def _plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _timing(queryset, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        list(queryset.all())
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def _verdict(plan):
+    """
+    Плохо - сортировка после полного просмотра таблицы (SCAN без индекса).
+    Сортировка небольшого выбранного по индексу набора (лента подписок
+    ограничена TIMELINE_MAX_LENGTH) допустима.
+    """
+    full_scan = any(
+        step.startswith('SCAN') and 'USING' not in step for step in plan)
+    sort = any('USE TEMP B-TREE' in step for step in plan)
+    if full_scan and sort:
+        return 'FAIL'
+    if full_scan:
+        return 'SCAN'
+    if sort:
+        return 'SORT'
+    return 'OK'
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы (EXPLAIN QUERY PLAN) и время запросов лент '
+        'и проверяет, что ни одна не сортирует всю таблицу постов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять запрос для замера времени.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда разбирает планы только для SQLite')
+        # самые "тяжёлые" сообщество, автор и пост - худший случай
+        group = Group.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        author = User.objects.order_by('-counters__posts_count').first()
+        reader = User.objects.order_by(
+            '-counters__following_count').first()
+        post = Post.objects.order_by('-comments_count').first()
+        cases = _pages('index', Post.objects.select_related(
+            'author', 'group'))
+        cases += _pages('group_posts', Post.objects.filter(
+            group_id=group.id if group else 0).select_related(
+                'author', 'group'))
+        cases += _pages('profile', Post.objects.filter(
+            author_id=author.id if author else 0).select_related(
+                'author', 'group'))
+        if reader is not None:
+            # лента и посты звёзд - отдельные запросы, строки сливает view
+            for number, source in enumerate(
+                    timeline.timeline_sources(reader), 1):
+                cases += _pages(f'follow_index ({number})', source,
+                                timeline.ORDERING)
+        cases.append(('post_detail (комментарии)', Comment.objects.filter(
+            post_id=post.id if post else 0).select_related(
+                'author').order_by('created')))
+        failed = []
+        for name, queryset in cases:
+            plan = _plan(queryset)
+            verdict = _verdict(plan)
+            if verdict == 'FAIL':
+                failed.append(name)
+            seconds = _timing(queryset, options['repeat'])
+            self.stdout.write(
+                f'{verdict:>4} {seconds * 1000:8.2f} мс  {name}')
+            for step in plan:
+                self.stdout.write(f'{"":16}{step}')
+        if failed:
+            raise CommandError(
+                'Сортировка всей таблицы: ' + ', '.join(failed))
+        self.stdout.write(self.style.SUCCESS('Все ленты читаются по индексам'))
@@ -0,0 +1,45 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import (FORMATS, copy_images, export_records,
+                            write_csv, write_ndjson)
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая выгрузка пользователей, сообществ, постов, комментариев '
+        'и подписок в NDJSON (один файл) или CSV (файл на модель).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл NDJSON ("-" - stdout) или каталог для CSV.',
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson',
+            help='Формат выгрузки.',
+        )
+        parser.add_argument(
+            '--media',
+            help='Каталог, куда скопировать картинки постов.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Сколько строк читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        records = export_records(chunk_size=options['chunk_size'])
+        if options['media']:
+            records = copy_images(records, options['media'])
+        path = options['path']
+        if options['format'] == 'csv':
+            total = write_csv(records, path)
+        elif path == '-':
+            total = write_ndjson(records, sys.stdout)
+        else:
+            with open(path, 'w', encoding='utf-8') as file:
+                total = write_ndjson(records, file)
+        self.stderr.write(self.style.SUCCESS(f'Выгружено записей: {total}'))
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.graph import FollowGraph
+
+
+class Command(BaseCommand):
+    help = (
+        'Сохраняет граф подписок в файл-снимок, из которого воркеры '
+        'поднимают его при старте без чтения всей таблицы подписок.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path', default=settings.FOLLOW_GRAPH_SNAPSHOT,
+            help='Куда сохранить снимок (по умолчанию '
+                 'FOLLOW_GRAPH_SNAPSHOT).',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        graph = FollowGraph()
+        graph.load_from_db()
+        loaded = time.perf_counter()
+        graph.save_snapshot(options['path'])
+        check = FollowGraph()
+        check.load_snapshot(options['path'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Подписок: {graph.edges}, из базы за '
+            f'{loaded - started:.2f} с, из снимка за '
+            f'{time.perf_counter() - loaded:.2f} с (с записью): '
+            f'{options["path"]}'
+        ))
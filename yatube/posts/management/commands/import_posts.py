@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from posts.transfer import FORMATS, Importer, read_csv, read_ndjson
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковая загрузка выгрузки export_posts: bulk_create пачками '
+        'в транзакциях, ссылки переводятся по словарям id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Файл NDJSON ("-" - stdin) или каталог с CSV.',
+        )
+        parser.add_argument(
+            '--format', choices=FORMATS, default='ndjson',
+            help='Формат выгрузки.',
+        )
+        parser.add_argument(
+            '--media',
+            help='Каталог с картинками из export_posts --media: '
+                 'без него имена картинок сохраняются как есть.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько записей создавать за одну транзакцию.',
+        )
+        parser.add_argument(
+            '--merge-users', action='store_true',
+            help='Пользователи с уже существующими username - это те же '
+                 'люди: их посты дописываются к этим аккаунтам. Без флага '
+                 'совпадение имени - ошибка.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        importer = Importer(options['batch_size'], media=options['media'],
+                            merge_users=options['merge_users'])
+        try:
+            if options['format'] == 'csv':
+                counts = importer.run(read_csv(path))
+            elif path == '-':
+                counts = importer.run(read_ndjson(sys.stdin))
+            else:
+                with open(path, encoding='utf-8') as file:
+                    counts = importer.run(read_ndjson(file))
+        except (OSError, ValueError, KeyError, DatabaseError) as error:
+            raise CommandError(f'Не удалось загрузить {path}: {error}')
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{model}: {total}' for model, total in counts.items()
+        )))
@@ -0,0 +1,69 @@
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.images import normalize
+from posts.models import Post
+from posts.thumbnails import SIZES
+
+
+def _thumbnail_seconds(content):
+    """
+    Сколько занимает самая крупная миниатюра: декодирование и уменьшение.
+    """
+    side = int(SIZES['full'][0].split('x')[0])
+    started = time.perf_counter()
+    image = Image.open(BytesIO(content))
+    image.draft('RGB', (side, side))
+    image.thumbnail((side, side), Image.LANCZOS)
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Уменьшает и пересжимает без метаданных уже загруженные картинки '
+        'постов, выводит экономию места и времени на миниатюры.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать экономию, файлы не менять.',
+        )
+
+    def handle(self, *args, **options):
+        before = after = 0
+        time_before = time_after = 0.0
+        changed = 0
+        for post in Post.objects.exclude(image='').only('id', 'image'):
+            try:
+                with post.image.open('rb') as source:
+                    original = source.read()
+                    normalized, (size_before, size_after) = normalize(source)
+                    content = normalized.read()
+            except Exception as error:
+                self.stderr.write(f'Пост {post.id}: {error}')
+                continue
+            before += size_before
+            after += size_after
+            time_before += _thumbnail_seconds(original)
+            time_after += _thumbnail_seconds(content)
+            if normalized is source or options['dry_run']:
+                continue
+            old_name = post.image.name
+            normalized.seek(0)
+            post.image.save(normalized.name, normalized, save=False)
+            # save() - чтобы сработали сигналы: миниатюры и кэш карточки
+            post.save(update_fields=['image'])
+            post.image.storage.delete(old_name)
+            changed += 1
+        saved = before - after
+        self.stdout.write(
+            f'Картинок пересжато: {changed}\n'
+            f'Место: {before / 2**20:.1f} -> {after / 2**20:.1f} МБ '
+            f'(экономия {saved / 2**20:.1f} МБ, '
+            f'{saved / before if before else 0:.0%})\n'
+            f'Миниатюры: {time_before:.2f} -> {time_after:.2f} с'
+        )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает денормализованные счётчики: комментарии постов, '
+        'посты, подписчиков и подписки пользователей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк счётчиков записывать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        posts, users = rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано постов: {posts}, пользователей: {users}'
+        ))
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.related import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие посты: TF-IDF по текстам, общие сообщество '
+        'и автор; top-K соседей каждого поста записываются в таблицу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.RELATED_POSTS_BATCH_SIZE,
+            help='Сколько постов записывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        posts, rows = refresh(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {posts}, похожих: {rows}'
+        ))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import refresh_all, refresh_queued
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации "кого почитать": по умолчанию - для '
+        'пользователей, чьи подписки изменились, с --all - для всех.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Полный пересчёт для всех пользователей.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.SUGGESTIONS_BATCH_SIZE,
+            help='Сколько пользователей пересчитывать за одну транзакцию.',
+        )
+
+    def handle(self, *args, **options):
+        refresh = refresh_all if options['all'] else refresh_queued
+        users, rows = refresh(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {users}, рекомендаций: {rows}'
+        ))
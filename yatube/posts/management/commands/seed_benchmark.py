@@ -0,0 +1,200 @@
+import itertools
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts.models import Comment, Follow, Group, Post, User
+from posts.transfer import bulk_create_dated, max_id, rebuild_derived
+
+PREFIX = 'bench'
+SYLLABLES = ('ка', 'ро', 'ми', 'ло', 'та', 'ны', 'се', 'ва', 'дру', 'жи',
+             'по', 'ле', 'сто', 'ри', 'мо', 'ре', 'гу', 'ба', 'кне', 'зо')
+
+
+def _vocabulary(randomizer, size):
+    return [
+        ''.join(randomizer.choices(SYLLABLES, k=randomizer.randint(2, 4)))
+        for _ in range(size)
+    ]
+
+
+def _text(randomizer, words, cum_weights, low, high):
+    # слова по закону Ципфа - как в живом тексте, поиску и похожим постам
+    # есть что находить
+    return ' '.join(randomizer.choices(
+        words, cum_weights=cum_weights, k=randomizer.randint(low, high)))
+
+
+def _zipf_weights(size, exponent):
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def _image(randomizer, number):
+    """
+    JPEG 1600x1200 с градиентом: миниатюры делаются не из пустоты.
+    """
+    color = tuple(randomizer.randrange(256) for _ in range(3))
+    image = Image.linear_gradient('L').resize((1600, 1200)).convert('RGB')
+    image = Image.blend(image, Image.new('RGB', image.size, color), 0.5)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return default_storage.save(f'posts/{PREFIX}_{number}.jpg',
+                                ContentFile(buffer.getvalue()))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочных тестов: '
+        'пользователи, сообщества, посты с картинками, комментарии '
+        'и подписки со степенным распределением популярности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Среднее число подписок у пользователя.',
+        )
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного закона популярности авторов.',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинкой.',
+        )
+        parser.add_argument(
+            '--image-files', type=int, default=20,
+            help='Сколько разных файлов картинок сделать.',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одинаковые данные от запуска к запуску.',
+        )
+
+    def _bulk(self, model, objects, dated=None, **kwargs):
+        """
+        bulk_create пачками по --batch-size, каждая - в своей транзакции;
+        objects - генератор, в памяти только одна пачка. dated - поле
+        auto_now_add, в котором сохраняются заданные даты.
+        """
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                return total
+            with transaction.atomic():
+                if dated:
+                    bulk_create_dated(model, batch, dated)
+                else:
+                    model.objects.bulk_create(batch, **kwargs)
+            total += len(batch)
+
+    def _ids(self, model, after):
+        return list(model.objects.filter(pk__gt=after).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def handle(self, *args, **options):
+        randomizer = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        user_start = max_id(User)
+        post_start = max_id(Post)
+        follow_start = max_id(Follow)
+        # номер запуска в именах - повторный запуск не конфликтует
+        run = user_start + 1
+        now = timezone.now()
+
+        # хэш пароля считается один раз - make_password намеренно медленный
+        password = make_password(PREFIX)
+        self._bulk(User, (
+            User(username=f'{PREFIX}_{run}_{number}',
+                 first_name=f'Пользователь {number}',
+                 password=password)
+            for number in range(options['users'])
+        ))
+        user_ids = self._ids(User, user_start)
+
+        group_start = max_id(Group)
+        self._bulk(Group, (
+            Group(title=f'Сообщество {run}-{number}',
+                  slug=f'{PREFIX}-{run}-{number}',
+                  description='Сообщество для нагрузочных тестов')
+            for number in range(options['groups'])
+        ))
+        group_ids = self._ids(Group, group_start)
+
+        words = _vocabulary(randomizer, 5000)
+        word_weights = _zipf_weights(len(words), 1.0)
+        # популярность авторов: случайная перестановка рангов Ципфа
+        authors = user_ids[:]
+        randomizer.shuffle(authors)
+        author_weights = _zipf_weights(len(authors), options['exponent'])
+        images = [_image(randomizer, number)
+                  for number in range(options['image_files'])]
+
+        def posts():
+            for _ in range(options['posts']):
+                has_image = images and randomizer.random() < options['images']
+                yield Post(
+                    text=_text(randomizer, words, word_weights, 10, 80),
+                    author_id=randomizer.choices(
+                        authors, cum_weights=author_weights)[0],
+                    group_id=(randomizer.choice(group_ids)
+                              if group_ids and randomizer.random() < 0.7
+                              else None),
+                    image=randomizer.choice(images) if has_image else '',
+                    pub_date=now - timedelta(
+                        minutes=randomizer.randrange(60 * 24 * 365)),
+                )
+
+        def comments(post_dates):
+            # комментарий - в течение месяца после поста, но не в будущем
+            for _ in range(options['comments'] if post_dates else 0):
+                post_id, pub_date = randomizer.choice(post_dates)
+                window = min(now - pub_date, timedelta(days=30))
+                yield Comment(
+                    post_id=post_id,
+                    author_id=randomizer.choice(user_ids),
+                    text=_text(randomizer, words, word_weights, 3, 30),
+                    created=pub_date + window * randomizer.random(),
+                )
+
+        def follows():
+            # число подписок у пользователя - экспоненциальное со средним
+            # --follows, на кого - по тому же степенному закону, что и посты
+            for user_id in user_ids:
+                degree = min(len(authors) - 1, int(randomizer.expovariate(
+                    1 / options['follows'])))
+                targets = set(randomizer.choices(
+                    authors, cum_weights=author_weights, k=degree))
+                targets.discard(user_id)
+                for author_id in sorted(targets):
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self._bulk(Post, posts(), dated='pub_date')
+        post_dates = list(Post.objects.filter(pk__gt=post_start).order_by(
+            'pk').values_list('pk', 'pub_date'))
+        comment_total = self._bulk(Comment, comments(post_dates),
+                                   dated='created')
+        follow_total = self._bulk(Follow, follows(), ignore_conflicts=True)
+
+        rebuild_derived(post_start, follow_start, self.batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Пользователей: {len(user_ids)}, сообществ: {len(group_ids)}, '
+            f'постов: {len(post_dates)}, комментариев: {comment_total}, '
+            f'подписок: {follow_total}, картинок: {len(images)}'
+        ))
@@ -0,0 +1,57 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогревает кэш страниц после выкладки или сброса кэша: страницы '
+        'главной, самые большие сообщества и профили (или самые посещаемые '
+        'адреса) рендерятся заранее в несколько потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--by', choices=('posts', 'traffic'), default='posts',
+            help='posts - по числу постов, traffic - горячие адреса, '
+                 'которые публикует фоновый прогрев веб-процессов.',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.WARM_CACHE_WORKERS,
+            help='Сколько страниц рендерить одновременно.',
+        )
+        parser.add_argument(
+            '--index-pages', type=int,
+            default=settings.WARM_CACHE_INDEX_PAGES,
+        )
+        parser.add_argument(
+            '--groups', type=int, default=settings.WARM_CACHE_GROUPS)
+        parser.add_argument(
+            '--profiles', type=int, default=settings.WARM_CACHE_PROFILES)
+
+    def handle(self, *args, **options):
+        if not settings.PAGE_CACHE:
+            self.stderr.write(
+                'PAGE_CACHE выключен - прогреваются только фрагменты')
+        paths = []
+        if options['by'] == 'traffic':
+            paths = warmup.hot_paths()
+            if not paths:
+                self.stderr.write(
+                    'Горячих адресов нет - берём по числу постов')
+        if not paths:
+            paths = warmup.paths_by_posts(
+                options['index_pages'], options['groups'],
+                options['profiles'])
+        started = time.perf_counter()
+        results = warmup.warm(paths, options['workers'])
+        elapsed = time.perf_counter() - started
+        for path, status, seconds in results:
+            self.stdout.write(f'{status} {seconds * 1000:8.1f} мс  {path}')
+        errors = sum(status >= 400 for _, status, _ in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Страниц: {len(results)}, ошибок: {errors}, {elapsed:.1f} с'
+        ))
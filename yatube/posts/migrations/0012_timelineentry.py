@@ -0,0 +1,108 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Читателей в одном INSERT ... SELECT: у SQLite ограничено число параметров
+FILL_CHUNK_SIZE = 500
+
+
+def fill_timelines(apps, schema_editor):
+    """
+    Заполнение лент по уже существующим подпискам - как при массовой
+    загрузке (timeline.fill_readers): каждому читателю последние
+    TIMELINE_MAX_LENGTH постов его подписок, кроме популярных авторов
+    (их посты подмешиваются при чтении). Счётчиков ещё нет, подписчики
+    считаются по подпискам; повторы подписок не учитываются.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    entries = TimelineEntry._meta.db_table
+    follows = Follow._meta.db_table
+    posts = Post._meta.db_table
+    user_ids = list(Follow.objects.values_list(
+        'user_id', flat=True).distinct().order_by('user_id'))
+    for start in range(0, len(user_ids), FILL_CHUNK_SIZE):
+        chunk = user_ids[start:start + FILL_CHUNK_SIZE]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {entries} (user_id, post_id, pub_date) '
+                f'SELECT user_id, post_id, pub_date FROM ('
+                f'SELECT f.user_id, p.id AS post_id, p.pub_date, '
+                f'ROW_NUMBER() OVER (PARTITION BY f.user_id '
+                f'ORDER BY p.pub_date DESC, p.id DESC) AS position '
+                f'FROM (SELECT DISTINCT user_id, author_id FROM {follows}) f '
+                f'JOIN {posts} p ON p.author_id = f.author_id '
+                f'WHERE f.user_id IN ({", ".join(["%s"] * len(chunk))}) '
+                f'AND f.author_id NOT IN (SELECT author_id FROM {follows} '
+                f'GROUP BY author_id '
+                f'HAVING COUNT(DISTINCT user_id) >= %s)'
+                f') ranked WHERE position <= %s',
+                [*chunk, settings.TIMELINE_CELEBRITY_FOLLOWERS,
+                 settings.TIMELINE_MAX_LENGTH],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_follow'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'verbose_name': 'Комментарий', 'verbose_name_plural': 'Комментарии'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': 'Подписка', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='text',
+            field=models.TextField(help_text='Текст комментария', verbose_name='Комментарий'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(blank=True, help_text='Группа, к которой будет относиться пост', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts', to='posts.Group', verbose_name='Сообщество'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Картинка к посту', upload_to='posts/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='text',
+            field=models.TextField(help_text='Текст вашего поста', verbose_name='Текст'),
+        ),
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Владелец ленты')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ['-pub_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='timeline_entry_unique'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
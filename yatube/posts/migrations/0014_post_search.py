@@ -0,0 +1,34 @@
+from django.db import migrations
+
+SEARCH_TABLE = 'posts_post_search'
+
+
+def create_search_index(apps, schema_editor):
+    """
+    Полнотекстовый индекс по постам (SQLite FTS5), rowid совпадает с id
+    поста. Миграция создаёт пустую таблицу: основы слов считает стеммер
+    приложения, который может меняться, поэтому уже существующие посты
+    индексирует команда rebuild_search_index.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} '
+        f"USING fts5(terms, tokenize='unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
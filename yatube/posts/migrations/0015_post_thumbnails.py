@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails',
+            field=models.TextField(blank=True, default='', editable=False, help_text='JSON с адресами готовых миниатюр картинки', verbose_name='Миниатюры'),
+        ),
+    ]
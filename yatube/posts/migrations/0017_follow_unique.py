@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+def remove_duplicates(apps, schema_editor):
+    """
+    Перед созданием уникального индекса оставляем по одной (самой
+    ранней) подписке на пару подписчик-автор и пересчитываем счётчики
+    затронутых пользователей - дубли учитывались в них.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounters = apps.get_model('posts', 'UserCounters')
+    duplicates = Follow.objects.order_by().values('user', 'author').annotate(
+        first_id=models.Min('id'), total=models.Count('id'),
+    ).filter(total__gt=1)
+    users = set()
+    for row in duplicates:
+        Follow.objects.filter(user=row['user'], author=row['author']).exclude(
+            id=row['first_id']).delete()
+        users.update((row['user'], row['author']))
+    for user_id in users:
+        UserCounters.objects.filter(user_id=user_id).update(
+            followers_count=Follow.objects.filter(author=user_id).count(),
+            following_count=Follow.objects.filter(user=user_id).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follow_unique'),
+        ),
+    ]
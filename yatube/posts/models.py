@@ -1,3 +1,5 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models.constraints import UniqueConstraint
@@ -32,8 +34,12 @@ class Group(models.Model):
     )
 
     class Meta:
+        ordering = ['title']
         verbose_name = 'Сообщество'
         verbose_name_plural = 'Сообщества'
+        indexes = [
+            models.Index(fields=['title'], name='group_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -46,7 +52,9 @@ class Post(models.Model):
     pub_date - дата публикации
     author - автор поста
     group - ссылка на сообщество
-    image - картинка к посту.
+    image - картинка к посту
+    comments_count - счётчик комментариев
+    thumbnails - адреса заранее подготовленных миниатюр картинки.
     """
     text = models.TextField(
         verbose_name='Текст',
@@ -75,15 +83,53 @@ class Post(models.Model):
         blank=True,
         help_text='Картинка к посту',
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+    thumbnails = models.TextField(
+        blank=True,
+        default='',
+        editable=False,
+        verbose_name='Миниатюры',
+        help_text='JSON с адресами готовых миниатюр картинки',
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # под сортировку лент (как в KeysetPaginator: -pub_date, -id):
+        # главная, сообщество, профиль
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='post_date_idx'),
+            models.Index(fields=['group', '-pub_date', '-id'],
+                         name='post_group_date_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='post_author_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def thumbnail_data(self):
+        """
+        Готовые миниатюры и варианты, если они сделаны для текущей картинки.
+        """
+        if not self.thumbnails:
+            return {}
+        thumbnails = json.loads(self.thumbnails)
+        if thumbnails.get('source') != self.image.name:
+            return {}
+        return thumbnails
+
+    @property
+    def thumbnail_urls(self):
+        return self.thumbnail_data.get('urls', {})
+
 
 class Comment(models.Model):
     """
@@ -117,6 +163,10 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text
@@ -146,4 +196,167 @@ class Follow(models.Model):
         verbose_name_plural = 'Подписки'
         # Не задумывался о необходимости создания уникальных ограничений в БД
         # но увидел, что ревьюеры делают замечание сокурсникам по этому поводу
-        UniqueConstraint(fields=['user', 'author'], name='follow_unique')
+        constraints = [
+            UniqueConstraint(fields=['user', 'author'], name='follow_unique'),
+        ]
+
+
+class UserCounters(models.Model):
+    """
+    Счётчики пользователя, чтобы шаблоны не делали COUNT-запросов.
+    user - пользователь
+    posts_count - количество постов
+    followers_count - количество подписчиков
+    following_count - количество подписок.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class TimelineEntry(models.Model):
+    """
+    Лента подписок пользователя (fan-out-on-write).
+    user - владелец ленты
+    post - пост автора, на которого подписан пользователь
+    pub_date - копия даты поста, чтобы лента читалась по одному индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Владелец ленты',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            UniqueConstraint(fields=['user', 'post'],
+                             name='timeline_entry_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date'],
+                         name='timeline_user_date_idx'),
+        ]
+
+
+class Suggestion(models.Model):
+    """
+    Заранее посчитанные рекомендации "кого почитать".
+    user - кому рекомендуем
+    author - рекомендуемый автор
+    score - вес (друзья друзей и совместные подписки).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggestions',
+        verbose_name='Пользователь',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рекомендуемый автор',
+    )
+    score = models.FloatField(
+        verbose_name='Вес',
+    )
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Рекомендация'
+        verbose_name_plural = 'Рекомендации'
+        constraints = [
+            UniqueConstraint(fields=['user', 'author'],
+                             name='suggestion_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='suggestion_user_score_idx'),
+        ]
+
+
+class SuggestionQueue(models.Model):
+    """
+    Пользователи, чьи подписки изменились после расчёта рекомендаций.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Пользователь',
+    )
+
+    class Meta:
+        verbose_name = 'Пересчёт рекомендаций'
+        verbose_name_plural = 'Пересчёт рекомендаций'
+
+
+class RelatedPost(models.Model):
+    """
+    Заранее посчитанные похожие посты (top-K соседей поста).
+    post - пост, для которого подобраны соседи
+    related - похожий пост
+    score - вес (сходство текстов, общие сообщество и автор).
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_posts',
+        verbose_name='Пост',
+    )
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий пост',
+    )
+    score = models.FloatField(
+        verbose_name='Вес',
+    )
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Похожий пост'
+        verbose_name_plural = 'Похожие посты'
+        constraints = [
+            UniqueConstraint(fields=['post', 'related'],
+                             name='related_post_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['post', '-score'],
+                         name='related_post_score_idx'),
+        ]
@@ -0,0 +1,191 @@
+import re
+import secrets
+from functools import wraps
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.urls import Resolver404, resolve, reverse
+from django.utils.safestring import mark_safe
+
+from . import graph, suggestions, warmup
+from .conditional import make_etag, validate
+from .forms import CommentForm
+
+# v2: в кэше (nonce, содержимое, заголовки)
+PAGE_KEY = 'page:v2:{}'
+# Дыра в закэшированной странице: адрес фрагмента и содержимое для гостя.
+# nonce - случайная метка рендера: такие же комментарии в тексте постов
+# (выводится через |safe) его не знают и не заполняются
+HOLE_RE = r'<!--hole:{nonce}:(?P<url>[^>]*)-->.*?<!--/hole:{nonce}-->'
+
+# Дыры: имя -> (шаблон, функция контекста(request, **аргументы),
+# имена из контекста страницы, которые функция берёт при рендере страницы);
+# функция возвращает None, если для этого пользователя выводить нечего
+HOLES = {}
+
+
+def hole(name, template, page_context=()):
+    def decorator(func):
+        HOLES[name] = (template, func, page_context)
+        return func
+    return decorator
+
+
+@hole('header', 'includes/header.html')
+def _header(request, view_name=''):
+    return {'view_name': view_name}
+
+
+@hole('switcher', 'posts/includes/switcher.html')
+def _switcher(request, view_name=''):
+    return {'view_name': view_name}
+
+
+@hole('follow_button', 'posts/includes/follow_button.html')
+def _follow_button(request, author, author_id):
+    user = request.user
+    if not user.is_authenticated or user.id == int(author_id):
+        return None
+    return {
+        'author': {'username': author},
+        'following': graph.get_graph().follows(user.id, int(author_id)),
+    }
+
+
+@hole('suggestions', 'posts/includes/suggestions.html')
+def _suggestions(request):
+    return {'suggestions': suggestions.for_user(request.user)}
+
+
+@hole('post_edit', 'posts/includes/post_edit_button.html')
+def _post_edit(request, post_id, author_id):
+    if request.user.id != int(author_id):
+        return None
+    return {'post_id': post_id}
+
+
+@hole('comment_form', 'posts/includes/comment_form.html',
+      page_context=('form',))
+def _comment_form(request, post_id, form=None):
+    if not request.user.is_authenticated:
+        return None
+    return {'post_id': post_id,
+            'form': form if form is not None else CommentForm()}
+
+
+def render_hole(request, name, args, page=None):
+    """
+    Содержимое дыры для пользователя запроса; page - контекст
+    страницы, если дыра рендерится вместе с ней. Имена из контекста
+    страницы берутся только из page: в args (из адреса фрагмента)
+    они отбрасываются. Неизвестное имя или аргументы - KeyError,
+    TypeError или ValueError.
+    """
+    template, func, page_context = HOLES[name]
+    args = {key: value for key, value in args.items()
+            if key not in page_context}
+    extra = {key: page[key] for key in page_context
+             if page is not None and key in page}
+    context = func(request, **args, **extra)
+    if context is None:
+        return ''
+    return render_to_string(template, context, request=request)
+
+
+def hole_marker(request, name, args, page=None):
+    """
+    Содержимое дыры. Если страница рендерится в кэш (cached_page
+    выдал request.hole_nonce) - в комментариях-метках с nonce и адресом
+    фрагмента: по ним дыры заполняет fill_holes.
+    """
+    content = render_hole(request, name, args, page)
+    nonce = getattr(request, 'hole_nonce', None)
+    if nonce is None:
+        return mark_safe(content)
+    url = reverse('post:hole', args=[name])
+    if args:
+        url = f'{url}?{urlencode(args)}'
+    return mark_safe(
+        f'<!--hole:{nonce}:{url}-->{content}<!--/hole:{nonce}-->')
+
+
+def fill_holes(request, content, nonce):
+    """
+    Заполняет дыры страницы для пользователя запроса. Заменяются
+    только метки с nonce этого рендера; метку, которую не удалось
+    разобрать, оставляем как есть.
+    """
+    def fill(match):
+        url = urlsplit(match.group('url'))
+        try:
+            name = resolve(url.path).kwargs['name']
+            return render_hole(request, name, dict(parse_qsl(url.query)))
+        except (Resolver404, KeyError, TypeError, ValueError):
+            return match.group(0)
+
+    pattern = re.compile(HOLE_RE.format(nonce=re.escape(nonce)), re.S)
+    return pattern.sub(fill, content.decode()).encode()
+
+
+def _from_cache(request, nonce, content, headers):
+    """
+    Ответ из закэшированной страницы: заголовки view и, для вошедших,
+    заполненные дыры.
+    """
+    if request.user.is_authenticated:
+        content = fill_holes(request, content, nonce)
+    response = HttpResponse(content)
+    for header, value in headers:
+        response[header] = value
+    if request.user.is_authenticated:
+        patch_vary_headers(response, ('Cookie',))
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def cached_page(validators):
+    """
+    Кэш страницы целиком. Ключ - адрес с GET-параметрами и валидаторы
+    страницы (posts/conditional.py), поэтому изменения видны сразу.
+    Страница рендерится как для гостя и отдаётся гостям как есть;
+    вошедшим в ней заполняются дыры (шапка, кнопки, форма комментария) -
+    общая часть страницы у всех одна. Вместе со страницей кэшируются
+    заголовки ответа view; страница с заполненными дырами - private
+    и Vary: Cookie, чтобы общие кэши её не сохраняли.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            if not settings.PAGE_CACHE:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    warmup.record_hit(request)
+                return response
+            parts = validate(request, validators, args, kwargs)
+            key = PAGE_KEY.format(
+                make_etag(request.get_full_path(), *parts).strip('"'))
+            cached = cache.get(key)
+            if cached is None:
+                user = request.user
+                request.user = AnonymousUser()
+                request.hole_nonce = secrets.token_hex(8)
+                try:
+                    response = view(request, *args, **kwargs)
+                finally:
+                    request.user = user
+                    nonce = request.__dict__.pop('hole_nonce')
+                if response.status_code != 200:
+                    return response
+                cached = (nonce, response.content, list(response.items()))
+                cache.set(key, cached, settings.PAGE_CACHE_TIMEOUT)
+            warmup.record_hit(request)
+            return _from_cache(request, *cached)
+        return wrapper
+    return decorator
@@ -0,0 +1,249 @@
+import base64
+import json
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils.functional import cached_property
+
+
+class KeysetPaginator(Paginator):
+    """
+    Пагинатор по ключу (keyset/cursor) вместо LIMIT/OFFSET.
+    Следующая страница выбирается условием "строго после последней
+    записи текущей страницы" по ключу сортировки (по умолчанию
+    (-pub_date, -id)), поэтому стоимость запроса не зависит от глубины.
+    Общее количество (COUNT) считается только при with_count=True.
+    Номер страницы переносится внутри курсора, поэтому шаблон
+    paginator.html продолжает работать со стандартным Page.
+    """
+    is_keyset = True
+    # ?page=N дальше этого номера - первая страница: иначе OFFSET
+    # выходит за пределы целых чисел СУБД
+    max_page_number = 10 ** 6
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), with_count=False):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = ordering
+        self.with_count = with_count
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._number = 1
+        self._has_next = False
+
+    @cached_property
+    def num_pages(self):
+        if self.with_count:
+            return super().num_pages
+        # Без COUNT знаем только, есть ли хотя бы одна следующая страница
+        return self._number + (1 if self._has_next else 0)
+
+    def _fields(self):
+        return [(field.lstrip('-'), field.startswith('-'))
+                for field in self.ordering]
+
+    def _key(self, obj):
+        # строки .values() - словари, а не объекты моделей
+        if isinstance(obj, dict):
+            return [str(obj[name]) for name, _ in self._fields()]
+        return [str(getattr(obj, name)) for name, _ in self._fields()]
+
+    def _after(self, key, forward):
+        """
+        Условие "строго после key" для лексикографического ключа:
+        a <= x AND ((a < x) OR (a = x AND b < y) OR ...).
+        Лишнее на вид a <= x даёт СУБД границу диапазона по индексу,
+        иначе индекс просматривается с самого начала.
+        """
+        condition = Q()
+        equal = {}
+        for (name, descending), value in zip(self._fields(), key):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        (name, descending), value = self._fields()[0], key[0]
+        lookup = 'lte' if descending == forward else 'gte'
+        return Q(**{f'{name}__{lookup}': value}) & condition
+
+    def encode_cursor(self, key, number, forward=True):
+        payload = json.dumps([key, number, forward]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def _parse_key(self, key):
+        """
+        Значения ключа из курсора - в типы полей сортировки
+        (дата, id); ValueError, если курсор подделан.
+        """
+        if not isinstance(key, list) or len(key) != len(self.ordering):
+            raise ValueError('Неверная длина ключа')
+        opts = self.object_list.model._meta
+        parsed = []
+        for (name, _), value in zip(self._fields(), key):
+            if not isinstance(value, str):
+                raise ValueError(f'Неверное значение ключа {name}')
+            try:
+                value = opts.get_field(name).to_python(value)
+            except (FieldDoesNotExist, ValidationError, TypeError) as error:
+                raise ValueError(f'Неверное значение ключа {name}') from error
+            if value is None:
+                raise ValueError(f'Пустое значение ключа {name}')
+            if isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63:
+                raise ValueError(f'Значение ключа {name} вне диапазона')
+            parsed.append(value)
+        return parsed
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            key, number, forward = json.loads(
+                base64.urlsafe_b64decode(padded.encode()))
+            number = int(number)
+            key = self._parse_key(key)
+        except (TypeError, ValueError, AttributeError, OverflowError):
+            return None
+        if not 1 <= number <= self.max_page_number:
+            return None
+        return key, number, bool(forward)
+
+    def page_by_cursor(self, cursor):
+        """
+        Возвращает страницу по курсору; некорректный курсор - первая страница.
+        """
+        decoded = self.decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._build_page(self.object_list, 1)
+        key, number, forward = decoded
+        if forward:
+            rows = self.object_list.filter(self._after(key, True))
+            return self._build_page(rows, number)
+        rows = self.object_list.filter(
+            self._after(key, False)).reverse()[:self.per_page + 1]
+        rows = list(rows)
+        if len(rows) <= self.per_page:
+            # Дошли до начала списка: отдаём честную первую страницу
+            return self._build_page(self.object_list, 1)
+        return self._build_page(
+            self.object_list, number,
+            prefetched=list(reversed(rows[:self.per_page])), has_next=True,
+        )
+
+    def get_page(self, number):
+        """
+        Совместимость со старыми ссылками вида ?page=N:
+        страница выбирается через OFFSET, но без COUNT,
+        а ссылки дальше уже ведут по курсорам.
+        """
+        try:
+            number = max(1, int(number))
+        except (TypeError, ValueError):
+            number = 1
+        if number > self.max_page_number:
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(self.object_list[offset:offset + self.per_page + 1])
+        if not rows and number > 1:
+            return self.get_page(1)
+        return self._build_page(self.object_list, number, prefetched=rows)
+
+    def _build_page(self, rows, number, prefetched=None, has_next=None):
+        if prefetched is None:
+            prefetched = list(rows[:self.per_page + 1])
+        if has_next is None:
+            has_next = len(prefetched) > self.per_page
+        object_list = prefetched[:self.per_page]
+        self._number = number
+        self._has_next = has_next
+        self.__dict__.pop('num_pages', None)
+        if object_list and has_next:
+            self.next_cursor = self.encode_cursor(
+                self._key(object_list[-1]), number + 1)
+        if object_list and number > 1:
+            self.previous_cursor = self.encode_cursor(
+                self._key(object_list[0]), number - 1, forward=False)
+        return Page(object_list, number, self)
+
+
+class MergedRows:
+    """
+    Несколько querysets строк .values() с одинаковыми полями сортировки -
+    как один список для KeysetPaginator. Условие, обратный порядок и срез
+    применяются к каждому (каждый выбирается по своему индексу),
+    строки сливаются по ключу сортировки, повторы убираются.
+    """
+
+    def __init__(self, *querysets, ordering=()):
+        directions = {field.startswith('-') for field in ordering}
+        if len(directions) > 1:
+            raise ValueError('Поля сортировки должны идти в одну сторону')
+        self.querysets = querysets
+        self.ordering = tuple(ordering)
+        # модель для типов полей ключа (KeysetPaginator._parse_key)
+        self.model = querysets[0].model if querysets else None
+
+    def order_by(self, *ordering):
+        return MergedRows(
+            *(queryset.order_by(*ordering) for queryset in self.querysets),
+            ordering=ordering)
+
+    def filter(self, *args, **kwargs):
+        return MergedRows(
+            *(queryset.filter(*args, **kwargs)
+              for queryset in self.querysets),
+            ordering=self.ordering)
+
+    def reverse(self):
+        return MergedRows(
+            *(queryset.reverse() for queryset in self.querysets),
+            ordering=[field[1:] if field.startswith('-') else f'-{field}'
+                      for field in self.ordering])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.stop is None:
+            raise TypeError('MergedRows поддерживает только срезы с концом')
+        key = itemgetter(*(field.lstrip('-') for field in self.ordering))
+        rows = sorted(
+            (row for queryset in self.querysets
+             for row in queryset[:item.stop]),
+            key=key, reverse=self.ordering[0].startswith('-'))
+        merged, seen = [], set()
+        for row in rows:
+            if key(row) not in seen:
+                seen.add(key(row))
+                merged.append(row)
+        return merged[item]
+
+
+def estimated_count(model):
+    """
+    Приблизительное число строк таблицы без COUNT(*): в PostgreSQL -
+    статистика планировщика (reltuples), в остальных СУБД - наибольший
+    первичный ключ (один шаг по индексу; удалённые строки не вычитаются).
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0]
+    return model.objects.aggregate(total=Max('pk'))['total'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для админки больших таблиц: список без фильтров считается
+    по estimated_count, отфильтрованный - COUNT не дальше
+    ADMIN_COUNT_LIMIT строк (дальнейшие страницы просто не показываются).
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return estimated_count(queryset.model)
+        return queryset[:settings.ADMIN_COUNT_LIMIT].count()
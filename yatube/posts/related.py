@@ -0,0 +1,152 @@
+import heapq
+import math
+import re
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.html import strip_tags
+
+from . import fragments
+from .models import Post, RelatedPost
+
+WORD_RE = re.compile(r'\w{3,}')
+# Надбавки к сходству текстов за общее сообщество и общего автора
+GROUP_WEIGHT = 0.2
+AUTHOR_WEIGHT = 0.1
+
+
+def terms(text):
+    """
+    Слова поста (без разметки, в нижнем регистре) с частотами.
+    """
+    return Counter(WORD_RE.findall(strip_tags(text).lower()))
+
+
+class RelatedIndex:
+    """
+    TF-IDF векторы всех постов и инвертированный индекс по словам.
+    Слишком частые слова (в доле постов больше RELATED_POSTS_MAX_DF)
+    и слова из одного поста не учитываются, у поста остаются
+    RELATED_POSTS_TERMS самых весомых слов, в списке слова - не больше
+    RELATED_POSTS_POSTINGS постов с наибольшим весом. Поэтому соседи
+    поста считаются не больше чем по TERMS * POSTINGS записям,
+    а не по всем постам с общими словами.
+    """
+    def __init__(self, posts):
+        """
+        posts - [(id, текст, id автора, id сообщества)] от новых к старым.
+        """
+        keep = settings.RELATED_POSTS_PER_POST + 1
+        self.authors, self.groups = {}, {}
+        self.by_author, self.by_group = {}, {}
+        documents = {}
+        for post_id, text, author_id, group_id in posts:
+            documents[post_id] = terms(text)
+            self.authors[post_id] = author_id
+            self.groups[post_id] = group_id
+            # самые новые посты автора и сообщества - запасные кандидаты
+            newest = self.by_author.setdefault(author_id, [])
+            if len(newest) < keep:
+                newest.append(post_id)
+            if group_id is not None:
+                newest = self.by_group.setdefault(group_id, [])
+                if len(newest) < keep:
+                    newest.append(post_id)
+        frequencies = Counter()
+        for words in documents.values():
+            frequencies.update(words.keys())
+        total = len(documents)
+        limit = max(2, settings.RELATED_POSTS_MAX_DF * total)
+        idf = {
+            word: math.log(total / frequency)
+            for word, frequency in frequencies.items()
+            if 1 < frequency <= limit
+        }
+        self.vectors, self.index = {}, {}
+        for post_id, words in documents.items():
+            weights = Counter({
+                word: (1 + math.log(count)) * idf[word]
+                for word, count in words.items() if idf.get(word)
+            }).most_common(settings.RELATED_POSTS_TERMS)
+            norm = math.sqrt(sum(weight * weight for _, weight in weights))
+            vector = [(word, weight / norm) for word, weight in weights]
+            self.vectors[post_id] = vector
+            for word, weight in vector:
+                self.index.setdefault(word, []).append((post_id, weight))
+        postings = settings.RELATED_POSTS_POSTINGS
+        for word, entries in self.index.items():
+            if len(entries) > postings:
+                self.index[word] = heapq.nlargest(
+                    postings, entries, key=itemgetter(1))
+
+    def neighbours(self, post_id):
+        """
+        Лучшие соседи поста: [(id, вес), ...], не больше
+        RELATED_POSTS_PER_POST.
+        """
+        scores = Counter()
+        for word, weight in self.vectors[post_id]:
+            for other, other_weight in self.index[word]:
+                scores[other] += weight * other_weight
+        author_id = self.authors[post_id]
+        group_id = self.groups[post_id]
+        candidates = set(scores)
+        candidates.update(self.by_author[author_id])
+        candidates.update(self.by_group.get(group_id, ()))
+        candidates.discard(post_id)
+        ranked = []
+        for other in candidates:
+            score = scores[other]
+            if group_id is not None and self.groups[other] == group_id:
+                score += GROUP_WEIGHT
+            if self.authors[other] == author_id:
+                score += AUTHOR_WEIGHT
+            ranked.append((other, score))
+        return heapq.nlargest(settings.RELATED_POSTS_PER_POST, ranked,
+                              key=itemgetter(1))
+
+
+def build_index():
+    posts = Post.objects.order_by('-pub_date', '-id').values_list(
+        'id', 'text', 'author_id', 'group_id')
+    return RelatedIndex(posts.iterator(chunk_size=2000))
+
+
+def _batches(post_ids, size):
+    for start in range(0, len(post_ids), size):
+        yield post_ids[start:start + size]
+
+
+def refresh(batch_size):
+    """
+    Полный пересчёт похожих постов: индекс строится один раз в памяти,
+    соседи пишутся пачками по batch_size постов в отдельных транзакциях.
+    Возвращает (количество постов, количество строк).
+    """
+    related_index = build_index()
+    post_ids = list(related_index.vectors)
+    total = 0
+    for batch in _batches(post_ids, batch_size):
+        rows = [
+            RelatedPost(post_id=post_id, related_id=related_id, score=score)
+            for post_id in batch
+            for related_id, score in related_index.neighbours(post_id)
+        ]
+        with transaction.atomic():
+            RelatedPost.objects.filter(post_id__in=batch).delete()
+            RelatedPost.objects.bulk_create(rows)
+        total += len(rows)
+    fragments.bump_sidebar('related')
+    return len(post_ids), total
+
+
+def for_post(post):
+    """
+    Похожие посты для страницы - один запрос по индексу (post, -score)
+    к готовой таблице, без подсчёта сходства во время запроса.
+    """
+    return Post.objects.filter(similar_to__post=post).order_by(
+        '-similar_to__score').only('text', 'image', 'thumbnails')[
+        :settings.RELATED_POSTS_SHOWN]
@@ -0,0 +1,234 @@
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+SEARCH_TABLE = 'posts_post_search'
+
+# Стеммер Портера для русского языка (алгоритм Snowball)
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = re.compile(
+    r'(?:(?<=[ая])(?:в|вши|вшись)|ив|ивши|ившись|ыв|ывши|ывшись)$')
+ADJECTIVE = (
+    'ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|'
+    'их|ых|ую|юю|ая|яя|ою|ею'
+)
+PARTICIPLE = '(?<=[ая])(?:ем|нн|вш|ющ|щ)|ивш|ывш|ующ'
+ADJECTIVAL = re.compile(f'(?:{PARTICIPLE})?(?:{ADJECTIVE})$')
+REFLEXIVE = re.compile('с[яь]$')
+VERB = re.compile(
+    '(?:(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)'
+    '|ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)$'
+)
+NOUN = re.compile(
+    '(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|'
+    'ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$'
+)
+DERIVATIONAL = re.compile('ость?$')
+SUPERLATIVE = re.compile('ейше?$')
+WORD = re.compile(r'\w+')
+
+
+def _region(word, start):
+    """
+    Начало области после первой согласной, идущей за гласной.
+    """
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem(word):
+    """
+    Основа русского слова: "книгами" -> "книг", "красивая" -> "красив".
+    """
+    word = word.lower().replace('ё', 'е')
+    first_vowel = next(
+        (i for i, letter in enumerate(word) if letter in VOWELS), None)
+    if first_vowel is None:
+        return word
+    prefix, rv = word[:first_vowel + 1], word[first_vowel + 1:]
+    r2 = _region(word, _region(word, 0) - 1)
+
+    rv, found = PERFECTIVE_GERUND.subn('', rv)
+    if not found:
+        rv = REFLEXIVE.sub('', rv)
+        for ending in (ADJECTIVAL, VERB, NOUN):
+            rv, found = ending.subn('', rv)
+            if found:
+                break
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    derivational = DERIVATIONAL.search(rv)
+    if derivational and len(prefix) + derivational.start() >= r2:
+        rv = rv[:derivational.start()]
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        rv, found = SUPERLATIVE.subn('', rv)
+        if found and rv.endswith('нн'):
+            rv = rv[:-1]
+        elif not found and rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def terms(text):
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+def is_supported():
+    """
+    Индекс построен на SQLite FTS5; на других СУБД ищем через LIKE.
+    """
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """
+    Выражение MATCH для FTS5: основы слов запроса в кавычках.
+    """
+    return ' '.join(f'"{stem(word)}"' for word in WORD.findall(query.lower()))
+
+
+def filter_posts(queryset, query):
+    """
+    Посты из queryset, подходящие под запрос: подзапрос к полнотекстовому
+    индексу по rowid, на других СУБД - LIKE по каждому слову.
+    """
+    if not is_supported():
+        for word in WORD.findall(query.lower()):
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+    match = match_expression(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(
+        f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+        [match],
+    ))
+
+
+def index_post(post):
+    if is_supported():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, terms) '
+                'VALUES (%s, %s)', [post.id, ' '.join(terms(post.text))],
+            )
+
+
+def index_posts(rows):
+    """
+    Индексация пачки постов одним executemany: rows - пары (id, текст).
+    """
+    if is_supported():
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT OR REPLACE INTO {SEARCH_TABLE} (rowid, terms) '
+                'VALUES (%s, %s)',
+                [(post_id, ' '.join(terms(text))) for post_id, text in rows],
+            )
+
+
+def rebuild_index(batch_size=1000):
+    """
+    Полная переиндексация постов, например после изменения стеммера или
+    на базе, где миграция создала пустой индекс. Возвращает количество
+    постов. В одной транзакции: поиск не видит пустой индекс.
+    """
+    if not is_supported():
+        return 0
+    total = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        rows = Post.objects.order_by().values_list('id', 'text').iterator(
+            chunk_size=batch_size)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                index_posts(batch)
+                total += len(batch)
+                batch = []
+        index_posts(batch)
+        return total + len(batch)
+
+
+def remove_post(post_id):
+    if is_supported():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [post_id])
+
+
+class SearchResults:
+    """
+    Результаты поиска для Paginator: count() и срезы выполняют запросы
+    к полнотекстовому индексу, посты подгружаются только для страницы.
+    Порядок - по релевантности (bm25).
+    """
+    def __init__(self, query, group=None, author=None):
+        self.words = WORD.findall(query.lower())
+        self.match = match_expression(query)
+        self.group = group
+        self.author = author
+        self.filters = []
+        self.params = [self.match]
+        if group is not None:
+            self.filters.append('post.group_id = %s')
+            self.params.append(group.id)
+        if author is not None:
+            self.filters.append('post.author_id = %s')
+            self.params.append(author.id)
+
+    def _fallback(self):
+        posts = Post.objects.select_related('author', 'group')
+        for word in self.words:
+            posts = posts.filter(text__icontains=word)
+        if self.group is not None:
+            posts = posts.filter(group=self.group)
+        if self.author is not None:
+            posts = posts.filter(author=self.author)
+        return posts
+
+    def _sql(self, select):
+        where = ' AND '.join([f'{SEARCH_TABLE} MATCH %s'] + self.filters)
+        return (
+            f'SELECT {select} FROM {SEARCH_TABLE} '
+            f'JOIN posts_post post ON post.id = {SEARCH_TABLE}.rowid '
+            f'WHERE {where}'
+        )
+
+    def count(self):
+        if not self.words:
+            return 0
+        if not is_supported():
+            return self._fallback().count()
+        with connection.cursor() as cursor:
+            cursor.execute(self._sql('COUNT(*)'), self.params)
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not self.words:
+            return []
+        if not is_supported():
+            return list(self._fallback()[item])
+        start, stop = item.start or 0, item.stop
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self._sql('post.id') + f' ORDER BY bm25({SEARCH_TABLE}) '
+                'LIMIT %s OFFSET %s',
+                self.params + [stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
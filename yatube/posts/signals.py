@@ -0,0 +1,170 @@
+from django.db.models import Q
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import (counters, follows, fragments, search, thumbnails, timeline,
+               warmup)
+from .models import Comment, Follow, Group, Post, User
+
+# Поля пользователя, которые выводятся в карточках постов и комментариях
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=Post)
+def post_created_counters(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_counters(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created_counters(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted_counters(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    """
+    Подписка через ORM (админка, create) - те же изменения,
+    что у follows.follow().
+    """
+    if created:
+        follows.followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_bump_card(sender, instance, **kwargs):
+    fragments.bump_post(instance.id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_bump_sidebar(sender, instance, **kwargs):
+    fragments.bump_sidebar('latest_posts')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_bump_sidebar(sender, instance, **kwargs):
+    fragments.bump_sidebar('groups')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_bump_author(sender, instance, **kwargs):
+    fragments.bump_author(instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def user_bump_author(sender, instance, **kwargs):
+    fragments.bump_author(instance.id)
+
+
+@receiver(pre_save, sender=User)
+def user_check_name(sender, instance, update_fields=None, **kwargs):
+    """
+    Запоминает, изменилось ли имя, которое выводится в карточках
+    постов и комментариях. Вход в систему сохраняет только last_login -
+    тогда базу не читаем.
+    """
+    instance._name_changed = False
+    if instance.pk is None or (
+            update_fields is not None
+            and not set(update_fields) & set(USER_NAME_FIELDS)):
+        return
+    old = User.objects.filter(pk=instance.pk).values_list(
+        *USER_NAME_FIELDS).first()
+    instance._name_changed = old != tuple(
+        getattr(instance, field) for field in USER_NAME_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def user_bump_cards(sender, instance, created, **kwargs):
+    """
+    Новое имя - новые версии карточек его постов и постов
+    с его комментариями: иначе страницы показывали бы старое имя.
+    """
+    if not created and getattr(instance, '_name_changed', False):
+        fragments.bump_posts(Post.objects.filter(
+            Q(author_id=instance.id) | Q(comments__author_id=instance.id)
+        ).values_list('id', flat=True).distinct().iterator())
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def group_bump_cards(sender, instance, created=False, **kwargs):
+    """
+    Название сообщества выводится в карточках его постов; после
+    удаления сообщества (SET_NULL, без сигналов постов) - не выводится.
+    """
+    if not created:
+        fragments.bump_posts(instance.posts.values_list(
+            'id', flat=True).iterator())
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_bump_card(sender, instance, **kwargs):
+    """
+    В карточке выводится число комментариев - обновляем её версию.
+    """
+    fragments.bump_post(instance.post_id)
+
+
+@receiver(post_save, sender=Post)
+def post_update_search(sender, instance, **kwargs):
+    search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_remove_search(sender, instance, **kwargs):
+    search.remove_post(instance.id)
+
+
+@receiver(post_save, sender=Post)
+def post_schedule_thumbnails(sender, instance, **kwargs):
+    """
+    Новая или заменённая картинка - миниатюры готовятся в фоне.
+    """
+    if instance.image and not instance.thumbnail_urls:
+        thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, **kwargs):
+    """
+    Новый пост раскладывается по лентам подписчиков.
+    """
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def rewarm_hot_pages(sender, instance, **kwargs):
+    """
+    Версии страниц сменились - горячие страницы прогреет фоновый поток.
+    """
+    warmup.invalidated()
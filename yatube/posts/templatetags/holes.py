@@ -0,0 +1,14 @@
+from django import template
+
+from posts.pagecache import hole_marker
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **kwargs):
+    """
+    Блок, который у каждого пользователя свой (posts/pagecache.py):
+    {% hole 'follow_button' author=author.username author_id=author.id %}
+    """
+    return hole_marker(context['request'], name, kwargs, context)
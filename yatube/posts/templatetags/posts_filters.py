@@ -1,6 +1,8 @@
 from datetime import datetime
 from django import template
 
+from posts.thumbnails import picture_sources, thumbnail_url
+
 register = template.Library()
 
 
@@ -22,3 +24,30 @@ def first_2paragraph(value):
     paragraphs = value.split('\n')
     # return len(paragraphs)
     return '\n'.join(paragraphs[:4])
+
+
+@register.filter
+def new_badge(post, counter):
+    """
+    Плашка "Новое": только для первых двух постов с картинкой
+    и не старше 2 дней.
+    """
+    return bool(counter < 3 and post.image
+                and days_until(post.pub_date) < 3)
+
+
+@register.filter
+def thumbnail(post, size):
+    """
+    Адрес заранее подготовленной миниатюры картинки поста
+    (размеры - в posts.thumbnails.SIZES) или заглушка.
+    """
+    return thumbnail_url(post, size)
+
+
+@register.filter
+def sources(post, size):
+    """
+    Пары (MIME-тип, srcset) с WebP/AVIF-вариантами для <picture>.
+    """
+    return picture_sources(post, size)
@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+POSTS_URL = reverse('admin:posts_post_changelist')
+
+
+class AdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'MrsHudson', 'hudson@example.com', 'password')
+        cls.holmes = User.objects.create_user(username='SherlockHolmes')
+        cls.group = Group.objects.create(title='Дела', slug='cases')
+        Group.objects.create(title='Скрипка', slug='violin')
+        cls.post = Post.objects.create(
+            author=cls.holmes, group=cls.group, text='Собака Баскервилей')
+        Post.objects.create(author=cls.holmes, text='Пляшущие человечки')
+        Comment.objects.create(
+            post=cls.post, author=cls.admin, text='Элементарно')
+        Follow.objects.create(user=cls.admin, author=cls.holmes)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_changelists(self):
+        """
+        Списки постов, комментариев и подписок открываются.
+        """
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                response = self.client.get(
+                    reverse(f'admin:posts_{model}_changelist'))
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_changelist_is_cheap(self):
+        """
+        Без COUNT(*) по всей таблице, без запроса на строку и без
+        <select> со всеми сообществами.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(POSTS_URL)
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([query for query in sql if 'COUNT(' in query])
+        self.assertFalse([query for query in sql
+                          if 'FROM "posts_group"' in query])
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(response, 'selected>Дела</option>')
+        self.assertNotContains(response, 'Скрипка')
+
+    def test_search_uses_full_text_index(self):
+        """
+        Поиск по постам идёт через полнотекстовый индекс (по основе слова).
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(POSTS_URL, {'q': 'собаки'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.post])
+        self.assertTrue([query for query in queries.captured_queries
+                         if 'MATCH' in query['sql']])
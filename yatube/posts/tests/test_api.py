@@ -0,0 +1,155 @@
+import base64
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+POSTS_COUNT = settings.PAGINATOR_OBJECTS_PER_PAGE + 3
+INDEX_URL = reverse('post:api_index')
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.holmes = User.objects.create_user(
+            username='SherlockHolmes', first_name='Шерлок',
+            last_name='Холмс')
+        cls.watson = User.objects.create_user(username='DrJohnHWatson')
+        cls.group = Group.objects.create(title='Дела', slug='cases')
+        for number in range(POSTS_COUNT):
+            cls.post = Post.objects.create(
+                author=cls.holmes, group=cls.group, text=f'Дело {number}')
+        Follow.objects.create(user=cls.watson, author=cls.holmes)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.watson)
+
+    def test_feeds(self):
+        """
+        Ленты отдают первую страницу постов от новых к старым и курсор.
+        """
+        urls = (
+            INDEX_URL,
+            reverse('post:api_group_list', args=[self.group.slug]),
+            reverse('post:api_profile', args=[self.holmes.username]),
+            reverse('post:api_follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['posts']),
+                                 settings.PAGINATOR_OBJECTS_PER_PAGE)
+                first = data['posts'][0]
+                self.assertEqual(first['id'], self.post.id)
+                self.assertEqual(first['author']['full_name'],
+                                 'Шерлок Холмс')
+                self.assertEqual(first['group']['slug'], self.group.slug)
+                self.assertIsNone(first['image'])
+                self.assertIsNotNone(data['next_cursor'])
+
+    def test_feed_cursor(self):
+        """
+        По курсору - остальные посты без повторов.
+        """
+        first = self.client.get(INDEX_URL).json()
+        second = self.client.get(
+            INDEX_URL, {'cursor': first['next_cursor']}).json()
+        ids = [post['id'] for post in first['posts'] + second['posts']]
+        self.assertEqual(len(set(ids)), POSTS_COUNT)
+        self.assertIsNone(second['next_cursor'])
+
+    def test_forged_cursor(self):
+        """
+        Подделанный ключ курсора в любой ленте - первая страница, а не 500.
+        """
+        self.client.force_login(self.watson)
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([['garbage', None], 2, True]).encode()).decode()
+        for url in (INDEX_URL, reverse('post:api_follow_index'),
+                    reverse('post:api_post_detail', args=[self.post.id])):
+            with self.subTest(url=url):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+
+    def test_not_found(self):
+        """
+        Несуществующие сообщество, автор и пост - 404.
+        """
+        for url in (reverse('post:api_group_list', args=['nope']),
+                    reverse('post:api_profile', args=['nope']),
+                    reverse('post:api_post_detail', args=[0])):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_not_modified(self):
+        """
+        Тот же ETag - 304 без выборки полей постов. Last-Modified
+        не отдаётся: правку поста по датам не увидеть.
+        """
+        response = self.client.get(INDEX_URL)
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertNotIn('Last-Modified', response)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse([query for query in queries.captured_queries
+                          if '"posts_post"."text"' in query['sql']])
+
+    def test_etag_changes(self):
+        """
+        Правка поста, комментарий и новый пост меняют ETag ленты.
+        """
+        etag = self.client.get(INDEX_URL)['ETag']
+        changes = (
+            lambda: Post.objects.get(pk=self.post.pk).save(),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.watson, text='Элементарно'),
+            lambda: Post.objects.create(author=self.holmes, text='Новое'),
+        )
+        for change in changes:
+            change()
+            response = self.client.get(INDEX_URL, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+            etag = response['ETag']
+
+    def test_post_detail(self):
+        """
+        Пост с комментариями; новый комментарий меняет ETag,
+        If-Modified-Since не даёт устаревшего 304.
+        """
+        url = reverse('post:api_post_detail', args=[self.post.id])
+        comment = Comment.objects.create(
+            post=self.post, author=self.watson, text='Элементарно')
+        response = self.client.get(url)
+        data = response.json()
+        self.assertEqual(data['post']['text'], self.post.text)
+        self.assertEqual(data['comments'][0]['text'], 'Элементарно')
+        self.assertEqual(data['comments'][0]['author']['username'],
+                         self.watson.username)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.holmes, text='Вы правы')
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(comment.created.timestamp())
+        ).status_code, 200)
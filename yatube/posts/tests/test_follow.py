@@ -1,10 +1,20 @@
 from http import HTTPStatus
+import os
+import tempfile
+from io import StringIO
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Post
+from .. import follows, graph, timeline
+from ..models import Follow, Post, Suggestion, SuggestionQueue, TimelineEntry
 
 User = get_user_model()
 
@@ -93,6 +103,49 @@ class FollowTests(TestCase):
         self.assertEqual(len(follower.context.get('page_obj').object_list), 0,
                          'Список постов отписанного автора не пустой')
 
+    def test_repeated_follow_and_unfollow(self):
+        """
+        Двойной клик по подписке/отписке не создаёт дублей
+        и не сбивает счётчики.
+        """
+        self.authorized_follower.get(FOLLOW)
+        self.authorized_follower.get(FOLLOW)
+        self.assertEqual(Follow.objects.filter(
+            user=self.follower, author=self.author).count(), 1)
+        self.author.counters.refresh_from_db()
+        self.assertEqual(self.author.counters.followers_count, 1)
+        self.authorized_follower.get(UNFOLLOW)
+        self.authorized_follower.get(UNFOLLOW)
+        self.assertFalse(Follow.objects.filter(
+            user=self.follower, author=self.author).exists())
+        self.author.counters.refresh_from_db()
+        self.assertEqual(self.author.counters.followers_count, 0)
+
+    def test_follow_without_model_signals(self):
+        """
+        follow()/unfollow() не шлют сигналы модели с несохранёнными
+        объектами, а сами обновляют счётчики и ленту.
+        """
+        sent = []
+
+        def receiver(sender, **kwargs):
+            sent.append(kwargs['instance'])
+
+        for signal in (post_save, post_delete):
+            signal.connect(receiver, sender=Follow)
+            self.addCleanup(signal.disconnect, receiver, sender=Follow)
+        self.assertTrue(follows.follow(self.follower, self.author))
+        self.assertFalse(follows.follow(self.follower, self.author))
+        self.author.counters.refresh_from_db()
+        self.assertEqual(self.author.counters.followers_count, 1)
+        self.assertTrue(self.follower.timeline.filter(post=self.post).exists())
+        self.assertTrue(follows.unfollow(self.follower, self.author))
+        self.assertFalse(follows.unfollow(self.follower, self.author))
+        self.author.counters.refresh_from_db()
+        self.assertEqual(self.author.counters.followers_count, 0)
+        self.assertFalse(self.follower.timeline.exists())
+        self.assertEqual(sent, [])
+
     def test_view_post_followed_users(self):
         """
         Новая запись пользователя ПОявляется в ленте подписчиков.
@@ -108,3 +161,327 @@ class FollowTests(TestCase):
         profile_nonfollow = self.authorized_author.get(FOLLOW, follow=True)
         context_nonfollower = profile_nonfollow.context['page_obj']
         self.assertNotIn(self.post2, context_nonfollower)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=USERNAME_AUTH)
+        cls.follower = User.objects.create_user(username='Moriarty')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_follower = Client()
+        self.authorized_follower.force_login(self.follower)
+
+    def test_new_post_pushed_to_followers(self):
+        """
+        Новый пост попадает в ленту подписчика при публикации.
+        """
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post).exists())
+
+    @override_settings(FOLLOW_GRAPH_SHARED=True)
+    def test_fan_out_not_from_stale_graph(self):
+        """
+        Подписка, которую граф этого процесса ещё не видел (сделана
+        в другом воркере), всё равно получает новый пост.
+        """
+        self.addCleanup(graph.reset)
+        graph.get_graph()
+        Follow.objects.bulk_create(
+            [Follow(user=self.follower, author=self.author)])
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post).exists())
+
+    def test_follow_fills_and_unfollow_clears_timeline(self):
+        """
+        Подписка добавляет старые посты автора, отписка их убирает.
+        """
+        post = Post.objects.create(text='Старый пост', author=self.author)
+        self.authorized_follower.get(FOLLOW)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.follower, post=post).exists())
+        self.authorized_follower.get(UNFOLLOW)
+        self.assertFalse(self.follower.timeline.exists())
+
+    @override_settings(TIMELINE_MAX_LENGTH=2)
+    def test_timeline_is_bounded(self):
+        """
+        В ленте хранится не больше TIMELINE_MAX_LENGTH записей:
+        хвост обрезается при записи, а не на странице подписок.
+        """
+        for i in range(3):
+            Post.objects.create(text=f'Старый пост {i}', author=self.author)
+        self.authorized_follower.get(FOLLOW)
+        self.assertEqual(self.follower.timeline.count(), 2)
+        for i in range(2):
+            newest = Post.objects.create(text=f'Пост {i}', author=self.author)
+        self.assertEqual(self.follower.timeline.count(), 2)
+        self.assertEqual(self.follower.timeline.first().post, newest)
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_follower.get(FOLLOW_INDEX)
+        self.assertFalse(any(query['sql'].startswith('DELETE')
+                             for query in queries))
+
+    @override_settings(TIMELINE_MAX_LENGTH=3, TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_fill_readers(self):
+        """
+        Массовая сборка лент: последние посты подписок каждого читателя,
+        без постов популярных авторов и не длиннее TIMELINE_MAX_LENGTH.
+        """
+        star = User.objects.create_user(username='star')
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(4)]
+        Post.objects.create(text='Пост звезды', author=star)
+        Follow.objects.bulk_create([
+            Follow(user=self.follower, author=self.author),
+            Follow(user=self.follower, author=star),
+            Follow(user=self.author, author=star),
+        ])
+        call_command('rebuild_counters', stdout=StringIO())
+        timeline.fill_readers([self.follower.id, self.author.id])
+        self.assertEqual(
+            list(self.follower.timeline.values_list('post', flat=True)),
+            [post.id for post in reversed(posts[1:])])
+        self.assertFalse(self.author.timeline.exists())
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=1)
+    def test_celebrity_posts_read_on_demand(self):
+        """
+        Посты популярного автора не раскладываются по лентам,
+        но всё равно видны на странице подписок.
+        """
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(self.follower.timeline.exists())
+        response = self.authorized_follower.get(FOLLOW_INDEX)
+        self.assertIn(post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_CELEBRITY_FOLLOWERS=2)
+    def test_celebrity_posts_merged_by_date(self):
+        """
+        Посты из ленты и посты популярного автора идут вперемешку
+        по дате публикации, в том числе на следующих страницах.
+        """
+        star = User.objects.create_user(username='star')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, author=star)
+        Follow.objects.create(user=self.author, author=star)
+        posts = []
+        for i in range(settings.PAGINATOR_OBJECTS_PER_PAGE + 3):
+            posts.append(Post.objects.create(
+                text=f'Пост {i}', author=star if i % 2 else self.author))
+        expected = list(reversed(posts))
+        response = self.authorized_follower.get(FOLLOW_INDEX)
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), expected[:len(page_obj)])
+        response = self.authorized_follower.get(
+            FOLLOW_INDEX, {'cursor': page_obj.paginator.next_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         expected[len(page_obj):])
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.holmes = User.objects.create_user(username=USERNAME_AUTH)
+        cls.watson = User.objects.create_user(username='DrJohnHWatson')
+        cls.moriarty = User.objects.create_user(username='Moriarty')
+        Follow.objects.create(user=cls.watson, author=cls.holmes)
+        Follow.objects.create(user=cls.holmes, author=cls.watson)
+        Follow.objects.create(user=cls.moriarty, author=cls.holmes)
+
+    def setUp(self):
+        cache.clear()
+        self.graph = graph.FollowGraph()
+        self.graph.load_from_db()
+
+    def test_queries(self):
+        """
+        Подписка, подписчики, подписки и взаимные подписки - из графа.
+        """
+        self.assertTrue(self.graph.follows(self.watson.id, self.holmes.id))
+        self.assertFalse(self.graph.follows(self.holmes.id, self.moriarty.id))
+        self.assertEqual(self.graph.followers(self.holmes.id),
+                         sorted([self.watson.id, self.moriarty.id]))
+        self.assertEqual(self.graph.following(self.holmes.id),
+                         [self.watson.id])
+        self.assertEqual(self.graph.mutual(self.holmes.id), [self.watson.id])
+
+    def test_other_worker_applies_log(self):
+        """
+        Изменение в одном воркере видно другому после sync().
+        """
+        other = graph.FollowGraph()
+        other.load_from_db()
+        self.graph.record(graph.FOLLOW, self.holmes.id, self.moriarty.id)
+        self.graph.record(graph.UNFOLLOW, self.watson.id, self.holmes.id)
+        other.sync(force=True)
+        self.assertTrue(other.follows(self.holmes.id, self.moriarty.id))
+        self.assertFalse(other.follows(self.watson.id, self.holmes.id))
+        self.assertEqual(other.edges, self.graph.edges)
+
+    @override_settings(FOLLOW_GRAPH_SHARED=True)
+    def test_rolled_back_follow_not_logged(self):
+        """
+        Подписка из откаченной транзакции не попадает в журнал.
+        """
+        self.addCleanup(graph.reset)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Follow.objects.create(user=self.holmes, author=self.moriarty)
+                raise RuntimeError
+        self.assertIsNone(cache.get(graph.LOG_KEY.format(1)))
+        self.assertFalse(graph.get_graph().follows(
+            self.holmes.id, self.moriarty.id))
+
+    def test_lost_log_reloads_from_db(self):
+        """
+        Если общий кэш очищен, граф перечитывается из базы.
+        """
+        self.graph.record(graph.FOLLOW, self.holmes.id, self.moriarty.id)
+        cache.clear()
+        self.graph.sync(force=True)
+        self.assertFalse(self.graph.follows(self.holmes.id, self.moriarty.id))
+
+    def test_reload_entry(self):
+        """
+        Запись RELOAD в журнале (после импорта) - другие воркеры
+        перечитывают граф из базы и видят подписки, сделанные без сигналов.
+        """
+        other = graph.FollowGraph()
+        other.load_from_db()
+        Follow.objects.bulk_create(
+            [Follow(user=self.holmes, author=self.moriarty)])
+        self.graph.record(graph.RELOAD, 0, 0)
+        other.sync(force=True)
+        self.assertTrue(other.follows(self.holmes.id, self.moriarty.id))
+        self.assertEqual(other.seq, self.graph.seq)
+
+    def test_snapshot(self):
+        """
+        Граф из снимка совпадает с графом из базы.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'graph.bin')
+            self.graph.save_snapshot(path)
+            restored = graph.FollowGraph()
+            self.assertTrue(restored.load_snapshot(path))
+        self.assertEqual(restored.edges, 3)
+        self.assertEqual(restored.followers(self.holmes.id),
+                         self.graph.followers(self.holmes.id))
+        self.assertEqual(restored.mutual(self.watson.id), [self.holmes.id])
+
+
+class SuggestionsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.watson = User.objects.create_user(username='DrJohnHWatson')
+        cls.holmes = User.objects.create_user(username=USERNAME_AUTH)
+        cls.mycroft = User.objects.create_user(username='MycroftHolmes')
+        cls.lestrade = User.objects.create_user(username='Lestrade')
+        cls.adler = User.objects.create_user(username='IreneAdler')
+        Follow.objects.create(user=cls.watson, author=cls.holmes)
+        # друг друга: Холмс читает Майкрофта
+        Follow.objects.create(user=cls.holmes, author=cls.mycroft)
+        # совместная подписка: читатель Холмса читает и Ирен Адлер
+        Follow.objects.create(user=cls.lestrade, author=cls.holmes)
+        Follow.objects.create(user=cls.lestrade, author=cls.adler)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.watson)
+        call_command('refresh_suggestions', all=True, stdout=StringIO())
+
+    def test_friends_and_co_follows(self):
+        """
+        Рекомендуются друзья друзей и авторы, которых читают вместе
+        с подписками пользователя; друзья друзей - выше.
+        """
+        authors = list(Suggestion.objects.filter(
+            user=self.watson).values_list('author', flat=True))
+        self.assertEqual(authors, [self.mycroft.id, self.adler.id])
+        response = self.client.get(FOLLOW_INDEX)
+        self.assertEqual(
+            [suggestion.author for suggestion in response.context[
+                'suggestions']],
+            [self.mycroft, self.adler],
+        )
+
+    def test_follow_drops_suggestion_and_queues_refresh(self):
+        """
+        Подписка убирает рекомендацию сразу, пересчёт - по очереди.
+        """
+        self.client.get(reverse(
+            'post:profile_follow', kwargs={'username': 'MycroftHolmes'}))
+        self.assertFalse(Suggestion.objects.filter(
+            user=self.watson, author=self.mycroft).exists())
+        self.assertTrue(SuggestionQueue.objects.filter(
+            user=self.watson).exists())
+        call_command('refresh_suggestions', stdout=StringIO())
+        self.assertFalse(SuggestionQueue.objects.exists())
+
+
+@override_settings(PROFILE_FOLLOWS_PREVIEW=2, FOLLOWS_PER_PAGE=2)
+class FollowListsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=USERNAME_AUTH)
+        cls.readers = [
+            User.objects.create_user(username=f'Irregular{number}')
+            for number in range(5)
+        ]
+        for reader in cls.readers:
+            Follow.objects.create(user=reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_profile_preview(self):
+        """
+        На профиле - только последние подписчики и ссылка на все,
+        число запросов не зависит от числа подписчиков.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(PROFILE)
+        self.assertEqual(response.context['followers'],
+                         self.readers[:-3:-1])
+        self.assertContains(response, reverse(
+            'post:followers', kwargs={'username': USERNAME_AUTH}))
+        Follow.objects.create(
+            user=User.objects.create_user(username='Wiggins'),
+            author=self.author)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            Client().get(PROFILE)
+
+    def test_followers_pages(self):
+        """
+        Полный список подписчиков листается по курсору, новые - первыми.
+        """
+        url = reverse('post:followers', kwargs={'username': USERNAME_AUTH})
+        users = []
+        response = Client().get(url)
+        while True:
+            users += response.context['users']
+            cursor = response.context['page_obj'].paginator.next_cursor
+            if not response.context['page_obj'].has_next():
+                break
+            response = Client().get(url, {'cursor': cursor})
+        self.assertEqual(users, self.readers[::-1])
+
+    def test_following_page(self):
+        """
+        Список подписок читателя - авторы, на которых он подписан.
+        """
+        response = Client().get(reverse(
+            'post:following', kwargs={'username': self.readers[0].username}))
+        self.assertEqual(response.context['users'], [self.author])
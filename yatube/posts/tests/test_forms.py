@@ -1,3 +1,4 @@
+from io import BytesIO
 from os import path
 import shutil
 import tempfile
@@ -7,6 +8,9 @@ from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
 
 from ..models import Post, Group, Comment
 
@@ -141,3 +145,41 @@ class PostsFormsTests(TestCase):
                 author=form_data['author'],
             ).exists()
         )
+
+
+def make_jpeg(size, exif=True):
+    image = Image.new('RGB', size, 'red')
+    buffer = BytesIO()
+    if exif:
+        metadata = Image.Exif()
+        metadata[0x010F] = 'Camera'
+        image.save(buffer, 'JPEG', exif=metadata.tobytes())
+    else:
+        image.save(buffer, 'JPEG')
+    return SimpleUploadedFile(
+        'photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIDE=100,
+                   IMAGE_MAX_PIXELS=400 * 300)
+class ImageNormalizationTests(TestCase):
+    def test_large_image_downscaled_without_metadata(self):
+        """
+        Большая картинка уменьшается, метаданные удаляются.
+        """
+        form = PostForm(data={'text': 'Фото'},
+                        files={'image': make_jpeg((400, 300))})
+        self.assertTrue(form.is_valid(), form.errors)
+        image = Image.open(form.cleaned_data['image'])
+        self.assertEqual(image.size, (100, 75))
+        self.assertNotIn('exif', image.info)
+
+    def test_too_many_pixels_rejected(self):
+        """
+        Картинка больше IMAGE_MAX_PIXELS отклоняется формой.
+        """
+        form = PostForm(data={'text': 'Фото'},
+                        files={'image': make_jpeg((401, 300), exif=False)})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['image'][0].split(':')[0],
+                         'Слишком большая картинка')
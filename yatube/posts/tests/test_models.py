@@ -1,7 +1,12 @@
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 
-from ..models import Group, Post
+from .. import counters
+from ..models import Comment, Follow, Group, Post, UserCounters
 
 User = get_user_model()
 
@@ -62,3 +67,58 @@ class PostModelTest(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='SherlockHolmes')
+        cls.reader = User.objects.create_user(username='DrJohnHWatson')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(
+            author=self.reader, post=post, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        counters = UserCounters.objects.get(user=self.user)
+        self.assertEqual(counters.posts_count, 1)
+        self.assertEqual(counters.followers_count, 1)
+        self.assertEqual(self.reader.counters.following_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        counters.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertEqual(counters.followers_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters исправляет рассинхронизацию."""
+        Post.objects.bulk_create([
+            Post(author=self.user, text=f'Пост {i}') for i in range(3)
+        ])
+        post = Post.objects.first()
+        Comment.objects.bulk_create([
+            Comment(author=self.reader, post=post, text='Комментарий')
+        ])
+        call_command('rebuild_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).posts_count, 3)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.reader).posts_count, 0)
+
+    def test_rebuild_counters_is_atomic(self):
+        """Сбой пересчёта не оставляет таблицу счётчиков пустой."""
+        Post.objects.create(author=self.user, text='Пост')
+        with mock.patch.object(UserCounters.objects, 'bulk_create',
+                               side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                counters.rebuild_all()
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).posts_count, 1)
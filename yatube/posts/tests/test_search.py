@@ -0,0 +1,108 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import SEARCH_TABLE, stem
+
+User = get_user_model()
+
+SEARCH = reverse('post:search')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='SherlockHolmes')
+        cls.other = User.objects.create_user(username='DrJohnHWatson')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+        )
+        cls.post_books = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text='Красивые книги о книгах и ещё раз книги',
+        )
+        cls.post_book = Post.objects.create(
+            author=cls.other, text='Одна красивая книга',
+        )
+        cls.post_other = Post.objects.create(
+            author=cls.user, text='Скрипка и табак',
+        )
+
+    def setUp(self):
+        self.client = Client()
+
+    def test_stem(self):
+        """
+        Разные формы слова приводятся к одной основе.
+        """
+        for first, second in (('книги', 'книгами'),
+                              ('красивая', 'красивые'),
+                              ('ёлки', 'елками')):
+            with self.subTest(word=first):
+                self.assertEqual(stem(first), stem(second))
+
+    def test_search_finds_word_forms_ranked(self):
+        """
+        Поиск находит формы слова, более релевантный пост - выше.
+        """
+        response = self.client.get(SEARCH, {'query': 'книгами'})
+        posts = list(response.context['page_obj'])
+        self.assertEqual(posts, [self.post_books, self.post_book])
+
+    def test_search_filters(self):
+        """
+        Фильтры по сообществу и автору.
+        """
+        response = self.client.get(
+            SEARCH, {'query': 'книга', 'group': self.group.slug})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.post_books])
+        response = self.client.get(
+            SEARCH, {'query': 'книга', 'author': self.other.username})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.post_book])
+
+    def test_index_follows_edit_and_delete(self):
+        """
+        Индекс обновляется при редактировании и удалении поста.
+        """
+        post = Post.objects.create(author=self.user, text='Дедукция')
+        post.text = 'Индукция'
+        post.save()
+        response = self.client.get(SEARCH, {'query': 'дедукция'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+        response = self.client.get(SEARCH, {'query': 'индукция'})
+        self.assertEqual(list(response.context['page_obj']), [post])
+        post.delete()
+        response = self.client.get(SEARCH, {'query': 'индукция'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_empty_query(self):
+        response = self.client.get(SEARCH)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_rebuild_search_index_command(self):
+        """
+        Команда rebuild_search_index индексирует посты заново и убирает
+        устаревшие строки индекса.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, terms) VALUES (%s, %s)',
+                [self.post_other.id, 'книг'],
+            )
+        call_command('rebuild_search_index', batch_size=2, stdout=StringIO())
+        response = self.client.get(SEARCH, {'query': 'книгами'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.post_books, self.post_book])
+        response = self.client.get(SEARCH, {'query': 'скрипка'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.post_other])
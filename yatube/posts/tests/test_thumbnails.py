@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='SherlockHolmes')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        self.post.refresh_from_db()
+
+    def test_thumbnails_generated_on_save(self):
+        """
+        После сохранения готовы миниатюры всех размеров из шаблонов.
+        """
+        self.assertEqual(set(self.post.thumbnail_urls),
+                         set(thumbnails.SIZES))
+
+    def test_templates_use_ready_thumbnails(self):
+        """
+        Шаблоны выводят готовые адреса миниатюр, а не делают их сами.
+        """
+        response = Client().get(
+            reverse('post:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertContains(response, self.post.thumbnail_urls['full'])
+        response = Client().get(reverse('post:index'))
+        self.assertContains(response, self.post.thumbnail_urls['card'])
+
+    def test_placeholder_until_ready(self):
+        """
+        Пока миниатюры нет - заглушка, а картинка ставится в очередь.
+        """
+        Post.objects.filter(id=self.post.id).update(thumbnails='')
+        cache.clear()
+        self.post.refresh_from_db()
+        self.assertEqual(thumbnails.thumbnail_url(self.post, 'card'),
+                         thumbnails.PLACEHOLDER)
+        self.post.refresh_from_db()
+        self.assertIn('card', self.post.thumbnail_urls)
+
+    def test_modern_formats_in_picture(self):
+        """
+        Для <picture> готовы WebP-варианты с srcset, шаблоны их выводят.
+        """
+        sources = dict(thumbnails.picture_sources(self.post, 'card'))
+        self.assertIn('image/webp', sources)
+        self.assertIn(' 480w', sources['image/webp'])
+        response = Client().get(reverse('post:index'))
+        self.assertContains(response, '<source type="image/webp"')
+
+    def test_backfill_command(self):
+        """
+        Команда backfill_thumbnails делает варианты для старых постов.
+        """
+        Post.objects.filter(id=self.post.id).update(thumbnails='')
+        call_command('backfill_thumbnails', workers=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertIn('card', self.post.thumbnail_data['sources'])
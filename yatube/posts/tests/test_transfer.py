@@ -0,0 +1,186 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserCounters
+from ..search import SearchResults
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+PUB_DATE = timezone.now() - timedelta(days=30)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.folder = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+        holmes = User.objects.create_user(
+            username='SherlockHolmes', first_name='Шерлок')
+        watson = User.objects.create_user(username='DrJohnHWatson')
+        group = Group.objects.create(title='Дела', slug='cases')
+        post = Post.objects.create(
+            author=holmes, group=group, text='Собака Баскервилей',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+        Post.objects.filter(pk=post.pk).update(pub_date=PUB_DATE)
+        Post.objects.create(author=watson, text='Этюд в багровых тонах')
+        Comment.objects.create(post=post, author=watson, text='Элементарно')
+        Follow.objects.create(user=watson, author=holmes)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def clear(self):
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+
+    def check_restored(self):
+        holmes = User.objects.get(username='SherlockHolmes')
+        watson = User.objects.get(username='DrJohnHWatson')
+        self.assertEqual(holmes.first_name, 'Шерлок')
+        post = Post.objects.get(text='Собака Баскервилей')
+        self.assertEqual(post.author, holmes)
+        self.assertEqual(post.group.slug, 'cases')
+        self.assertEqual(post.pub_date, PUB_DATE)
+        self.assertEqual(Comment.objects.get().post, post)
+        self.assertTrue(Follow.objects.filter(
+            user=watson, author=holmes).exists())
+        return post
+
+    def test_ndjson_round_trip(self):
+        """
+        Выгрузка в NDJSON и загрузка в пустую базу восстанавливают
+        записи, ссылки, даты и производные данные.
+        """
+        path = os.path.join(self.folder, 'dump.ndjson')
+        call_command('export_posts', path, stderr=StringIO())
+        self.clear()
+        out = StringIO()
+        call_command('import_posts', path, batch_size=1, stdout=out)
+        self.assertIn('post: 2', out.getvalue())
+        post = self.check_restored()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(UserCounters.objects.get(
+            user=post.author).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(list(SearchResults('собака')[:1]), [post])
+        self.assertFalse(post.image.storage.exists(post.image.name))
+
+    def test_csv_round_trip_with_images(self):
+        """
+        CSV - файл на модель; с --media картинки копируются вместе
+        с записями.
+        """
+        media = os.path.join(self.folder, 'media')
+        call_command('export_posts', self.folder, format='csv',
+                     media=media, stderr=StringIO())
+        self.assertTrue(os.path.exists(os.path.join(self.folder, 'post.csv')))
+        self.clear()
+        call_command('import_posts', self.folder, format='csv',
+                     media=media, stdout=StringIO())
+        post = self.check_restored()
+        self.assertTrue(post.image.storage.exists(post.image.name))
+
+    def test_import_into_existing_data(self):
+        """
+        Повторная загрузка не дублирует пользователей, сообщества
+        и подписки, а посты получают новые id от базы - комментарии
+        ссылаются на новые копии, даты сохраняются.
+        """
+        path = os.path.join(self.folder, 'dump.ndjson')
+        call_command('export_posts', path, stderr=StringIO())
+        call_command('import_posts', path, merge_users=True, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Group.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Post.objects.count(), 4)
+        self.assertEqual(Comment.objects.count(), 2)
+        copy = Post.objects.filter(text='Собака Баскервилей').latest('pk')
+        self.assertEqual(copy.pub_date, PUB_DATE)
+        self.assertEqual(Comment.objects.latest('pk').post, copy)
+        # даты восстанавливаются без правки полей модели
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_existing_users_need_merge_flag(self):
+        """
+        Без --merge-users посты не дописываются к существующим
+        аккаунтам с тем же username - загрузка прерывается.
+        """
+        path = os.path.join(self.folder, 'dump.ndjson')
+        call_command('export_posts', path, stderr=StringIO())
+        with self.assertRaisesMessage(CommandError, 'SherlockHolmes'):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_duplicates_in_dump(self):
+        """
+        Повторы пользователя, сообщества и подписки в выгрузке
+        не ломают загрузку; одинаковые посты получают свои id.
+        """
+        path = os.path.join(self.folder, 'dump.ndjson')
+        records = [
+            {'model': 'user', 'id': 1, 'username': 'Lestrade',
+             'first_name': '', 'last_name': '', 'email': ''},
+            {'model': 'user', 'id': 2, 'username': 'Lestrade',
+             'first_name': '', 'last_name': '', 'email': ''},
+            {'model': 'group', 'id': 1, 'title': 'Ярд', 'slug': 'yard',
+             'description': ''},
+            {'model': 'group', 'id': 2, 'title': 'Ярд', 'slug': 'yard',
+             'description': ''},
+            *({'model': 'post', 'id': number, 'text': 'Рапорт',
+               'pub_date': PUB_DATE.isoformat(), 'author': 1, 'group': 2,
+               'image': ''} for number in (1, 2)),
+            {'model': 'comment', 'id': 1, 'post': 2, 'author': 2,
+             'text': 'Принято', 'created': PUB_DATE.isoformat()},
+        ]
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+        call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(User.objects.filter(username='Lestrade').count(), 1)
+        self.assertEqual(Group.objects.filter(slug='yard').count(), 1)
+        posts = Post.objects.filter(text='Рапорт').order_by('pk')
+        self.assertEqual(len(posts), 2)
+        self.assertEqual(Comment.objects.get(text='Принято').post, posts[1])
+
+    def test_database_error_is_command_error(self):
+        """
+        Ошибка базы при загрузке - CommandError, а не трассировка.
+        """
+        path = os.path.join(self.folder, 'dump.ndjson')
+        records = [
+            {'model': 'user', 'id': 1, 'username': 'Lestrade',
+             'first_name': '', 'last_name': '', 'email': ''},
+            {'model': 'post', 'id': 1, 'text': None,
+             'pub_date': PUB_DATE.isoformat(), 'author': 1, 'group': None,
+             'image': ''},
+        ]
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+        with self.assertRaises(CommandError):
+            call_command('import_posts', path, stdout=StringIO())
@@ -1,3 +1,6 @@
+import base64
+import json
+from io import StringIO
 from os import path
 import shutil
 import tempfile
@@ -5,14 +8,24 @@ import tempfile
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import tag, TestCase, Client, override_settings
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.test import (
+    tag, TestCase, Client, RequestFactory, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils.http import http_date
 
 from time import sleep
 
-from ..models import Group, Post, Comment
+from .. import fragments, pagecache, related
+from ..forms import CommentForm
+from ..models import Group, Post, Comment, RelatedPost
 
 User = get_user_model()
 
@@ -231,17 +244,16 @@ class PostsViewsTests(TestCase):
 
     def test_cache_index_page(self):
         """
-        Кэширование главной страницы при добавлениии поста.
+        Карточки главной страницы берутся из кэша, пока пост не менялся.
         """
         response_cache = self.guest_client.get(INDEX)
-        Post.objects.create(
-            text='Ещё один пост для проверки кэша.',
-            author=self.user,
-            group=None,
+        # update() не вызывает сигналы - версия карточки прежняя
+        Post.objects.filter(id=self.post.id).update(
+            text='Текст, изменённый в обход сигналов.'
         )
-        response_after_add = self.guest_client.get(INDEX)
+        response_after_update = self.guest_client.get(INDEX)
         self.assertEqual(response_cache.content,
-                         response_after_add.content,
+                         response_after_update.content,
                          msg='Кэш не работает - разный контент')
         # очищаем кэш для проверки обновления контента
         cache.clear()
@@ -250,23 +262,42 @@ class PostsViewsTests(TestCase):
                             response_cache_refresh.content,
                             msg='После сброса кэша - одинаковый контент')
 
-    def test_cache(self):
+    def test_cache_invalidated_on_write(self):
         """
-        Кэширование главной страницы при удалении поста.
+        Новый пост, комментарий и удаление сразу видны на главной.
         """
-        cache_before_delete = self.guest_client.get(INDEX)
-        Post.objects.all().delete()
-        cached_after_delete = self.guest_client.get(INDEX)
-        cache.clear()
-        actual_cache = self.guest_client.get(INDEX)
-        self.assertEqual(
-            cache_before_delete.content, cached_after_delete.content,
-            msg='Кэш не работает - разный контент'
+        before_add = self.guest_client.get(INDEX)
+        new_post = Post.objects.create(
+            text='Ещё один пост для проверки кэша.',
+            author=self.user,
+            group=None,
         )
-        self.assertNotEqual(
-            cache_before_delete.content, actual_cache.content,
-            msg='После сброса кэша - одинаковый контент'
+        after_add = self.guest_client.get(INDEX)
+        self.assertNotEqual(before_add.content, after_add.content,
+                            msg='Новый пост не появился на главной')
+        self.assertIn(new_post.text, after_add.content.decode())
+        Comment.objects.create(
+            author=self.user, post=new_post, text='Новый комментарий'
         )
+        after_comment = self.guest_client.get(INDEX)
+        self.assertNotEqual(after_add.content, after_comment.content,
+                            msg='Счётчик комментариев не обновился')
+        new_post.delete()
+        after_delete = self.guest_client.get(INDEX)
+        self.assertNotIn(new_post.text, after_delete.content.decode())
+
+    def test_cache_bumps_only_affected_card(self):
+        """
+        Комментарий меняет версию только карточки своего поста.
+        """
+        other_post = Post.objects.exclude(id=self.post.id).first()
+        before = fragments.card_versions([self.post.id, other_post.id])
+        Comment.objects.create(
+            author=self.user, post=self.post, text='Ещё комментарий'
+        )
+        after = fragments.card_versions([self.post.id, other_post.id])
+        self.assertNotEqual(before[self.post.id], after[self.post.id])
+        self.assertEqual(before[other_post.id], after[other_post.id])
 
 
 class PaginatorViewsTest(TestCase):
@@ -315,3 +346,511 @@ class PaginatorViewsTest(TestCase):
                         len(response.context.get('page_obj').object_list),
                         post_count
                     )
+
+    def test_cursor_pages_follow_each_other(self):
+        """
+        Листание по курсору вперёд и назад без пропусков и повторов.
+        """
+        response = self.authorized_client.get(INDEX)
+        first_page = list(response.context.get('page_obj'))
+        next_cursor = response.context.get('page_obj').paginator.next_cursor
+        response = self.authorized_client.get(INDEX, {'cursor': next_cursor})
+        page_obj = response.context.get('page_obj')
+        self.assertEqual(page_obj.number, 2)
+        self.assertEqual(len(page_obj.object_list),
+                         int(settings.PAGINATOR_OBJECTS_PER_PAGE / 2))
+        self.assertFalse(page_obj.has_next())
+        self.assertFalse(set(first_page) & set(page_obj.object_list))
+        response = self.authorized_client.get(
+            INDEX, {'cursor': page_obj.paginator.previous_cursor}
+        )
+        self.assertEqual(list(response.context.get('page_obj')), first_page)
+
+    def test_cursor_page_skips_count(self):
+        """
+        Страница по курсору не выполняет COUNT по таблице постов.
+        """
+        response = self.authorized_client.get(INDEX)
+        next_cursor = response.context.get('page_obj').paginator.next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(INDEX, {'cursor': next_cursor})
+        post_counts = [
+            query['sql'] for query in queries.captured_queries
+            if 'COUNT' in query['sql'] and 'FROM "posts_post"' in query['sql']
+        ]
+        self.assertEqual(post_counts, [])
+
+    def test_broken_cursor_returns_first_page(self):
+        """
+        Испорченный курсор не ломает страницу - отдаётся первая страница.
+        """
+        response = self.authorized_client.get(INDEX, {'cursor': 'broken!'})
+        self.assertEqual(response.context.get('page_obj').number, 1)
+
+    def test_forged_cursor_returns_first_page(self):
+        """
+        Курсор с подделанным ключом (не дата, не число, null, вложенные
+        объекты, огромный номер) - тоже первая страница, а не 500.
+        """
+        forged = (
+            [['garbage', '1'], 2, True],
+            [[None, '1'], 2, True],
+            [[{'a': 1}, '1'], 2, False],
+            [['2021-01-01 00:00:00+00:00', ['1']], 2, True],
+            [['2021-01-01 00:00:00+00:00', '1' + '0' * 30], 2, True],
+            [['2021-01-01 00:00:00+00:00', '1'], 10 ** 30, True],
+            [['2021-01-01 00:00:00+00:00'], 2, True],
+            {'key': 1},
+        )
+        for payload in forged:
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(payload).encode()).decode()
+            with self.subTest(payload=payload):
+                response = self.authorized_client.get(
+                    INDEX, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context.get('page_obj').number, 1)
+
+    def test_huge_page_number_returns_first_page(self):
+        """
+        ?page= за пределами целых чисел СУБД - первая страница.
+        """
+        response = self.authorized_client.get(
+            INDEX, {'page': '9' * 25})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context.get('page_obj').number, 1)
+
+    def test_feeds_read_by_index(self):
+        """
+        Ни одна лента (и её следующая страница) не сортирует всю таблицу.
+        """
+        output = StringIO()
+        call_command('explain_feeds', repeat=1, stdout=output)
+        self.assertNotIn('FAIL', output.getvalue())
+        self.assertIn('post_date_idx', output.getvalue())
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='MrsHudson')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        # комментариев на страницу и ещё половина
+        Comment.objects.bulk_create([
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(settings.COMMENTS_PER_PAGE
+                           + int(settings.COMMENTS_PER_PAGE / 2))
+        ])
+        cls.POST_URL = reverse('post:post_detail',
+                               kwargs={'post_id': cls.post.id})
+        cls.COMMENTS_URL = reverse('post:comments',
+                                   kwargs={'post_id': cls.post.id})
+
+    def test_first_page_is_bounded(self):
+        """
+        На странице поста - только первая порция комментариев.
+        """
+        response = Client().get(self.POST_URL)
+        comments = response.context.get('comments')
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertContains(response, 'id="more-comments"')
+
+    def test_json_next_batch(self):
+        """
+        JSON отдаёт следующую порцию по курсору, без повторов.
+        """
+        cursor = Client().get(self.POST_URL).context.get(
+            'comments').paginator.next_cursor
+        data = Client().get(self.COMMENTS_URL, {'cursor': cursor}).json()
+        self.assertEqual(len(data['comments']),
+                         int(settings.COMMENTS_PER_PAGE / 2))
+        self.assertEqual(data['comments'][0]['text'],
+                         f'Комментарий {settings.COMMENTS_PER_PAGE}')
+        self.assertEqual(data['comments'][0]['author']['username'],
+                         'MrsHudson')
+        self.assertIsNone(data['next_cursor'])
+
+
+class SidebarCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='MrsHudson')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Group.objects.create(title='Тестовая группа', slug=TEST_SLUG)
+        cls.POST_URL = reverse('post:post_detail',
+                               kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+
+    def sidebar_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(self.POST_URL)
+        return response, [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "posts_group"' in query['sql']
+            or 'LIMIT 3' in query['sql']
+        ]
+
+    def test_sidebar_cached_until_changed(self):
+        """
+        Боковая панель не делает запросов, пока не изменятся
+        сообщества или посты; после изменения - обновляется.
+        """
+        self.sidebar_queries()
+        _, queries = self.sidebar_queries()
+        self.assertEqual(queries, [])
+        Group.objects.create(title='Новая группа', slug=TEST_SLUG_2)
+        response, _ = self.sidebar_queries()
+        self.assertContains(response, 'Новая группа')
+
+    @override_settings(SIDEBAR_GROUPS=1)
+    def test_groups_capped(self):
+        """
+        В боковой панели не больше SIDEBAR_GROUPS сообществ.
+        """
+        Group.objects.create(title='Новая группа', slug=TEST_SLUG_2)
+        response = Client().get(self.POST_URL)
+        self.assertEqual(len(response.context.get('groups')), 1)
+
+
+class RelatedPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.watson = User.objects.create_user(username='DrJohnHWatson')
+        cls.holmes = User.objects.create_user(username='SherlockHolmes')
+        cls.group = Group.objects.create(title='Дела', slug=TEST_SLUG)
+        cls.post = Post.objects.create(
+            author=cls.watson,
+            text='Собака Баскервилей воет на болотах Девоншира',
+        )
+        cls.similar = Post.objects.create(
+            author=cls.holmes,
+            text='На болотах Девоншира снова видели собаку',
+        )
+        cls.same_group = Post.objects.create(
+            author=cls.holmes, group=cls.group,
+            text='Пляшущие человечки на подоконнике',
+        )
+        cls.other_group = Post.objects.create(
+            author=cls.holmes, group=cls.group,
+            text='Знак четырёх и сокровища Агры',
+        )
+        cls.POST_URL = reverse('post:post_detail',
+                               kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_similar_text_first(self):
+        """
+        Соседи поста считаются командой: похожий текст - выше всех,
+        пост не попадает в собственные соседи.
+        """
+        call_command('refresh_related', stdout=StringIO())
+        response = Client().get(self.POST_URL)
+        related = list(response.context['related'])
+        self.assertEqual(related[0], self.similar)
+        self.assertNotIn(self.post, related)
+        self.assertContains(response, 'Похожие посты')
+
+    def test_shared_group_counts(self):
+        """
+        Посты того же сообщества и автора похожи и без общих слов,
+        посты без общего с постом не попадают в соседи.
+        """
+        call_command('refresh_related', stdout=StringIO())
+        related = list(RelatedPost.objects.filter(
+            post=self.same_group).values_list('related', flat=True))
+        self.assertEqual(related, [self.other_group.id, self.similar.id])
+
+    def test_latest_posts_until_computed(self):
+        """
+        Пока соседи не посчитаны, сбоку - новые посты.
+        """
+        response = Client().get(self.POST_URL)
+        self.assertContains(response, 'Новые посты')
+
+    @override_settings(RELATED_POSTS_MAX_DF=1, RELATED_POSTS_POSTINGS=2)
+    def test_postings_are_truncated(self):
+        """
+        В списке слова остаются только посты с наибольшим весом слова.
+        """
+        posts = [
+            (1, 'болото', self.watson.id, None),
+            (2, 'болото туман', self.watson.id, None),
+            (3, 'болото туман вереск', self.watson.id, None),
+            (4, 'туман', self.watson.id, None),
+        ]
+        index = related.RelatedIndex(posts)
+        self.assertEqual(
+            [post_id for post_id, _ in index.index['болото']], [1, 2])
+
+
+class ConditionalResponsesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='MrsHudson', password='Baker-221b')
+        cls.group = Group.objects.create(title='Тестовая группа',
+                                         slug=TEST_SLUG)
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост')
+        cls.POST_URL = reverse('post:post_detail',
+                               kwargs={'post_id': cls.post.id})
+        cls.PROFILE_URL = reverse('post:profile',
+                                  kwargs={'username': cls.user.username})
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_not_modified_without_render(self):
+        """
+        Повторный запрос с тем же ETag - 304 без шаблона.
+        """
+        for url in (INDEX, GROUP_POSTS, self.POST_URL, self.PROFILE_URL):
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.templates, [])
+
+    def test_cache_control_by_auth(self):
+        """
+        Гостям - public, вошедшим - private; ETag у них разный,
+        чужой ETag не даёт 304.
+        """
+        guest = self.guest_client.get(INDEX)
+        user = self.authorized_client.get(INDEX)
+        self.assertIn('public', guest['Cache-Control'])
+        self.assertIn('private', user['Cache-Control'])
+        self.assertIn('Cookie', guest['Vary'])
+        self.assertNotEqual(guest['ETag'], user['ETag'])
+        response = self.authorized_client.get(
+            INDEX, HTTP_IF_NONE_MATCH=guest['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_invalidate(self):
+        """
+        Новый комментарий меняет ETag поста,
+        правка сообщества - ETag его страницы.
+        """
+        etag = self.guest_client.get(self.POST_URL)['ETag']
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Элементарно')
+        response = self.guest_client.get(
+            self.POST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Элементарно')
+        etag = self.guest_client.get(GROUP_POSTS)['ETag']
+        self.group.description = 'Новое описание'
+        self.group.save()
+        response = self.guest_client.get(GROUP_POSTS, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_names_invalidate(self):
+        """
+        Новое имя автора и название сообщества меняют ETag лент
+        и страницы поста и видны сразу, в том числе из кэша страниц.
+        """
+        urls = (INDEX, GROUP_POSTS, self.POST_URL)
+        with self.settings(PAGE_CACHE=True):
+            etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+            self.user.first_name = 'Марта'
+            self.user.save()
+            self.group.title = 'Переименованная группа'
+            self.group.save()
+            for url in urls:
+                with self.subTest(url=url):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etags[url])
+                    self.assertEqual(response.status_code, 200)
+                    self.assertContains(response, 'Марта')
+                    self.assertContains(response, 'Переименованная группа')
+
+    def test_login_keeps_cards(self):
+        """
+        Вход (сохраняется только last_login) не сбрасывает карточки.
+        """
+        etag = self.guest_client.get(INDEX)['ETag']
+        self.client.login(username='MrsHudson', password='Baker-221b')
+        response = self.guest_client.get(INDEX, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_edit_not_hidden_by_dates(self):
+        """
+        Last-Modified не отдаётся: правка поста не меняет его даты,
+        и If-Modified-Since не должен получать устаревший 304.
+        """
+        response = self.guest_client.get(self.POST_URL)
+        self.assertFalse(response.has_header('Last-Modified'))
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        response = self.guest_client.get(
+            self.POST_URL, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_missing_post(self):
+        """
+        Для несуществующего поста - 404 без валидаторов.
+        """
+        response = self.guest_client.get(
+            reverse('post:post_detail', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@override_settings(PAGE_CACHE=True)
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='MrsHudson')
+        cls.author = User.objects.create_user(username=USERNAME_AUTH)
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+        cls.POST_URL = reverse('post:post_detail',
+                               kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def rendered(self, response):
+        return [template.name for template in response.templates]
+
+    def test_page_rendered_once(self):
+        """
+        Страница рендерится один раз; вошедшему из кэша
+        заполняются только дыры - шапка и форма комментария.
+        """
+        guest = self.guest_client.get(self.POST_URL)
+        self.assertIn('posts/post_detail.html', self.rendered(guest))
+        self.assertNotContains(guest, 'Добавить комментарий')
+        response = self.authorized_client.get(self.POST_URL)
+        self.assertNotIn('posts/post_detail.html', self.rendered(response))
+        self.assertContains(response, 'Пользователь: MrsHudson')
+        self.assertContains(response, 'Добавить комментарий')
+        self.assertNotContains(response, 'Редактировать запись')
+        again = self.guest_client.get(self.POST_URL)
+        self.assertEqual(self.rendered(again), [])
+        self.assertEqual(again.content, guest.content)
+
+    def test_changes_render_again(self):
+        """
+        Новый комментарий меняет ключ страницы.
+        """
+        self.guest_client.get(self.POST_URL)
+        Comment.objects.create(post=self.post, author=self.user,
+                               text='Элементарно')
+        self.assertContains(self.guest_client.get(self.POST_URL),
+                            'Элементарно')
+
+    def test_profile_follow_button(self):
+        """
+        Кнопка подписки на общей странице профиля - только у вошедших.
+        """
+        self.assertNotContains(self.guest_client.get(PROFILE), 'Подписаться')
+        response = self.authorized_client.get(PROFILE)
+        self.assertNotIn('posts/profile.html', self.rendered(response))
+        self.assertContains(response, 'Подписаться')
+
+    def test_markers_in_post_text_not_filled(self):
+        """
+        Метки дыр в тексте поста (выводится через |safe) не заполняются:
+        у них нет nonce рендера. Неразборчивые метки не ломают страницу.
+        """
+        header = reverse('post:hole', kwargs={'name': 'header'})
+        text = (
+            f'<!--hole:{header}?view_name=x-->подделка<!--/hole-->'
+            '<!--hole:/nope/-->битая<!--/hole-->'
+        )
+        post = Post.objects.create(author=self.author, text=text)
+        url = reverse('post:post_detail', kwargs={'post_id': post.id})
+        self.guest_client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, text)
+        self.assertContains(response, 'Пользователь: MrsHudson', count=1)
+
+    def test_broken_marker_left_as_is(self):
+        """
+        Метку с неверными аргументами fill_holes оставляет без изменений.
+        """
+        content = (
+            '<!--hole:abc:/fragment/follow_button/?author_id=x-->'
+            'гость<!--/hole:abc-->'
+            '<!--hole:abc:/nope/-->гость<!--/hole:abc-->'
+        ).encode()
+        request = self.authorized_client.get(INDEX).wsgi_request
+        self.assertEqual(pagecache.fill_holes(request, content, 'abc'),
+                         content)
+
+    def test_comment_form_in_context(self):
+        """
+        Форма комментария - в контексте страницы поста, дыра выводит её.
+        """
+        with self.settings(PAGE_CACHE=False):
+            response = self.authorized_client.get(self.POST_URL)
+        self.assertIsInstance(response.context['form'], CommentForm)
+        self.assertContains(response, 'Добавить комментарий')
+
+    def test_hole_fragment(self):
+        """
+        Дыру можно получить отдельным запросом по адресу из метки.
+        """
+        url = reverse('post:hole', kwargs={'name': 'header'})
+        response = self.authorized_client.get(url, {'view_name': 'post:index'})
+        self.assertContains(response, 'Пользователь: MrsHudson')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.authorized_client.get(
+            reverse('post:hole', kwargs={'name': 'nope'})).status_code, 404)
+
+    def test_headers_kept_on_hit(self):
+        """
+        Заголовки view сохраняются вместе со страницей; страница
+        с заполненными дырами - private и Vary: Cookie.
+        """
+        @pagecache.cached_page(lambda request: ['v1'])
+        def view(request):
+            response = HttpResponse(
+                'Страница', content_type='text/html; charset=utf-8')
+            response['Content-Language'] = 'ru'
+            return response
+
+        request = RequestFactory().get('/page/')
+        request.user = AnonymousUser()
+        view(request)
+        for user in (AnonymousUser(), self.user):
+            with self.subTest(user=user):
+                request = RequestFactory().get('/page/')
+                request.user = user
+                response = view(request)
+                self.assertEqual(response['Content-Language'], 'ru')
+                self.assertEqual(response['Content-Type'],
+                                 'text/html; charset=utf-8')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_hole_ignores_page_context_args(self):
+        """
+        Параметры из контекста страницы (форма комментария) из адреса
+        фрагмента не берутся.
+        """
+        url = reverse('post:hole', kwargs={'name': 'comment_form'})
+        response = self.authorized_client.get(
+            url, {'post_id': self.post.id, 'form': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Добавить комментарий')
@@ -0,0 +1,148 @@
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import warmup
+from ..models import Group, Post
+
+User = get_user_model()
+
+INDEX = reverse('post:index')
+
+
+# в тестах база видна только из текущего потока - прогрев без пула
+@override_settings(PAGE_CACHE=True, WARM_CACHE_WORKERS=1)
+class WarmupTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.holmes = User.objects.create_user(username='SherlockHolmes')
+        cls.watson = User.objects.create_user(username='DrJohnHWatson')
+        cls.cases = Group.objects.create(title='Дела', slug='cases')
+        cls.violin = Group.objects.create(title='Скрипка', slug='violin')
+        for number in range(settings.PAGINATOR_OBJECTS_PER_PAGE + 1):
+            Post.objects.create(author=cls.holmes, group=cls.cases,
+                                text=f'Дело {number}')
+        Post.objects.create(author=cls.watson, group=cls.violin,
+                            text='Записки')
+
+    def setUp(self):
+        cache.clear()
+        warmup._hits.clear()
+
+    def test_paths_by_posts(self):
+        """
+        Страницы главной по курсорам из паджинатора, сообщества
+        и авторы - от больших к маленьким.
+        """
+        paths = warmup.paths_by_posts(index_pages=3, groups=2, profiles=1)
+        paginator = Client().get(INDEX).context['page_obj'].paginator
+        next_page = f'{INDEX}?cursor={paginator.next_cursor}'
+        self.assertEqual(paths, [
+            INDEX,
+            next_page,
+            reverse('post:group_list', args=['cases']),
+            reverse('post:group_list', args=['violin']),
+            reverse('post:profile', args=['SherlockHolmes']),
+        ])
+
+    def test_command_fills_page_cache(self):
+        """
+        После warm_cache страницы отдаются из кэша без рендера шаблонов.
+        """
+        out = StringIO()
+        call_command('warm_cache', workers=1, stdout=out)
+        self.assertIn('ошибок: 0', out.getvalue())
+        for url in (INDEX, reverse('post:group_list', args=['cases']),
+                    reverse('post:profile', args=['SherlockHolmes'])):
+            with self.subTest(url=url):
+                response = Client().get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.templates, [])
+
+    def test_hot_pages_rewarmed(self):
+        """
+        Горячие адреса публикуются в кэше; после изменения данных
+        проход планировщика рендерит их заново.
+        """
+        client = Client()
+        for _ in range(3):
+            client.get(INDEX)
+        client.get(reverse('post:profile', args=['DrJohnHWatson']))
+        self.assertEqual(warmup.hot_paths(1), [INDEX])
+        Post.objects.create(author=self.watson, text='Новый рассказ')
+        warmup.tick()
+        self.assertEqual(cache.get(warmup.HOT_KEY)['hits'], {
+            INDEX: 3,
+            reverse('post:profile', args=['DrJohnHWatson']): 1,
+        })
+        response = client.get(INDEX)
+        self.assertEqual(response.templates, [])
+        self.assertContains(response, 'Новый рассказ')
+
+    def test_hits_normalized(self):
+        """
+        В учёт попадают адреса из URL-шаблонов с cursor/page:
+        лишние GET-параметры отбрасываются, 404 и прогрев не считаются.
+        """
+        client = Client()
+        client.get(INDEX, {'utm': 'spam', 'page': '2'})
+        client.get(INDEX, {'page': '2', 'x': '1'})
+        client.get(reverse('post:group_list', args=['nothing']))
+        warmup.warm([reverse('post:profile', args=['SherlockHolmes'])])
+        self.assertEqual(dict(warmup._hits), {f'{INDEX}?page=2': 2})
+
+    def test_publish_merges_hits(self):
+        """
+        Счётчики процессов складываются в кэше, а не затирают друг друга;
+        раз в интервал общие счётчики уменьшаются вдвое.
+        """
+        profile = reverse('post:profile', args=['SherlockHolmes'])
+        warmup._hits.update({INDEX: 4, profile: 1})
+        self.assertTrue(warmup.publish())
+        warmup._hits.update({INDEX: 2})
+        self.assertTrue(warmup.publish())
+        self.assertEqual(warmup._hits, {})
+        self.assertEqual(cache.get(warmup.HOT_KEY)['hits'],
+                         {INDEX: 6, profile: 1})
+        with override_settings(WARM_CACHE_INTERVAL=0):
+            warmup.publish()
+        self.assertEqual(cache.get(warmup.HOT_KEY)['hits'], {INDEX: 3})
+
+    def test_publish_waits_for_lock(self):
+        """
+        Пока другой процесс сливает счётчики, свои копятся до следующего
+        прохода.
+        """
+        warmup._hits[INDEX] = 1
+        cache.add(warmup.HOT_LOCK_KEY, 0)
+        self.assertFalse(warmup.publish())
+        self.assertEqual(warmup._hits, {INDEX: 1})
+        self.assertIsNone(cache.get(warmup.HOT_KEY))
+
+    def test_render_through_middleware(self):
+        """
+        Прогрев идёт через обработчик Django: неизвестный адрес - 404.
+        """
+        self.assertEqual(warmup.render('/no/such/page/')[1], 404)
+        self.assertEqual(warmup.render(INDEX)[1], 200)
+
+    def test_start_once_per_process(self):
+        """
+        Поток прогрева стартует один раз в процессе и заново -
+        в процессе после fork.
+        """
+        self.addCleanup(setattr, warmup, '_pid', warmup._pid)
+        with mock.patch.object(warmup.threading, 'Thread') as thread:
+            warmup.start()
+            warmup.start()
+            self.assertEqual(thread.call_count, 1)
+            warmup._pid = -1
+            warmup.start()
+            self.assertEqual(thread.call_count, 2)
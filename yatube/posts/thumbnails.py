@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from . import fragments
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, которые используются в шаблонах:
+# имя -> (геометрия sorl-thumbnail, параметры)
+SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'related': ('280', {'crop': 'center', 'upscale': True}),
+    'full': ('1920', {'crop': 'center', 'upscale': True}),
+}
+# Современные форматы для <picture>: ширины вариантов и соотношение
+# сторон (None - высота пропорциональна ширине)
+VARIANTS = {
+    'card': ((480, 960), 960 / 339),
+    'related': ((280, 560), None),
+    'full': ((640, 1280, 1920), None),
+}
+# (формат Pillow, MIME-тип, расширение) - от самого компактного
+FORMATS = (
+    ('AVIF', 'image/avif', 'avif'),
+    ('WEBP', 'image/webp', 'webp'),
+)
+VARIANTS_DIR = 'cache/variants'
+# Серая заглушка, пока миниатюра готовится
+PLACEHOLDER = (
+    'data:image/svg+xml,%3Csvg xmlns=%22http://www.w3.org/2000/svg%22 '
+    'viewBox=%220 0 16 9%22%3E%3Crect width=%2216%22 height=%229%22 '
+    'fill=%22%23e9ecef%22/%3E%3C/svg%3E'
+)
+SCHEDULED_KEY = 'thumbnails:scheduled:{}:{}'
+
+_executor = None
+
+
+def _init_worker():
+    # соединения с БД, унаследованные от родителя при fork, использовать нельзя
+    connections.close_all()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_worker,
+        )
+    return _executor
+
+
+def supported_formats():
+    """
+    Форматы из FORMATS, которые умеет сохранять установленный Pillow
+    (AVIF - только с соответствующим плагином).
+    """
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt[0] in Image.SAVE]
+
+
+def _variant(image, width, ratio):
+    if ratio is None:
+        height = max(1, round(image.height * width / image.width))
+        return image.resize((width, height), Image.LANCZOS)
+    return ImageOps.fit(image, (width, max(1, round(width / ratio))),
+                        Image.LANCZOS)
+
+
+def make_variants(post):
+    """
+    WebP/AVIF-варианты картинки для srcset: исходник декодируется один раз,
+    ширины больше исходной не делаются (кроме самой маленькой).
+    Возвращает {размер: {MIME-тип: строка srcset}}.
+    """
+    formats = supported_formats()
+    folder = hashlib.sha1(post.image.name.encode()).hexdigest()[:12]
+    with post.image.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    sources = {}
+    for name, (widths, ratio) in VARIANTS.items():
+        fitting = [w for w in widths if w <= image.width] or [widths[0]]
+        srcsets = {}
+        for width in fitting:
+            resized = _variant(image, width, ratio)
+            for pil_format, mime, extension in formats:
+                buffer = BytesIO()
+                resized.save(buffer, pil_format, quality=80)
+                path = f'{VARIANTS_DIR}/{folder}/{name}-{width}.{extension}'
+                default_storage.delete(path)
+                path = default_storage.save(
+                    path, ContentFile(buffer.getvalue()))
+                srcsets.setdefault(mime, []).append(
+                    f'{default_storage.url(path)} {width}w')
+        sources[name] = {
+            mime: ', '.join(srcset) for mime, srcset in srcsets.items()
+        }
+    return sources
+
+
+def generate(post_id):
+    """
+    Делает все миниатюры и WebP/AVIF-варианты картинки поста
+    и сохраняет их адреса. Выполняется в процессе-воркере пула.
+    """
+    from sorl.thumbnail import get_thumbnail
+
+    post = Post.objects.filter(pk=post_id).only('id', 'image').first()
+    if post is None or not post.image:
+        return
+    source = post.image.name
+    urls = {
+        name: get_thumbnail(post.image, geometry, **options).url
+        for name, (geometry, options) in SIZES.items()
+    }
+    thumbnails = {
+        'source': source,
+        'urls': urls,
+        'sources': make_variants(post),
+    }
+    # картинку могли заменить, пока делали миниатюры
+    updated = Post.objects.filter(pk=post_id, image=source).update(
+        thumbnails=json.dumps(thumbnails))
+    if updated:
+        fragments.bump_post(post_id)
+
+
+def _log_errors(future):
+    if future.exception() is not None:
+        logger.error('Не удалось сделать миниатюры',
+                     exc_info=future.exception())
+
+
+def schedule(post):
+    """
+    Ставит генерацию миниатюр в очередь (один раз на картинку)
+    после фиксации транзакции. В синхронном режиме - делает сразу.
+    """
+    if not post.image:
+        return
+    key = SCHEDULED_KEY.format(post.id, post.image.name)
+    if not cache.add(key, True, settings.THUMBNAIL_SCHEDULE_TIMEOUT):
+        return
+    if settings.THUMBNAIL_SYNC:
+        try:
+            generate(post.id)
+        except Exception:
+            logger.exception('Не удалось сделать миниатюры')
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(
+            generate, post.id).add_done_callback(_log_errors)
+    )
+
+
+def thumbnail_url(post, size):
+    """
+    Адрес готовой миниатюры; если её ещё нет - заглушка
+    и постановка картинки в очередь.
+    """
+    if not post.image:
+        return ''
+    url = post.thumbnail_urls.get(size)
+    if url:
+        return url
+    schedule(post)
+    return PLACEHOLDER
+
+
+def picture_sources(post, size):
+    """
+    Пары (MIME-тип, srcset) для тегов <source> внутри <picture>.
+    """
+    sources = post.thumbnail_data.get('sources', {}).get(size, {})
+    return [
+        (mime, sources[mime])
+        for _, mime, _ in FORMATS if mime in sources
+    ]
@@ -0,0 +1,185 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import Follow, Post, TimelineEntry, User, UserCounters
+from .paginators import MergedRows
+
+CELEBRITIES_CACHE_KEY = 'timeline:celebrities'
+# Строки ленты - (post_id, pub_date) и из записей, и из постов звёзд
+ORDERING = ('-pub_date', '-post_id')
+# Условий в одном DELETE: у SQLite ограничена глубина выражения
+TRIM_CHUNK_SIZE = 100
+# Читателей в одном INSERT ... SELECT: у SQLite ограничено число параметров
+FILL_CHUNK_SIZE = 500
+
+
+def trim_users(user_ids):
+    """
+    Лента ограничена TIMELINE_MAX_LENGTH записями: у этих пользователей
+    удаляется хвост. Границы всех лент - один запрос (шаг по индексу
+    (user, -pub_date) на ленту), хвосты - DELETE на пачку лент.
+    Вызывается при записи, страница подписок ничего не удаляет.
+    """
+    limit = settings.TIMELINE_MAX_LENGTH
+    cutoff = TimelineEntry.objects.filter(user=OuterRef('pk')).order_by(
+        '-pub_date').values('pub_date')[limit:limit + 1]
+    cutoffs = list(User.objects.filter(pk__in=user_ids).annotate(
+        cutoff=Subquery(cutoff)).filter(cutoff__isnull=False).values_list(
+            'pk', 'cutoff'))
+    for start in range(0, len(cutoffs), TRIM_CHUNK_SIZE):
+        TimelineEntry.objects.filter(reduce(or_, (
+            Q(user_id=user_id, pub_date__lte=pub_date)
+            for user_id, pub_date in cutoffs[start:start + TRIM_CHUNK_SIZE]
+        ))).delete()
+
+
+def _bulk_push(entries):
+    # размер пачки INSERT выбирает Django: в SQLite он ограничен
+    # числом параметров и слагаемых составного SELECT
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+    trim_users({entry.user_id for entry in entries})
+
+
+def celebrity_ids():
+    """
+    Авторы, у которых подписчиков не меньше TIMELINE_CELEBRITY_FOLLOWERS.
+    Их посты не раскладываются по лентам, а подмешиваются при чтении.
+    """
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = list(UserCounters.objects.filter(
+            followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+        ).values_list('user_id', flat=True))
+        cache.set(CELEBRITIES_CACHE_KEY, ids,
+                  settings.TIMELINE_CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def is_celebrity(author_id):
+    return UserCounters.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_CELEBRITY_FOLLOWERS,
+    ).exists()
+
+
+def fan_out_post(post):
+    """
+    Добавление нового поста в ленты всех подписчиков автора.
+    """
+    if is_celebrity(post.author_id):
+        # автор мог только что стать популярным - обновим список при чтении
+        if post.author_id not in celebrity_ids():
+            cache.delete(CELEBRITIES_CACHE_KEY)
+        return
+    # подписчики - из базы, а не из графа процесса: граф догоняет
+    # подписки из других воркеров с задержкой, а пропущенный здесь
+    # пост в ленту уже не попадёт
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    entries = []
+    for user_id in followers.iterator():
+        entries.append(TimelineEntry(
+            user_id=user_id, post_id=post.id, pub_date=post.pub_date))
+        if len(entries) >= settings.TIMELINE_BATCH_SIZE:
+            _bulk_push(entries)
+            entries = []
+    _bulk_push(entries)
+
+
+def fill_from_author(user_id, author_id):
+    """
+    После подписки в ленту попадают последние посты автора;
+    старые записи сверх TIMELINE_MAX_LENGTH тут же удаляются.
+    """
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+    _bulk_push([
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    ])
+
+
+def fill_readers(user_ids):
+    """
+    Ленты читателей после массовой загрузки - один INSERT ... SELECT
+    на пачку читателей вместо запросов на каждую подписку: каждому
+    последние TIMELINE_MAX_LENGTH постов его подписок (кроме популярных
+    авторов, их посты подмешиваются при чтении). Уже записанное в ленте
+    остаётся, лишнее обрезается.
+    """
+    user_ids = list(user_ids)
+    entries = TimelineEntry._meta.db_table
+    follows = Follow._meta.db_table
+    posts = Post._meta.db_table
+    counters = UserCounters._meta.db_table
+    for start in range(0, len(user_ids), FILL_CHUNK_SIZE):
+        chunk = user_ids[start:start + FILL_CHUNK_SIZE]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {entries} (user_id, post_id, pub_date) '
+                f'SELECT user_id, post_id, pub_date FROM ('
+                f'SELECT f.user_id, p.id AS post_id, p.pub_date, '
+                f'ROW_NUMBER() OVER (PARTITION BY f.user_id '
+                f'ORDER BY p.pub_date DESC, p.id DESC) AS position '
+                f'FROM {follows} f '
+                f'JOIN {posts} p ON p.author_id = f.author_id '
+                f'WHERE f.user_id IN ({", ".join(["%s"] * len(chunk))}) '
+                f'AND f.author_id NOT IN (SELECT user_id FROM {counters} '
+                f'WHERE followers_count >= %s)'
+                f') ranked WHERE position <= %s ON CONFLICT DO NOTHING',
+                [*chunk, settings.TIMELINE_CELEBRITY_FOLLOWERS,
+                 settings.TIMELINE_MAX_LENGTH],
+            )
+        trim_users(chunk)
+    cache.delete(CELEBRITIES_CACHE_KEY)
+
+
+def drop_author(user_id, author_id):
+    """
+    После отписки посты автора убираются из ленты.
+    """
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def timeline_sources(user):
+    """
+    Источники страницы подписок - строки (post_id, pub_date): записи
+    ленты пользователя по индексу (user, -pub_date) и (fan-out-on-read)
+    посты популярных авторов из его подписок по индексу (author, -pub_date).
+    """
+    sources = [TimelineEntry.objects.filter(user=user).values(
+        'post_id', 'pub_date')]
+    celebrities = celebrity_ids()
+    if celebrities:
+        # подписки на них - подзапросом к posts_follow в том же запросе
+        authors = Follow.objects.filter(
+            user=user, author__in=celebrities).values('author')
+        sources.append(Post.objects.filter(author__in=authors).annotate(
+            post_id=F('id')).values('post_id', 'pub_date'))
+    return sources
+
+
+def timeline_rows(user):
+    """
+    Лента подписок для KeysetPaginator(..., ordering=ORDERING):
+    страница каждого источника выбирается своим запросом,
+    строки сливаются по pub_date.
+    """
+    return MergedRows(*timeline_sources(user))
+
+
+def page_posts(rows):
+    """
+    Посты страницы ленты в её порядке (один запрос по первичному ключу).
+    """
+    ids = [row['post_id'] for row in rows]
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts]
@@ -0,0 +1,374 @@
+import csv
+import json
+import os
+import shutil
+from collections import Counter, defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, transaction
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+
+from . import counters, fragments, graph, search, timeline
+from .models import Comment, Follow, Group, Post, SuggestionQueue, User
+
+# Модели в порядке зависимостей: на что ссылаются - выгружается раньше.
+# Ссылки хранятся как id исходной базы и при загрузке переводятся
+# по словарям "старый id -> новый id".
+FIELDS = {
+    'user': ('id', 'username', 'first_name', 'last_name', 'email'),
+    'group': ('id', 'title', 'slug', 'description'),
+    'post': ('id', 'text', 'pub_date', 'author', 'group', 'image'),
+    'comment': ('id', 'post', 'author', 'text', 'created'),
+    'follow': ('id', 'user', 'author'),
+}
+# Модель и колонки, из которых читаются поля FIELDS
+SOURCES = {
+    'user': (User, FIELDS['user']),
+    'group': (Group, FIELDS['group']),
+    'post': (Post, ('id', 'text', 'pub_date', 'author_id', 'group_id',
+                    'image')),
+    'comment': (Comment, ('id', 'post_id', 'author_id', 'text', 'created')),
+    'follow': (Follow, ('id', 'user_id', 'author_id')),
+}
+FORMATS = ('ndjson', 'csv')
+DATE_FIELDS = ('pub_date', 'created')
+# Естественные ключи созданных строк для created_ids: первые два поля
+# сужают выборку (IN по индексу), остальные отличают строки
+CREATED_KEYS = {
+    Post: ('author_id', 'pub_date', 'text'),
+    Comment: ('post_id', 'created', 'author_id', 'text'),
+}
+CREATED_CHUNK_SIZE = 500
+REFERENCE_FIELDS = ('id', 'post', 'author', 'group', 'user')
+
+
+def export_records(chunk_size=2000):
+    """
+    Все записи по порядку FIELDS: генератор пар (модель, словарь).
+    Каждая таблица читается итератором - в памяти одна пачка строк.
+    """
+    for model, fields in FIELDS.items():
+        source, columns = SOURCES[model]
+        rows = source.objects.order_by('pk').values_list(
+            *columns).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = dict(zip(fields, row))
+            for field in DATE_FIELDS:
+                if field in record:
+                    record[field] = record[field].isoformat()
+            yield model, record
+
+
+def copy_images(records, media):
+    """
+    Пропускает записи дальше, попутно копируя картинки постов в media.
+    """
+    for model, record in records:
+        if model == 'post' and record['image']:
+            target = os.path.join(media, record['image'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with default_storage.open(record['image'], 'rb') as source, \
+                    open(target, 'wb') as file:
+                shutil.copyfileobj(source, file)
+        yield model, record
+
+
+def write_ndjson(records, file):
+    """
+    Одна запись - одна строка JSON с полем model.
+    """
+    total = 0
+    for model, record in records:
+        file.write(json.dumps({'model': model, **record},
+                              ensure_ascii=False))
+        file.write('\n')
+        total += 1
+    return total
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            record = json.loads(line)
+            yield record.pop('model'), record
+
+
+def _csv_path(directory, model):
+    return os.path.join(directory, f'{model}.csv')
+
+
+def write_csv(records, directory):
+    """
+    Каждая модель - в свой файл <model>.csv в directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    files, writers = [], {}
+    total = 0
+    try:
+        for model, record in records:
+            if model not in writers:
+                file = open(_csv_path(directory, model), 'w', newline='',
+                            encoding='utf-8')
+                files.append(file)
+                writers[model] = csv.DictWriter(file, FIELDS[model])
+                writers[model].writeheader()
+            writers[model].writerow(record)
+            total += 1
+    finally:
+        for file in files:
+            file.close()
+    return total
+
+
+def read_csv(directory):
+    """
+    Файлы моделей читаются по порядку FIELDS; пустые ячейки - None.
+    """
+    for model in FIELDS:
+        path = _csv_path(directory, model)
+        if not os.path.exists(path):
+            continue
+        with open(path, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                yield model, {
+                    field: value if value != '' else None
+                    for field, value in row.items()
+                }
+
+
+def created_ids(model, objects):
+    """
+    id объектов, только что созданных bulk_create, в порядке objects.
+    PostgreSQL возвращает их сам; иначе строки выбираются заново
+    по естественному ключу из CREATED_KEYS (атрибуты объекта, среди
+    них - дата, которую Django поставил при вставке). Одинаковые
+    по ключу строки одной вставки сопоставляются по порядку id.
+    Если нашлись не все - DatabaseError.
+    """
+    if not objects or objects[0].pk is not None:
+        return [obj.pk for obj in objects]
+    key = CREATED_KEYS[model]
+    rows = {}
+    for start in range(0, len(objects), CREATED_CHUNK_SIZE):
+        chunk = objects[start:start + CREATED_CHUNK_SIZE]
+        candidates = model.objects.filter(**{
+            f'{name}__in': {getattr(obj, name) for obj in chunk}
+            for name in key[:2]
+        }).values_list('pk', *key)
+        rows.update((pk, tuple(values)) for pk, *values in candidates)
+    found = defaultdict(list)
+    for pk in sorted(rows):
+        found[rows[pk]].append(pk)
+    ids = []
+    for obj in objects:
+        pks = found.get(tuple(getattr(obj, name) for name in key))
+        if not pks:
+            raise DatabaseError(
+                f'Не найдена созданная строка {model._meta.label}')
+        ids.append(pks.pop(0))
+    return ids
+
+
+def bulk_create_dated(model, objects, field):
+    """
+    bulk_create с заданными датами в поле auto_now_add: при вставке
+    Django ставит текущее время, поэтому даты восстанавливаются
+    .update() сразу после неё (bulk_update). Поле модели не меняется -
+    другие потоки процесса пишут как обычно. Возвращает id созданных
+    объектов в порядке objects.
+    """
+    dates = [getattr(obj, field) for obj in objects]
+    model.objects.bulk_create(objects)
+    ids = created_ids(model, objects)
+    for obj, pk, date in zip(objects, ids, dates):
+        obj.pk = pk
+        setattr(obj, field, date)
+    model.objects.bulk_update(objects, [field])
+    return ids
+
+
+def max_id(model):
+    return model.objects.aggregate(value=Max('pk'))['value'] or 0
+
+
+class Importer:
+    """
+    Загрузка записей пачками по batch_size: каждая пачка - bulk_create
+    в отдельной транзакции. Сообщества сопоставляются с существующими
+    по slug, пользователи по username - только с merge_users=True,
+    иначе совпадение имени - ValueError: посты не должны молча попасть
+    в чужой аккаунт. id постов выдаёт база, а словарь
+    "старый id -> новый id" переводит ссылки комментариев без повторного
+    чтения базы. Записи со ссылками на отсутствующие объекты
+    пропускаются.
+    """
+    def __init__(self, batch_size, media=None, merge_users=False):
+        self.batch_size = batch_size
+        self.media = media
+        self.merge_users = merge_users
+        self.users, self.groups, self.posts = {}, {}, {}
+        # границы для пересчёта производных данных, не для выдачи id
+        self.post_start = max_id(Post)
+        self.follow_start = max_id(Follow)
+        self.counts = Counter()
+
+    def run(self, records):
+        """
+        Загружает записи и обновляет производные данные.
+        Возвращает Counter: модель -> количество загруженных.
+        """
+        model, batch = None, []
+        for record_model, record in records:
+            if record_model != model or len(batch) >= self.batch_size:
+                self._flush(model, batch)
+                model, batch = record_model, []
+            batch.append(self._convert(record))
+        self._flush(model, batch)
+        rebuild_derived(self.post_start, self.follow_start, self.batch_size)
+        return self.counts
+
+    @staticmethod
+    def _convert(record):
+        for field in REFERENCE_FIELDS:
+            if record.get(field) is not None:
+                record[field] = int(record[field])
+        for field in DATE_FIELDS:
+            if record.get(field):
+                record[field] = parse_datetime(record[field])
+        return record
+
+    def _flush(self, model, batch):
+        if not batch:
+            return
+        with transaction.atomic():
+            created = getattr(self, f'_import_{model}')(batch)
+        self.counts[model] += created
+        self.counts['skipped'] += len(batch) - created
+
+    def _match(self, model, key, batch, build, merge=True):
+        """
+        Находит существующие объекты по ключу key (merge=False -
+        существующих быть не должно), недостающие создаёт; повторы ключа
+        в выгрузке - один объект. Возвращает словарь
+        "старый id -> новый id".
+        """
+        values = [record[key] for record in batch]
+        found = dict(model.objects.filter(
+            **{f'{key}__in': values}).values_list(key, 'pk'))
+        if found and not merge:
+            raise ValueError(
+                f'Уже есть в базе ({key}): {", ".join(sorted(found))}')
+        missing = {}
+        for record in batch:
+            if record[key] not in found:
+                missing.setdefault(record[key], build(record))
+        missing = list(missing.values())
+        model.objects.bulk_create(missing)
+        found.update(model.objects.filter(**{
+            f'{key}__in': [getattr(obj, key) for obj in missing],
+        }).values_list(key, 'pk'))
+        return {record['id']: found[record[key]] for record in batch}
+
+    def _import_user(self, batch):
+        self.users.update(self._match(User, 'username', batch, lambda r: User(
+            username=r['username'],
+            first_name=r['first_name'] or '',
+            last_name=r['last_name'] or '',
+            email=r['email'] or '',
+            password=make_password(None),
+        ), merge=self.merge_users))
+        return len(batch)
+
+    def _import_group(self, batch):
+        self.groups.update(self._match(Group, 'slug', batch, lambda r: Group(
+            title=r['title'], slug=r['slug'], description=r['description'],
+        )))
+        return len(batch)
+
+    def _import_post(self, batch):
+        old_ids, posts = [], []
+        for record in batch:
+            author_id = self.users.get(record['author'])
+            if author_id is None:
+                continue
+            old_ids.append(record['id'])
+            posts.append(Post(
+                text=record['text'],
+                pub_date=record['pub_date'],
+                author_id=author_id,
+                group_id=self.groups.get(record['group']),
+                image=self._copy_image(record['image']),
+            ))
+        self.posts.update(zip(old_ids, bulk_create_dated(
+            Post, posts, 'pub_date')))
+        return len(posts)
+
+    def _import_comment(self, batch):
+        comments = [
+            Comment(
+                post_id=self.posts[record['post']],
+                author_id=self.users[record['author']],
+                text=record['text'],
+                created=record['created'],
+            )
+            for record in batch
+            if record['post'] in self.posts and record['author'] in self.users
+        ]
+        bulk_create_dated(Comment, comments, 'created')
+        return len(comments)
+
+    def _import_follow(self, batch):
+        follows = [
+            Follow(user_id=self.users[record['user']],
+                   author_id=self.users[record['author']])
+            for record in batch
+            if record['user'] in self.users and record['author'] in self.users
+            and record['user'] != record['author']
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        return len(follows)
+
+    def _copy_image(self, name):
+        if not name or self.media is None:
+            return name or ''
+        path = os.path.join(self.media, name)
+        if not os.path.exists(path):
+            self.counts['missing images'] += 1
+            return ''
+        with open(path, 'rb') as file:
+            return default_storage.save(name, File(file))
+
+
+def rebuild_derived(post_start, follow_start, batch_size):
+    """
+    bulk_create не вызывает сигналы - после массовой загрузки
+    производные данные обновляются одним проходом: счётчики, поисковый
+    индекс, ленты подписок, граф подписок, очередь рекомендаций и кэш.
+    post_start, follow_start - максимальные id до загрузки: всё, что
+    новее, пересчитывается.
+    """
+    counters.rebuild_all(batch_size=batch_size)
+    posts = Post.objects.filter(pk__gt=post_start).values_list(
+        'id', 'text').iterator(chunk_size=batch_size)
+    batch = []
+    for row in posts:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            search.index_posts(batch)
+            batch = []
+    search.index_posts(batch)
+    timeline.fill_readers(Follow.objects.filter(
+        Q(pk__gt=follow_start) | Q(author__posts__pk__gt=post_start)
+    ).order_by('user_id').values_list('user_id', flat=True).distinct())
+    SuggestionQueue.objects.bulk_create(
+        [SuggestionQueue(user_id=user_id) for user_id in Follow.objects
+         .filter(pk__gt=follow_start)
+         .values_list('user_id', flat=True).distinct()],
+        ignore_conflicts=True,
+    )
+    graph.reload()
+    fragments.bump_sidebar('groups')
+    fragments.bump_sidebar('latest_posts')
@@ -1,41 +1,78 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.formats import date_format
 from .forms import PostForm, CommentForm
-from .models import Follow, Group, Post, User
+from .models import Comment, Follow, Group, Post, User
+from . import (follows, fragments, pagecache, related, suggestions,
+               timeline)
+from .conditional import conditional_page, page_validators
+from .pagecache import cached_page
+from .search import SearchResults
+from .paginators import KeysetPaginator
 
 
-def paginator_create(request, object_list):
+def paginator_create(request, object_list, keyset=True,
+                     ordering=('-pub_date', '-id')):
     """
     Формирование пагинатора для списков постов.
+    Посты листаются по курсору (?cursor=...), старые ссылки ?page=N
+    по-прежнему работают. keyset=False - обычный Paginator с COUNT.
     """
-    paginator = Paginator(object_list, settings.PAGINATOR_OBJECTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if not keyset:
+        paginator = Paginator(
+            object_list, settings.PAGINATOR_OBJECTS_PER_PAGE
+        )
+        return paginator.get_page(request.GET.get('page'))
+    paginator = KeysetPaginator(
+        object_list, settings.PAGINATOR_OBJECTS_PER_PAGE, ordering=ordering
+    )
+    cursor = request.GET.get('cursor')
+    if cursor or not request.GET.get('page'):
+        return paginator.page_by_cursor(cursor)
+    return paginator.get_page(request.GET.get('page'))
+
+
+def _index_validators(request):
+    return page_validators(paginator_create(
+        request, Post.objects.values('id', 'pub_date')))
 
 
+@conditional_page(_index_validators)
+@cached_page(_index_validators)
 def index(request):
     """
     Вывод списка постов на главной странице.
     """
     posts = Post.objects.select_related('author', 'group').all()
-    context = {
-        'page_obj': paginator_create(request, posts)
-    }
+    context = fragments.list_context(paginator_create(request, posts))
     template = 'posts/index.html'
     return render(request, template, context)
 
 
+def _group_validators(request, slug):
+    # описание сообщества меняется вместе с версией блока групп
+    parts = page_validators(paginator_create(
+        request, Post.objects.filter(group__slug=slug).values(
+            'id', 'pub_date')))
+    return [*parts, fragments.sidebar_versions()['groups']]
+
+
+@conditional_page(_group_validators)
+@cached_page(_group_validators)
 def group_posts(request, slug):
     """
     Вывод списка постов на странице сообщества.
     """
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.prefetch_related('author').all()
+    posts = group.posts.select_related('author', 'group')
     context = {
         'group': group,
-        'page_obj': paginator_create(request, posts),
+        **fragments.list_context(paginator_create(request, posts)),
     }
     template = 'posts/group_list.html'
     return render(request, template, context)
@@ -48,55 +85,218 @@ def groups(request):
     groups_list = Group.objects.all()
     # формирование пагинатора стало часто повторяться - вынес в функцию
     context = {
-        'page_obj': paginator_create(request, groups_list),
+        'page_obj': paginator_create(request, groups_list, keyset=False),
     }
     template = 'posts/groups.html'
     return render(request, template, context)
 
 
+def _profile_validators(request, username):
+    """
+    Страница постов автора и версия шапки профиля (счётчики,
+    последние подписчики и подписки).
+    """
+    author_id = get_object_or_404(
+        User.objects.values_list('id', flat=True), username=username)
+    parts = page_validators(paginator_create(
+        request, Post.objects.filter(author_id=author_id).values(
+            'id', 'pub_date')))
+    return [*parts, fragments.author_version(author_id)]
+
+
+@conditional_page(_profile_validators)
+@cached_page(_profile_validators)
 def profile(request, username):
     """
     Отображение профиля пользователя.
     """
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.prefetch_related('author').all()
-    is_following = False
-    # TODO как вариант: кнопку подписки показывать для гостей,
-    # но тогда с редиректом на авторизацию
-    # проверка на подписки: True - [Подписаться], False - [Отписаться]
-    if request.user.is_authenticated:
-        if Follow.objects.filter(user=request.user, author=author).exists():
-            is_following = True
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    posts = author.posts.select_related('author', 'group')
+    # кнопка подписки и рекомендации у каждого свои - это дыры
+    # страницы (posts/pagecache.py), в контексте их нет
+    # на профиле - только последние подписчики и подписки,
+    # полные списки - на отдельных страницах по курсору
+    counters = getattr(author, 'counters', None)
+    followers = followings = []
+    if counters and counters.followers_count:
+        followers = [follow.user for follow in follows_preview(
+            Follow.objects.filter(author=author), 'user')]
+    if counters and counters.following_count:
+        followings = [follow.author for follow in follows_preview(
+            Follow.objects.filter(user=author), 'author')]
     context = {
         'author': author,
-        'following': is_following,
-        'page_obj': paginator_create(request, posts),
+        'followers': followers,
+        'followings': followings,
+        'preview_size': settings.PROFILE_FOLLOWS_PREVIEW,
+        **fragments.list_context(paginator_create(request, posts)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def _follows_with(follows, field):
+    """
+    Подписки вместе с пользователями из поля field (user или author) -
+    одним JOIN, только поля, которые выводятся.
+    """
+    return follows.select_related(field).only(
+        f'{field}__username', f'{field}__first_name', f'{field}__last_name')
+
+
+def follows_preview(follows, field):
+    """
+    Последние PROFILE_FOLLOWS_PREVIEW подписок для профиля: запрос
+    не зависит от числа подписчиков.
+    """
+    return _follows_with(follows, field).order_by('-id')[
+        :settings.PROFILE_FOLLOWS_PREVIEW]
+
+
+def follow_list(request, username, field):
+    """
+    Подписчики (field='user') или подписки (field='author') автора
+    по курсору, новые первыми.
+    """
+    author = get_object_or_404(
+        User.objects.select_related('counters'), username=username
+    )
+    lookup = 'author' if field == 'user' else 'user'
+    paginator = KeysetPaginator(
+        _follows_with(Follow.objects.filter(**{lookup: author}), field),
+        settings.FOLLOWS_PER_PAGE, ordering=('-id',),
+    )
+    page_obj = paginator.page_by_cursor(request.GET.get('cursor'))
+    context = {
+        'author': author,
+        'page_obj': page_obj,
+        'users': [getattr(follow, field) for follow in page_obj],
+        'is_followers': field == 'user',
+    }
+    return render(request, 'posts/follow_list.html', context)
+
+
+def followers(request, username):
+    """
+    Все подписчики автора.
+    """
+    return follow_list(request, username, 'user')
+
+
+def following(request, username):
+    """
+    Все, на кого подписан автор.
+    """
+    return follow_list(request, username, 'author')
+
+
+def comments_page(request, post_id):
+    """
+    Страница комментариев поста от старых к новым, по курсору (?cursor=).
+    Загружаются только поля, которые выводятся.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author').only(
+            'text', 'created', 'author__username', 'author__first_name',
+            'author__last_name',
+    )
+    paginator = KeysetPaginator(
+        comments, settings.COMMENTS_PER_PAGE, ordering=('created', 'id'))
+    return paginator.page_by_cursor(request.GET.get('cursor'))
+
+
+def post_comments(request, post_id):
+    """
+    Следующая порция комментариев в JSON - для кнопки "Показать ещё".
+    """
+    page = comments_page(request, post_id)
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.id,
+                'text': comment.text,
+                'created': date_format(comment.created, 'd E Y'),
+                'author': {
+                    'username': comment.author.username,
+                    'full_name': comment.author.get_full_name(),
+                    'url': reverse('post:profile',
+                                   args=[comment.author.username]),
+                },
+            }
+            for comment in page
+        ],
+        'next_cursor': page.paginator.next_cursor,
+    })
+
+
+def _post_validators(request, post_id):
+    """
+    Счётчик постов автора - одним запросом; версия карточки меняется
+    при правке и комментариях, версии боковой панели - при изменении
+    её блоков.
+    """
+    posts_count = get_object_or_404(
+        Post.objects.values_list('author__counters__posts_count', flat=True),
+        pk=post_id,
+    )
+    return [
+        fragments.card_versions([post_id])[post_id],
+        posts_count,
+        request.GET.get('cursor'),
+        *sorted(fragments.sidebar_versions().items()),
+    ]
+
+
+@conditional_page(_post_validators)
+@cached_page(_post_validators)
 def post_detail(request, post_id):
     """
     Отображение поста и информации о нём.
     """
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), id=post_id
+    )
+    # боковая панель одинакова для всех и кэшируется в шаблоне целиком:
+    # пока версии блоков не изменились, запросы ниже не выполняются
     # список групп сбоку в шаблоне
-    group_list = Group.objects.all()
+    group_list = Group.objects.only('title', 'slug')[:settings.SIDEBAR_GROUPS]
     # последние три поста сбоку в шаблоне
-    post_list = Post.objects.filter()[:3]
-    # комментарии к посту
-    comments = post.comments.prefetch_related('author').all()
-    form = CommentForm()
+    post_list = Post.objects.only('text', 'image', 'thumbnails')[
+        :settings.SIDEBAR_LATEST_POSTS]
+    # похожие посты из таблицы, которую заполняет refresh_related;
+    # пока соседей нет - показываются новые посты
+    related_list = related.for_post(post)
+    # комментарии к посту - первая страница, дальше по курсору
+    comments = comments_page(request, post.id)
+    # форму выводит дыра comment_form - только вошедшим
     context = {
         'post': post,
         'comments': comments,
+        'form': CommentForm(),
         'groups': group_list,
         'posts': post_list,
-        'form': form,
+        'related': related_list,
+        'sidebar': fragments.sidebar_versions(),
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def hole(request, name):
+    """
+    Фрагмент страницы для текущего пользователя по адресу из метки дыры -
+    для edge-сервера или скрипта, которые заполняют закэшированную страницу.
+    """
+    try:
+        content = pagecache.render_hole(request, name, request.GET.dict())
+    except (KeyError, TypeError, ValueError):
+        raise Http404
+    response = HttpResponse(content)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @login_required
 def post_create(request):
     """
@@ -160,17 +360,48 @@ def add_comment(request, post_id):
     return redirect('post:post_detail', post_id=post_id)
 
 
+def search(request):
+    """
+    Полнотекстовый поиск по постам с фильтрами по сообществу и автору.
+    """
+    query = request.GET.get('query', '').strip()
+    group_slug = request.GET.get('group')
+    author_name = request.GET.get('author')
+    group = author = None
+    if group_slug:
+        group = get_object_or_404(Group, slug=group_slug)
+    if author_name:
+        author = get_object_or_404(User, username=author_name)
+    results = SearchResults(query, group=group, author=author)
+    page_obj = paginator_create(request, results, keyset=False)
+    # параметры поиска сохраняются в ссылках пагинатора
+    params = request.GET.copy()
+    params.pop('page', None)
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'extra_query': f'{params.urlencode()}&' if params else '',
+        **fragments.list_context(page_obj),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def follow_index(request):
     """
     Страница с контентом автора, на которого подписан пользователь.
     """
-    # Ох, додуматься до этого было очень сложно. По итогам этого курса вижу,
-    # что недостаточно практиковался с фильтрами и местами слабо представляю
-    # механизм работы фильтров и все их возможности. Нужно ещё изучать примеры
-    following_posts = Post.objects.prefetch_related(
-        'author').filter(author__following__user=request.user)
-    context = {'page_obj': paginator_create(request, following_posts)}
+    # Лента собирается заранее при публикации постов (posts/timeline.py),
+    # здесь только читаем её по индексу (user, -pub_date)
+    page_obj = paginator_create(
+        request, timeline.timeline_rows(request.user),
+        ordering=timeline.ORDERING)
+    page_obj.object_list = timeline.page_posts(page_obj.object_list)
+    context = {
+        'suggestions': suggestions.for_user(request.user),
+        **fragments.list_context(page_obj),
+    }
     return render(request, 'posts/follow.html', context)
 
 
@@ -180,9 +411,10 @@ def profile_follow(request, username):
     Подписка на контент автора.
     """
     author = get_object_or_404(User, username=username)
-    # проверяем, что юзер ещё не подписан и не на самого себя
+    # на самого себя не подписываемся; повторную подписку отсечёт
+    # уникальный индекс
     if username != request.user.username:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        follows.follow(request.user, author)
     return redirect('post:profile', username=username)
 
 
@@ -192,8 +424,5 @@ def profile_unfollow(request, username):
     Отписка от автора (от надоевшего графомана).
     """
     author = get_object_or_404(User, username=username)
-    # проверяем, что юзер подписан и удаляем
-    following = Follow.objects.filter(user=request.user, author=author)
-    if following.exists():
-        following.delete()
+    follows.unfollow(request.user, author)
     return redirect('post:profile', username=username)
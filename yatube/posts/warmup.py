@@ -0,0 +1,279 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import unquote_to_bytes, urlencode, urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.db import connection, transaction
+from django.db.models import Count
+from django.urls import reverse
+
+from .models import Group, Post, UserCounters
+from .paginators import KeysetPaginator
+
+logger = logging.getLogger(__name__)
+
+# Общие для всех процессов счётчики горячих адресов:
+# {'hits': {адрес: число}, 'decayed': время последнего уменьшения}
+HOT_KEY = 'warmup:hot'
+HOT_LOCK_KEY = 'warmup:hot:lock'
+# Сколько адресов помнить - и в процессе, и в кэше
+MAX_TRACKED = 1000
+# GET-параметры, от которых зависит страница; остальные в учёт не попадают
+HIT_PARAMS = ('cursor', 'page')
+# Ключ окружения WSGI у запросов прогрева: в заголовке его не передать
+PRERENDER = 'yatube.prerender'
+
+_hits = Counter()
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_pid = None
+_handler = None
+
+
+def _after_fork():
+    # поток прогрева в дочерний процесс не переходит, а его блокировка
+    # могла остаться захваченной
+    global _lock
+    _lock = threading.Lock()
+    _hits.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def record_hit(request):
+    """
+    Учёт посещения страницы в процессе - для выбора горячих адресов.
+    Адрес приводится к виду из URL-шаблона, из GET-параметров остаются
+    только HIT_PARAMS; запросы самого прогрева не считаются.
+    """
+    match = request.resolver_match
+    if match is None or request.META.get(PRERENDER):
+        return
+    path = reverse(match.view_name, args=match.args, kwargs=match.kwargs)
+    params = [(name, request.GET[name]) for name in HIT_PARAMS
+              if request.GET.get(name)]
+    if params:
+        path = f'{path}?{urlencode(params)}'
+    with _lock:
+        _hits[path] += 1
+        if len(_hits) > MAX_TRACKED:
+            kept = _hits.most_common(MAX_TRACKED // 2)
+            _hits.clear()
+            _hits.update(dict(kept))
+
+
+def hot_paths(limit=None):
+    """
+    Горячие адреса: счётчики всех процессов из кэша вместе с ещё
+    не опубликованными счётчиками этого процесса.
+    """
+    limit = limit or settings.WARM_CACHE_HOT_PAGES
+    hits = Counter((cache.get(HOT_KEY) or {}).get('hits', {}))
+    with _lock:
+        hits.update(_hits)
+    return [path for path, _ in hits.most_common(limit)]
+
+
+def publish():
+    """
+    Добавляет счётчики процесса к общим в кэше. Слияние идёт под
+    блокировкой в кэше, чтобы процессы не затирали счётчики друг друга;
+    если она занята - счётчики копятся до следующего прохода.
+    Раз в WARM_CACHE_INTERVAL общие счётчики уменьшаются вдвое:
+    "недавний" трафик важнее старого, редкие адреса выпадают.
+    """
+    if not cache.add(HOT_LOCK_KEY, os.getpid(), settings.WARM_CACHE_INTERVAL):
+        return False
+    try:
+        with _lock:
+            local = _hits.copy()
+            _hits.clear()
+        now = time.time()
+        shared = cache.get(HOT_KEY) or {'hits': {}, 'decayed': now}
+        hits = Counter(shared['hits'])
+        decayed = shared['decayed']
+        if now - decayed >= settings.WARM_CACHE_INTERVAL:
+            hits = Counter({path: count // 2 for path, count in hits.items()
+                            if count // 2})
+            decayed = now
+        hits.update(local)
+        cache.set(HOT_KEY, {
+            'hits': dict(hits.most_common(MAX_TRACKED)),
+            'decayed': decayed,
+        }, None)
+        return True
+    finally:
+        cache.delete(HOT_LOCK_KEY)
+
+
+def index_paths(pages):
+    """
+    Первые страницы главной с теми же курсорами, что в ссылках
+    паджинатора, - иначе прогретые ключи не совпадут с запросами.
+    """
+    if pages < 1:
+        return []
+    url = reverse('post:index')
+    paths, cursor = [url], None
+    for _ in range(pages - 1):
+        paginator = KeysetPaginator(Post.objects.values('id', 'pub_date'),
+                                    settings.PAGINATOR_OBJECTS_PER_PAGE)
+        paginator.page_by_cursor(cursor)
+        cursor = paginator.next_cursor
+        if cursor is None:
+            break
+        paths.append(f'{url}?{urlencode({"cursor": cursor})}')
+    return paths
+
+
+def paths_by_posts(index_pages=None, groups=None, profiles=None):
+    """
+    Адреса по числу постов: страницы главной, самые большие
+    сообщества и самые пишущие авторы.
+    """
+    if index_pages is None:
+        index_pages = settings.WARM_CACHE_INDEX_PAGES
+    if groups is None:
+        groups = settings.WARM_CACHE_GROUPS
+    if profiles is None:
+        profiles = settings.WARM_CACHE_PROFILES
+    slugs = Group.objects.annotate(total=Count('posts')).order_by(
+        '-total').values_list('slug', flat=True)[:groups]
+    usernames = UserCounters.objects.filter(posts_count__gt=0).order_by(
+        '-posts_count').values_list('user__username', flat=True)[:profiles]
+    return [
+        *index_paths(index_pages),
+        *(reverse('post:group_list', args=[slug]) for slug in slugs),
+        *(reverse('post:profile', args=[name]) for name in usernames),
+    ]
+
+
+def _server_name():
+    for host in settings.ALLOWED_HOSTS:
+        host = host.lstrip('.')
+        if host and '*' not in host:
+            return host
+    return 'localhost'
+
+
+def render(path):
+    """
+    Открывает страницу как гость через обработчик Django
+    (middleware и view - как у настоящего запроса): cached_page
+    и фрагменты шаблонов сами сохраняют результат в кэш.
+    Возвращает (адрес, статус, секунды).
+    """
+    global _handler
+    started = time.perf_counter()
+    if _handler is None:
+        _handler = WSGIHandler()
+    url = urlsplit(path)
+    request = WSGIRequest({
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': unquote_to_bytes(url.path).decode('iso-8859-1'),
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': _server_name(),
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        PRERENDER: True,
+    })
+    # ошибки view обработчик сам превращает в ответ 404 или 500
+    status = _handler.get_response(request).status_code
+    return path, status, time.perf_counter() - started
+
+
+def _render_in_thread(path):
+    try:
+        return render(path)
+    finally:
+        # у каждого потока пула своё соединение с БД
+        connection.close()
+
+
+def warm(paths, workers=None):
+    """
+    Прогрев адресов не более чем в workers потоков;
+    workers=1 - последовательно в текущем потоке.
+    """
+    workers = workers or settings.WARM_CACHE_WORKERS
+    if workers == 1:
+        return [render(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=workers,
+                            thread_name_prefix='warm-cache') as pool:
+        return list(pool.map(_render_in_thread, paths))
+
+
+def tick():
+    """
+    Один проход планировщика: публикует счётчики и прогревает горячие
+    адреса. Страницы, ключи которых на месте, отдаются из кэша почти
+    даром, пропавшие после изменений - рендерятся заново.
+    """
+    publish()
+    return warm(hot_paths())
+
+
+def invalidated():
+    """
+    Данные изменились: после фиксации транзакции будим планировщик,
+    чтобы горячие страницы отрендерил он, а не первые посетители.
+    """
+    if _pid == os.getpid():
+        transaction.on_commit(_wakeup.set)
+
+
+def _loop():
+    try:
+        warm(paths_by_posts())
+    except Exception:
+        logger.exception('Не удалось прогреть кэш при запуске')
+    finally:
+        connection.close()
+    while True:
+        _wakeup.wait(settings.WARM_CACHE_INTERVAL)
+        if _wakeup.is_set():
+            # изменения обычно идут пачкой - ждём, пока она закончится
+            time.sleep(settings.WARM_CACHE_DELAY)
+            _wakeup.clear()
+        try:
+            tick()
+        except Exception:
+            logger.exception('Не удалось прогреть горячие страницы')
+        finally:
+            connection.close()
+
+
+def start(**kwargs):
+    """
+    Запускает фоновый прогрев (один поток на процесс): сначала
+    страницы по числу постов, затем горячие - по таймеру
+    и после изменений данных. Подключается к request_started
+    (posts/apps.py), поэтому поток появляется в каждом воркере
+    веб-сервера после fork, а не в management-командах и не в мастере
+    gunicorn --preload.
+    """
+    global _pid
+    if _pid == os.getpid():
+        return
+    with _lock:
+        if _pid != os.getpid():
+            _pid = os.getpid()
+            threading.Thread(target=_loop, name='warm-cache-scheduler',
+                             daemon=True).start()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,6 +43,7 @@ if DEBUG is True:
 
 INSTALLED_APPS = [
     'about',
+    'core.apps.CoreConfig',
     'posts.apps.PostsConfig',
     'users.apps.UsersConfig',
     'django.contrib.auth',
@@ -55,6 +57,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -68,7 +71,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates/')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -128,12 +131,34 @@ USE_L10N = True
 
 USE_TZ = True
 
-# Подключение бэкенда кеширования
+# Подключение бэкенда кеширования.
+# Общий для всех воркеров кэш в файле SQLite (core/cache.py), перед ним -
+# небольшой LRU в памяти процесса для неизменяемых фрагментов шаблонов.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 60,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
 }
+# Тесты не должны видеть кэш, оставшийся от запуска сервера
+TESTING = 'test' in sys.argv or 'pytest' in sys.argv[0]
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
@@ -150,7 +175,129 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Сколько секунд хранить фрагменты карточек и списков постов
+FRAGMENT_CACHE_TIMEOUT = 60 * 10
+# Сколько секунд обратный прокси может отдавать гостям страницу
+# без перепроверки (posts/conditional.py)
+PAGE_CACHE_MAX_AGE = 60
+# Кэш страниц целиком для гостей с дырами для вошедших (posts/pagecache.py);
+# в тестах выключен - тесты проверяют контекст шаблонов
+PAGE_CACHE = not TESTING
+PAGE_CACHE_TIMEOUT = 60 * 10
+# Прогрев кэша страниц (posts/warmup.py, команда warm_cache): потоков,
+# страниц главной, сообществ и профилей по числу постов, горячих адресов;
+# фоновый поток в каждом процессе веб-сервера (с первого запроса)
+# прогревает горячие страницы раз в WARM_CACHE_INTERVAL секунд
+# и через WARM_CACHE_DELAY секунд после изменений данных
+WARM_CACHE_WORKERS = 4
+WARM_CACHE_INDEX_PAGES = 5
+WARM_CACHE_GROUPS = 10
+WARM_CACHE_PROFILES = 10
+WARM_CACHE_HOT_PAGES = 50
+WARM_CACHE_INTERVAL = 60
+WARM_CACHE_DELAY = 1
+WARM_CACHE_ON_START = not TESTING
+# Миниатюры картинок готовятся в пуле процессов (posts/thumbnails.py)
+THUMBNAIL_WORKERS = 2
+# Сколько секунд не ставить одну и ту же картинку в очередь повторно
+THUMBNAIL_SCHEDULE_TIMEOUT = 60 * 5
+# В тестах миниатюры делаются сразу, без пула процессов
+THUMBNAIL_SYNC = TESTING
+# Загружаемые картинки: больше стольких пикселей - отклоняем,
+# не декодируя (защита от "декомпрессионных бомб")
+IMAGE_MAX_PIXELS = 50_000_000
+# Большая сторона картинки после загрузки уменьшается до этого размера
+IMAGE_MAX_SIDE = 2560
+# Качество JPEG/WebP при пересжатии загруженных картинок
+IMAGE_QUALITY = 85
 # Количество постов на странице с паджинатором
 PAGINATOR_OBJECTS_PER_PAGE = 10
+# Боковая панель страницы поста: сколько сообществ и новых постов
+SIDEBAR_GROUPS = 10
+SIDEBAR_LATEST_POSTS = 3
+# Профиль: сколько последних подписчиков и подписок показывать,
+# сколько выводить на странице полного списка
+PROFILE_FOLLOWS_PREVIEW = 10
+FOLLOWS_PER_PAGE = 50
+# Сколько комментариев выводить на странице поста и отдавать за раз
+COMMENTS_PER_PAGE = 20
+# Лента подписок: сколько постов хранить у одного пользователя
+TIMELINE_MAX_LENGTH = 800
+# Размер пачки при раскладке поста по лентам подписчиков
+TIMELINE_BATCH_SIZE = 1000
+# С какого числа подписчиков посты автора подмешиваются при чтении
+TIMELINE_CELEBRITY_FOLLOWERS = 5000
+# Сколько секунд хранить в кэше список популярных авторов
+TIMELINE_CELEBRITIES_TIMEOUT = 600
+# Граф подписок в памяти воркера (posts/graph.py): снимок для быстрого
+# старта, как часто проверять журнал изменений и сколько его хранить
+FOLLOW_GRAPH_SNAPSHOT = os.path.join(BASE_DIR, 'follow_graph.bin')
+FOLLOW_GRAPH_SYNC_INTERVAL = 1
+FOLLOW_GRAPH_LOG_TIMEOUT = 60 * 60 * 24
+# В тестах граф не живёт между запросами - база откатывается после теста
+FOLLOW_GRAPH_SHARED = not TESTING
+# Рекомендации "кого почитать" (posts/suggestions.py): сколько хранить
+# и показывать, по скольким подпискам и читателям считать, размер пачки
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_SHOWN = 5
+SUGGESTIONS_SAMPLE = 50
+SUGGESTIONS_BATCH_SIZE = 1000
+# Похожие посты (posts/related.py): сколько соседей хранить и показывать,
+# сколько слов оставлять у поста, доля постов, начиная с которой слово
+# считается слишком частым, сколько постов с наибольшим весом хранить
+# в списке слова, размер пачки при пересчёте
+RELATED_POSTS_PER_POST = 10
+RELATED_POSTS_SHOWN = 3
+RELATED_POSTS_TERMS = 50
+RELATED_POSTS_MAX_DF = 0.05
+RELATED_POSTS_POSTINGS = 200
+RELATED_POSTS_BATCH_SIZE = 1000
+# Админка: до скольких строк считать отфильтрованные списки
+ADMIN_COUNT_LIMIT = 10000
+# Бюджет SQL-запросов на один запрос к view (core.middleware.
+# QueryBudgetMiddleware, проверяется тестами core/tests/test_query_budgets.py
+# для страниц и для настоящих записей: POST форм, подписки и отписки)
+QUERY_BUDGETS = {
+    # index, group_list, profile, post_detail: + запросы валидаторов ETag
+    # (id страницы, у профиля - и id автора) - повторный запрос
+    # с If-None-Match получает 304
+    'post:index': 4,
+    'post:group': 4,
+    'post:group_list': 5,
+    'post:profile': 8,
+    'post:followers': 4,
+    'post:following': 4,
+    # с холодным кэшем и без посчитанных соседей: + запрос новых постов
+    'post:post_detail': 8,
+    # записи - с учётом сигналов: счётчики, поисковый индекс, раскладка
+    # по лентам (подписчики из posts_follow и +2 запроса на каждые
+    # TIMELINE_BATCH_SIZE подписчиков)
+    'post:post_create': 11,
+    'post:post_edit': 8,
+    'post:add_comment': 5,
+    'post:comments': 1,
+    'post:hole': 2,
+    'post:search': 5,
+    'post:follow_index': 6,
+    # первая подписка пользователя без строки счётчиков: + её создание
+    # (три COUNT и точки сохранения), заполнение ленты, подсказки
+    'post:profile_follow': 21,
+    'post:profile_unfollow': 8,
+    'post:api_index': 2,
+    'post:api_group_list': 3,
+    'post:api_profile': 3,
+    'post:api_follow_index': 5,
+    'post:api_post_detail': 3,
+    'users:signup': 2,
+    'users:logout': 4,
+    # вход: пользователь, сессия, last_login и точки сохранения
+    'users:login': 9,
+    'users:password_reset_form': 2,
+    'users:password_reset_done': 2,
+    'users:password_change_form': 2,
+    'users:password_change_done': 2,
+    'users:password_reset_confirm': 3,
+    'users:password_reset_complete': 2,
+}
 # Функция, обрабатывающая ошибке 403
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'